@@ -0,0 +1,271 @@
+"""
+bench.py
+
+DESCRIPTION:
+    Benchmark suite for sqlwrapper; runs without a database server (see
+    fakes.py). Covers:
+        * read_sql at several row counts and widths (SQLite via `SQL`)
+        * each insert path: Oracle.insert (conventional and direct-path),
+          MariaDB.insert (DBAPI fake),
+          SQLServer.insert (pd.to_sql onto SQLite)
+        * Oracle._fix_data, max_len_cols
+        * columns() / tables() metadata calls
+        * `import sqlwrapper` time and sqlwrapper.connect() latency, on a
+          SQLite entry of a throwaway db_config.ini
+
+USAGE:
+    python benchmarks/bench.py                  # run, print
+    python benchmarks/bench.py --save           # + benchmarks/results/<version>.json
+    python benchmarks/bench.py --compare benchmarks/results/0.2.98.json
+    python benchmarks/bench.py --quick -k insert
+
+    Results are keyed by case name, so runs from different versions can be
+    compared; a case more than --tolerance slower is flagged as a regression.
+    Use --installed to benchmark the installed sqlwrapper instead of this tree.
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+RESULTS_DIR = BENCH_DIR / 'results'
+
+CONFIG_INI = """[BENCH_LITE]
+db_type = sqlite
+username = bench
+password = bench
+hostname = localhost
+port = 0
+db_name = {db_path}
+"""
+
+
+################################################################################
+# runner
+################################################################################
+def measure(func, repeat:int=5, min_time:float=0.2) -> dict:
+    """timeit-style: autorange the loop count, then take `repeat` samples"""
+    timer = timeit.Timer(func)
+    with contextlib.redirect_stdout(io.StringIO()): # the wrapper prints SQL
+        number, _ = timer.autorange() if min_time > 0 else (1, None)
+        samples = [x / number for x in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'min' : min(samples),
+        'median' : statistics.median(samples),
+        'max' : max(samples),
+        'number' : number,
+        'repeat' : repeat,
+    }
+
+
+def _version() -> str:
+    try:
+        from importlib.metadata import version
+        return version('ucd-ri-sqlwrapper')
+    except Exception:
+        for line in (REPO_DIR / 'pyproject.toml').read_text().splitlines():
+            if line.startswith('version'):
+                return line.split('=')[1].strip().strip('"')
+    return 'unknown'
+
+
+################################################################################
+# cases - each yields (name, callable)
+################################################################################
+def cases_read_sql(workdir:Path, quick:bool):
+    from fakes import lite, make_df
+    ls_rows = [1000, 10000] if quick else [1000, 10000, 100000]
+    ls_width = [5, 25] if quick else [5, 25, 100]
+    db = lite(workdir / 'read.db')
+    for rows in ls_rows:
+        for width in ls_width:
+            table = f'T_{rows}_{width}'
+            db.load(make_df(rows, width), table)
+            yield (f'read_sql[rows={rows},width={width}]',
+                   lambda t=table: db.read_sql(f'SELECT * FROM {t}', silent=True, save_hx=False))
+
+
+def cases_insert(workdir:Path, quick:bool):
+    from fakes import fake_dialect, lite, make_df
+    from sqlwrapper.oracle import Oracle
+    from sqlwrapper.mariadb import MariaDB
+    from sqlwrapper.sqlserver import SQLServer
+    ls_rows = [1000, 10000] if quick else [1000, 10000, 100000]
+    for rows in ls_rows:
+        df = make_df(rows, 10)
+        ora = fake_dialect(Oracle, df)
+        yield f'oracle.insert[rows={rows}]', lambda d=ora, df=df: d.insert(df, 'BENCH')
+        yield (f'oracle.insert.direct[rows={rows}]',
+               lambda d=ora, df=df: d.insert(df, 'BENCH', mode='direct'))
+        df_lower = df.copy()
+        df_lower.columns = [x.lower() for x in df.columns]
+        maria = fake_dialect(MariaDB, df_lower)
+        yield f'mariadb.insert[rows={rows}]', lambda d=maria, df=df_lower: d.insert(df, 'bench')
+        # pd.to_sql path; SQLite stands in for the SQL Server engine
+        mssql = fake_dialect(SQLServer, df, schema_name='main')
+        mssql.engine = lite(workdir / f'mssql_{rows}.db').engine
+        yield (f'sqlserver.insert[rows={rows}]',
+               lambda d=mssql, df=df: d.insert(df.copy(), 'BENCH', if_exists='replace',
+                                               method=None))
+
+
+def cases_transform(workdir:Path, quick:bool):
+    from fakes import fake_dialect, make_df
+    from sqlwrapper.oracle import Oracle
+    from sqlwrapper.df_tools import max_len_cols
+    ls_rows = [1000, 10000] if quick else [1000, 10000, 100000]
+    for rows in ls_rows:
+        df = make_df(rows, 10)
+        ora = fake_dialect(Oracle, df)
+        yield f'oracle._fix_data[rows={rows}]', lambda d=ora, df=df: d._fix_data(df)
+        yield f'max_len_cols[rows={rows}]', lambda df=df: max_len_cols(df)
+        yield (f'max_len_cols.oracle[rows={rows}]',
+               lambda df=df: max_len_cols(df, method='oracle'))
+
+
+def cases_metadata(workdir:Path, quick:bool):
+    from fakes import lite, make_df
+    db = lite(workdir / 'meta.db')
+    for i in range(50):
+        db.load(make_df(10, 20), f'META_{i}')
+
+    def uncached(func):
+        # the inspector memoizes reflection; time the catalog queries
+        def timed():
+            db.inspector.clear_cache()
+            return func()
+        return timed
+
+    yield 'tables()', uncached(db.tables)
+    yield 'columns()', uncached(lambda: db.columns('META_0'))
+    yield 'columns(verbose=True)', uncached(lambda: db.columns('META_0', verbose=True))
+
+
+def cases_startup(workdir:Path, quick:bool):
+    from fakes import register_lite
+    import sqlwrapper
+    home = workdir / 'home'
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+
+    def import_sqlwrapper():
+        # fresh interpreter each time, minus the interpreter's own start-up
+        code = ('import time; t = time.perf_counter(); import sqlwrapper; '
+                'print(time.perf_counter() - t)')
+        out = subprocess.run([sys.executable, '-c', code], env=env, cwd=str(home),
+                             capture_output=True, text=True, check=True)
+        return float(out.stdout.strip().splitlines()[-1])
+
+    yield 'import sqlwrapper', import_sqlwrapper
+
+    register_lite() # the entry's db_type; the rest is sqlwrapper.connect() as is
+
+    def connect():
+        # config lookup, dialect dispatch, engine, inspector and engine hooks
+        db = sqlwrapper.connect('BENCH_LITE')
+        db.engine.dispose()
+
+    yield 'connect()', connect
+
+
+CASES = [cases_read_sql, cases_insert, cases_transform, cases_metadata, cases_startup]
+
+
+################################################################################
+# save / compare
+################################################################################
+def compare(results:dict, baseline_path:Path, tolerance:float) -> int:
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\nvs {baseline['version']} ({baseline_path})")
+    print(f"{'case':<45} {'old':>10} {'new':>10} {'ratio':>7}")
+    regressions = 0
+    for name, new in results['cases'].items():
+        old = baseline['cases'].get(name)
+        if old is None:
+            continue
+        ratio = new['min'] / old['min'] if old['min'] else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  <-- REGRESSION'
+            regressions += 1
+        print(f"{name:<45} {old['min']*1e3:>9.2f}ms {new['min']*1e3:>9.2f}ms {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='sqlwrapper benchmarks')
+    parser.add_argument('-k', dest='keyword', help='only cases containing this')
+    parser.add_argument('--quick', action='store_true', help='smaller sizes')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', nargs='?', const='', default=None,
+                        help='save results (default: results/<version>.json)')
+    parser.add_argument('--compare', help='baseline results json')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='slowdown flagged as regression (0.10 = 10%%)')
+    parser.add_argument('--installed', action='store_true',
+                        help='benchmark the installed sqlwrapper, not this tree')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(BENCH_DIR))
+    if not args.installed:
+        sys.path.insert(0, str(REPO_DIR))
+
+    results = {
+        'version' : _version(),
+        'date' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python' : platform.python_version(),
+        'platform' : platform.platform(),
+        'cases' : {},
+    }
+    with tempfile.TemporaryDirectory(prefix='sqlwrapper_bench_') as tmp:
+        # sqlwrapper resolves ~/.mypylib/db_config.ini at import time, so the
+        # bench HOME (with a throwaway config) must be set before any import
+        home = Path(tmp) / 'home'
+        (home / '.mypylib').mkdir(parents=True)
+        (home / '.mypylib' / 'db_config.ini').write_text(
+            CONFIG_INI.format(db_path=Path(tmp) / 'connect.db'))
+        os.environ['HOME'] = str(home)
+        for case_group in CASES:
+            for name, func in case_group(Path(tmp), args.quick):
+                if args.keyword and args.keyword not in name:
+                    continue
+                try:
+                    if name == 'import sqlwrapper': # time is measured in the child
+                        samples = [func() for _ in range(args.repeat)]
+                        result = {'min' : min(samples), 'median' : statistics.median(samples),
+                                  'max' : max(samples), 'number' : 1, 'repeat' : args.repeat}
+                    else:
+                        result = measure(func, repeat=args.repeat)
+                except Exception as error: # report it, keep going
+                    print(f'{name:<45} FAILED: {error!r}')
+                    continue
+                results['cases'][name] = result
+                print(f"{name:<45} min {result['min']*1e3:>10.3f}ms "
+                      f"median {result['median']*1e3:>10.3f}ms")
+
+    if args.save is not None:
+        path = Path(args.save) if args.save else RESULTS_DIR / f"{results['version']}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2))
+        print(f'\nsaved: {path}')
+
+    if args.compare:
+        return 1 if compare(results, Path(args.compare), args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
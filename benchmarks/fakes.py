@@ -0,0 +1,162 @@
+"""
+fakes.py
+    |--> bench.py
+
+DESCRIPTION:
+    Local stand-ins so the benchmarks run without a database server.
+    * lite - the `SQL` base class on a SQLite file (read_sql, metadata)
+    * register_lite - `db_type = sqlite` config entries for sqlwrapper.connect()
+    * fake_engine - a DBAPI-shaped engine whose cursor accepts execute() and
+      executemany() without a network, so the dialect insert paths
+      (Oracle/MariaDB) measure only the wrapper's own work
+    * make_df - deterministic frames of a given shape
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from sqlwrapper.base import SQL
+
+
+################################################################################
+# data
+################################################################################
+def make_df(rows:int, width:int, seed:int=0) -> pd.DataFrame:
+    """mix of int, float, str, date and bool columns, roughly like our extracts"""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(width):
+        kind = i % 5
+        if kind == 0:
+            data[f'ID_{i}'] = np.arange(rows, dtype='int64')
+        elif kind == 1:
+            data[f'AMT_{i}'] = rng.random(rows).round(2)
+        elif kind == 2:
+            data[f'NAME_{i}'] = rng.choice(['ALPHA', 'BRAVO', 'CHARLIE', None], rows)
+        elif kind == 3:
+            start = datetime.date(2020, 1, 1)
+            data[f'VISIT_DATE_{i}'] = [start + datetime.timedelta(days=int(x))
+                                       for x in rng.integers(0, 1000, rows)]
+        else:
+            data[f'FLAG_{i}'] = rng.random(rows) > 0.5
+    return pd.DataFrame(data)
+
+
+################################################################################
+# SQL base class on SQLite
+################################################################################
+class lite(SQL):
+    """the SQL base class, backed by a SQLite file"""
+    def __init__(self, path):
+        super(lite, self).__init__(db_name='main', schema_name='main')
+        self._path = path
+        self._connect()
+
+    def _generate_engine(self):
+        self.engine = sqlalchemy.create_engine(f'sqlite:///{self._path}')
+        self._test_connection()
+
+    def _test_connection(self, prefix=None):
+        with self.engine.connect():
+            return 1
+
+    def select(self, tbl_name:str, cols='*', limit:int=10, print_bool=True):
+        sql_statement = f'SELECT {self._select_cols(cols)} FROM {tbl_name}'
+        if type(limit) is int:
+            sql_statement += f' LIMIT {limit}'
+        return self.read_sql(sql_statement, silent=True, save_hx=print_bool)
+
+    def load(self, df_input:pd.DataFrame, table:str) -> None:
+        df_input.to_sql(table, self.engine, if_exists='replace', index=False)
+
+
+class lite_entry(lite):
+    """
+    lite built the way dbmenu.Database builds a dialect, from a config
+    entry; db_name is the SQLite file. See register_lite()
+    """
+    def __init__(self, db_entry:str, db_section):
+        self._save_config(db_section)
+        super(lite_entry, self).__init__(db_section['db_name'])
+
+
+def register_lite() -> None:
+    """lets sqlwrapper.connect() open `db_type = sqlite` entries"""
+    from sqlwrapper.dbmenu import Database
+    map_Database = Database.map_Database.fget
+    Database.map_Database = property(lambda self: dict(map_Database(self),
+                                                       sqlite=lite_entry))
+
+
+################################################################################
+# containerless DBAPI fake
+################################################################################
+class fake_cursor:
+    def __init__(self):
+        self.rowcount = -1
+
+    def execute(self, sql, *args, **kwargs):
+        self.rowcount = 0
+
+    def executemany(self, sql, lines):
+        self.rowcount = len(lines)
+
+    def callproc(self, name, *args, **kwargs):
+        return args
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class fake_connection:
+    def cursor(self):
+        return fake_cursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class fake_engine:
+    def raw_connection(self):
+        return fake_connection()
+
+    def dispose(self):
+        pass
+
+
+class fake_inspector:
+    def has_table(self, table, *args, **kwargs):
+        return True
+
+
+def fake_dialect(cls, df_input:pd.DataFrame, schema_name:str='BENCH'):
+    """
+    An Oracle/MariaDB/SQLServer object wired to the fakes, without running
+    its __init__ (no config, no connection).
+    """
+    db = cls.__new__(cls)
+    SQL.__init__(db, db_name='BENCH', schema_name=schema_name)
+    db._config = {'db_type' : cls.__name__, 'username' : schema_name,
+                  'database' : 'BENCH', 'hostname' : 'localhost'}
+    db.engine = fake_engine()
+    db.inspector = fake_inspector()
+    cols = pd.Index(df_input.columns)
+    db.columns = lambda table, *args, **kwargs: cols
+    return db
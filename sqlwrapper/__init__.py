@@ -19,6 +19,7 @@ Research Infrastructure, IT Health Informatics, UC Davis Health
 #from sqlwrapper.config import PATH_TO_CONFIG, CONFIG_FILE
 from sqlwrapper.config import config_reader
 from sqlwrapper.connect import connect
+from sqlwrapper.vault import vault_cache
 from sqlwrapper.dbmenu import db_menu
 from pprint import pprint
 import os
@@ -42,8 +43,11 @@ def config(open=False):
 
 # misc tools
 from sqlwrapper.prompter import Prompter
-from sqlwrapper.df_tools import max_len_cols, generate_create_statement
-from sqlwrapper.xlsx import read_xlsx, sheet_to_df
+from sqlwrapper.df_tools import max_len_cols, generate_create_statement, infer_schema
+from sqlwrapper.xlsx import read_xlsx, sheet_to_df, iter_xlsx, read_sheets
+from sqlwrapper import etl
+from sqlwrapper.transfer import copy_table
+from sqlwrapper.parallel import process_map, process_insert
 
 # database connections
 from sqlwrapper.base import SQL
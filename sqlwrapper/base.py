@@ -15,14 +15,32 @@ Duke LeTran <duke.letran@gmail.com; daletran@ucdavis.edu>
 Research Infrastructure, IT Health Informatics, UC Davis Health
 """
 # standard library
+import datetime
+import decimal
 import logging
 import os
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 # added libraries
 import pandas as pd
-from sqlalchemy import exc, inspect
+from sqlalchemy import event, exc, inspect
+from sqlalchemy.sql.elements import ClauseElement
 # SQLWrapper
 from sqlwrapper.prompter import Prompter
-from sqlwrapper.config import config_reader
+from sqlwrapper.config import config_reader, detach_section
+from sqlwrapper.stats import query_stats, estimate_df_bytes
+from sqlwrapper.fetch import fetch_sizes
+from sqlwrapper.lob import lob_hook, stream_lobs, select_lazy, LOB_CHUNK_SIZE
+from sqlwrapper.history import query_history, HX_MAXLEN
+from sqlwrapper.slowlog import slow_query_log, is_explainable, SLOW_LOG_PATH
+from sqlwrapper.df_tools import infer_schema, schema_to_ddl, join_frames, JOIN_HOWS, \
+    compact_frame
+from sqlwrapper.diff import diff_tables, DIFF_CHUNKS
+from sqlwrapper.query import query
+from sqlwrapper.transaction import transaction
+from sqlwrapper.prefetch import prefetch_reader, ITER_CHUNKSIZE, PREFETCH_CHUNKS
+from sqlwrapper.xlsx import iter_xlsx, iter_sheets, XLSX_CHUNKSIZE, XLSX_LOAD_THREADS
 from typing import Union#, Literal
 from typing_extensions import Literal
 from configparser import SectionProxy
@@ -32,16 +50,28 @@ log = logging.getLogger(__name__)
 
 p = Prompter()
 
+# rows per page for iter_pages()
+PAGE_SIZE = 10000
+
 
 class SQL: # level 0
     """ABSTRACT BASE CLASS"""
-    def __init__(self, db_name='Duke', schema_name='dbo'):
+    _dialect = None # df_tools DDL dialect, set per flavor
+    _bulk_table_options = None # storage clause for create_table(bulk=True)
+    _truncate_commits = True # TRUNCATE ends the transaction (Oracle, MariaDB)
+
+    def __init__(self, db_name='Duke', schema_name='dbo', hx_maxlen=HX_MAXLEN):
         self.db_name = db_name
         self.schema_name= schema_name
         self.prefix = db_name + '.' + schema_name
         # self.msg_inaction = "No action taken. Remember to rollback or commit."
-        self.sqlHx = pd.Series(dtype='object')
+        self._hx = query_history(maxlen=hx_maxlen)
         self.p = Prompter()
+        self._stats = query_stats()
+        self._fetch = fetch_sizes()
+        self._lobs = lob_hook()
+        self._slow_log = None
+        self._tx_local = threading.local() # open transaction, per thread
     
     def _init_config(self, db_section:SectionProxy, db_entry:str, opt_print:bool):
         if db_section is None:
@@ -54,6 +84,63 @@ class SQL: # level 0
         """connect to database"""
         self._generate_engine()
         self._generate_inspector()
+        self._stats.instrument(self.engine)
+        self._fetch.configure(getattr(self, '_config', None))
+        self._fetch.instrument(self.engine)
+        self._lobs.instrument(self.engine)
+
+    def transaction(self) -> transaction:
+        """
+        with db.transaction() as tx: - insert/update/truncate/callproc/read_sql
+        inside the block share one pooled connection and commit once on exit
+        (rolled back on an exception); tx.savepoint() nests. See transaction.py
+        """
+        return transaction(self)
+
+    def _active_tx(self):
+        """the transaction open on this thread, if any"""
+        return getattr(self._tx_local, 'tx', None)
+
+    def _raw_connection(self, engine=None):
+        """engine.raw_connection(), or the open transaction's connection"""
+        tx = self._active_tx()
+        if tx is not None and engine in (None, self.engine):
+            return tx.raw
+        return (engine or self.engine).raw_connection()
+
+    @contextmanager
+    def _begin(self):
+        """engine.begin(), or the open transaction's connection (no commit)"""
+        tx = self._active_tx()
+        if tx is not None:
+            yield tx.conn
+        else:
+            with self.engine.begin() as conn:
+                yield conn
+
+    def _truncate_sql(self, target:str) -> str:
+        """TRUNCATE, or DELETE in a transaction that TRUNCATE would commit"""
+        if self._active_tx() is not None and self._truncate_commits:
+            log.info(f'In a transaction: DELETE FROM {target} instead of TRUNCATE')
+            return f'DELETE FROM {target}'
+        return f'TRUNCATE TABLE {target}'
+
+    def stats(self, reset=False) -> pd.DataFrame:
+        """
+        Per-statement timings as a pd.DataFrame: connect_wait, prepare,
+        execute, fetch, to_df, total (seconds), rows and estimated bytes.
+        """
+        df_stats = self._stats.to_frame()
+        if reset:
+            self._stats.reset()
+        return df_stats
+
+    def add_exporter(self, exporter) -> None:
+        """
+        exporter is any callable(record:dict), e.g., from sqlwrapper.stats:
+        log_exporter(), otel_exporter(), prometheus_textfile_exporter(path)
+        """
+        self._stats.exporters.append(exporter)
     
     def _test_connection(self, prefix=None):
         with self.engine.connect() as conn: # if it works, it will pass
@@ -69,9 +156,31 @@ class SQL: # level 0
     
     
     def _save_config(self, config):
-        """obfuscates pw; saves config obj"""
+        """obfuscates pw; saves a private copy of the config section"""
         #config['world'] = 'hello'
-        self._config = config
+        self._config = detach_section(config) # the parsed file is cached and shared
+
+    def _refresh_credentials(self, map_secrets:dict):
+        """
+        Called by the vault cache when a secret rotates. Updates the config
+        in place and hooks the engine's `do_connect` event so new pool
+        connections use the rotated credentials; the pool is not disposed.
+        """
+        for key, value in map_secrets.items():
+            self._config[key] = str(value)
+        # per engine: SQLServer.use() replaces it, and the new one needs the hook too
+        if getattr(self, '_do_connect_engine', None) is not self.engine:
+            event.listen(self.engine, 'do_connect', self._on_do_connect)
+            self._do_connect_engine = self.engine
+        log.info('Credentials refreshed; new connections will use them.')
+
+    def _on_do_connect(self, dialect, conn_rec, cargs, cparams):
+        """swap the current username/password into the DBAPI connect args"""
+        if 'user' in cparams:
+            cparams['user'] = self._username
+        for key in ('password', 'passwd'):
+            if key in cparams:
+                cparams[key] = self._pw
     
     @staticmethod    
     def open_config():
@@ -106,19 +215,25 @@ class SQL: # level 0
             print('Did not truncate, canceled by user.')
 
         # create connection and truncate
-        conn = engine.raw_connection()
-        cursor = conn.cursor()
-        log.info("=======================================================")
-        log.info(f"TRUNCATE TABLE {schema}.{table}... ")
-        log.info("=======================================================")
-        try:
-            cursor.execute(f"TRUNCATE TABLE {schema}.{table}")
-        except ProgrammingError as e:
-            cursor.execute(f"TRUNCATE TABLE {schema}.{table.lower()}")
-        except ProgrammingError as e:
-            cursor.execute(f"TRUNCATE TABLE {schema}.{table.upper()}")
+        with self._stats.statement(f"TRUNCATE TABLE {schema}.{table}", 'truncate') as st:
+            conn = self._raw_connection(engine)
+            st.lap('connect_wait')
+            try:
+                cursor = conn.cursor()
+                log.info("=======================================================")
+                log.info(f"TRUNCATE TABLE {schema}.{table}... ")
+                log.info("=======================================================")
+                try:
+                    cursor.execute(self._truncate_sql(f"{schema}.{table}"))
+                except ProgrammingError as e:
+                    cursor.execute(self._truncate_sql(f"{schema}.{table.lower()}"))
+                except ProgrammingError as e:
+                    cursor.execute(self._truncate_sql(f"{schema}.{table.upper()}"))
+                finally:
+                    st.lap('execute')
+            finally:
+                conn.close()
         log.info("Table truncated, done!")
-        conn.close()
     
     def drop(self, tbl_name:str, what:str='TABLE', skip_prompt=False, answer=None):
         """For now this only drops tables, will expand in future to include sequences, etc."""
@@ -131,51 +246,418 @@ class SQL: # level 0
             if p.prompt_confirmation(msg=f'Are you sure your want to drop {tbl_name}?', answer=answer):
                 self.read_sql(sql_statement)
     
+    def create_table(self,
+                     df_input:pd.DataFrame,
+                     table:str,
+                     schema:str=None,
+                     engine=None,
+                     sample:int=None,
+                     extra_space:float=1.0,
+                     not_null:bool=False,
+                     bulk:bool=False,
+                     table_options:str=None,
+                     print_bool:bool=True) -> str:
+        """
+        CREATE TABLE from df_input's inferred schema (see df_tools.infer_schema),
+        i.e., NUMBER(p,s)/DECIMAL for numeric columns and VARCHARs sized to the
+        longest value (times extra_space). df_input may be an iterable of chunks.
+        * bulk - use the flavor's storage options for load-once tables
+        * table_options - explicit storage clause, overrides bulk
+        Returns the DDL.
+        """
+        if self._dialect is None:
+            raise NotImplementedError(f'create_table() not supported for {type(self).__name__}')
+        if engine is None:
+            engine = self.engine
+        if table_options is None and bulk:
+            table_options = self._bulk_table_options
+        ddl = schema_to_ddl(infer_schema(df_input, sample=sample),
+                            table,
+                            dialect=self._dialect,
+                            factor=extra_space,
+                            not_null=not_null,
+                            schema_name=schema,
+                            table_options=table_options)
+        if print_bool:
+            print(ddl)
+        with self._stats.statement(ddl, 'create') as st:
+            with engine.begin() as conn:
+                st.lap('connect_wait')
+                conn.exec_driver_sql(ddl)
+                st.lap('execute')
+        self._save_sql_hx(ddl)
+        if hasattr(self, 'inspector'):
+            self.inspector.clear_cache() # has_table()/get_columns() are memoized
+        log.info(f'Created table {table}')
+        return ddl
+
+    def _has_table(self, table:str, schema:str=None) -> bool:
+        return self.inspector.has_table(table, schema=schema)
+
+    def insert_xlsx(self,
+                    path_to_xlsx,
+                    table:str,
+                    sheet:Union[str, int]=None,
+                    chunksize:int=XLSX_CHUNKSIZE,
+                    header:Union[int, str, None]=0,
+                    dtype:dict=None,
+                    create=False,
+                    create_kwargs:dict=None,
+                    **kwargs) -> int:
+        """
+        Streams one sheet into table, chunk by chunk (see xlsx.iter_xlsx), so
+        memory stays bounded by chunksize. kwargs are passed to insert().
+        create: if the table doesn't exist, create it first; the schema is
+            inferred over every chunk (one extra read of the sheet)
+        Returns the number of rows inserted.
+        """
+        chunks = lambda: iter_xlsx(path_to_xlsx, sheet, chunksize=chunksize,
+                                   header=header, dtype=dtype)
+        schema = kwargs.get('schema')
+        if create and not self._has_table(table, schema=schema):
+            self.create_table(chunks(), table, schema=schema, **(create_kwargs or {}))
+        n_rows = 0
+        for df_chunk in chunks():
+            if df_chunk.empty:
+                continue
+            self.insert(df_chunk, table, **kwargs)
+            n_rows += len(df_chunk)
+            log.info(f'insert_xlsx: {n_rows} rows into {table}')
+        return n_rows
+
+    def insert_xlsx_sheets(self,
+                           path_to_xlsx,
+                           tables:dict=None,
+                           header:Union[int, str, None]=0,
+                           dtype:dict=None,
+                           processes:int=1,
+                           threads:int=XLSX_LOAD_THREADS,
+                           create=False,
+                           create_kwargs:dict=None,
+                           **kwargs) -> dict:
+        """
+        Loads sheets into their own tables. Each sheet is inserted as soon as
+        it is parsed, on one of `threads` threads; parsing waits while all of
+        them are busy, so at most threads + 1 sheets are held in memory.
+        processes > 1 parses sheets concurrently (see xlsx.iter_sheets).
+        kwargs go to insert().
+        tables: {sheet: table}; default is every sheet, table named as the sheet
+        Returns {table: rows}.
+        """
+        tables = tables or {}
+        sheets = list(tables) if tables else None
+        schema = kwargs.get('schema')
+
+        def load(table:str, df_sheet:pd.DataFrame) -> tuple:
+            if create and not self._has_table(table, schema=schema):
+                self.create_table(df_sheet, table, schema=schema, **(create_kwargs or {}))
+            self.insert(df_sheet, table, **kwargs)
+            log.info(f'insert_xlsx_sheets: {len(df_sheet)} rows into {table}')
+            return table, len(df_sheet)
+
+        result, pending = {}, set()
+        def collect(done:set) -> None:
+            for future in done:
+                table, n_rows = future.result()
+                result[table] = n_rows
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for sheet, df_sheet in iter_sheets(path_to_xlsx, sheets, header, dtype, processes):
+                pending.add(pool.submit(load, tables.get(sheet, sheet), df_sheet))
+                del df_sheet # held by its load only
+                if len(pending) >= threads:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            collect(wait(pending)[0])
+        return result
+
+    def diff(self,
+             other_db,
+             table:str,
+             keys:list,
+             other_table:str=None,
+             columns:list=None,
+             where:str=None,
+             chunks:int=DIFF_CHUNKS) -> pd.DataFrame:
+        """
+        Rows of table that differ from other_db's other_table (default: same
+        name), matched on keys; hashed on each server, so only mismatched
+        chunks are fetched. See diff.diff_tables.
+        """
+        return diff_tables(self, other_db, table, keys, right_table=other_table,
+                           columns=columns, where=where, chunks=chunks)
+
     @staticmethod
-    def merge_frames(frames:list, on:str=None):
+    def merge_frames(frames:list,
+                     on:Union[str, list]=None,
+                     how:str='inner',
+                     normalize:bool=True,
+                     categorical:bool=False) -> pd.DataFrame:
         """
-        Parameters: pass a list of dataframes
-        Notes:
-        * Uses recursion to merge frames
-        * similar to pd.concat()
-        * will merge on single-to-many keys -- SO BECAREFUL 
+        n-way join of pd.DataFrames on the key(s) `on`; each frame is indexed
+        once and joined smallest first. See df_tools.join_frames. For tables
+        on one connection, merge_tables() joins on the server instead.
         """
         if on is None:
-            print('You must pass a key to merge on. Use parameter "on=your_key".')
-            return
-        print('❤️' * len(frames))
-        if len(frames) > 2: # if more than 2 dataframes
-            # pass deeper
-            ##time.sleep(1)
-            result = merge_frames(frames[:-1], on=on) # drop the last one
-            # merge some action item
-            print('🌱' * len(frames))
-            ##time.sleep(1)
-            result = pd.merge(result, frames[-1])
-            return result
-        else: # else only two left..
-            ##time.sleep(1)
-            print('BOTTOM!!')
-            print('🌱' * len(frames))
-            # merge first pair of dataframes
-            return pd.merge(frames[0], frames[1], on=on)
-    
-    def read_sql(self, sql_statement, silent=False):
-        """ Imitation of the pandas read_sql"""
+            raise ValueError('merge_frames() needs the key(s) to join on, e.g., on="MRN"')
+        return join_frames(frames, on, how=how, normalize=normalize,
+                           categorical=categorical)
+
+    def merge_tables(self,
+                     tables:list,
+                     on:Union[str, list],
+                     how:str='inner',
+                     silent:bool=False) -> pd.DataFrame:
+        """
+        merge_frames(), pushed down: tables (names or SELECT statements) are
+        joined in one query on this connection, so only the joined rows are
+        pulled. Same output columns as merge_frames().
+        """
+        if how not in JOIN_HOWS:
+            raise ValueError(f'how must be one of {JOIN_HOWS}')
+        if how == 'outer' and self.engine.dialect.name in ('mysql', 'mariadb'):
+            raise NotImplementedError('MariaDB has no FULL OUTER JOIN; use merge_frames()')
+        keys = [on] if isinstance(on, str) else list(on)
+        ls_sources = [x.strip().rstrip(';') for x in tables]
+        ls_sources = [f'({x})' if x.upper().startswith(('SELECT', 'WITH')) else x
+                      for x in ls_sources]
+
+        # A. COLUMNS ###########################################################
+        ls_cols = []
+        with self.engine.connect() as conn:
+            for source in ls_sources:
+                result = conn.exec_driver_sql(f'SELECT * FROM {source} t WHERE 1 = 0')
+                ls_cols.append(list(result.keys()))
+                result.close()
+        lower_keys = [x.lower() for x in keys]
+        counts = {}
+        for i, cols in enumerate(ls_cols):
+            missing = [x for x in lower_keys if x not in [y.lower() for y in cols]]
+            if missing:
+                raise KeyError(f'tables[{i}] has no key column(s) {missing}')
+            for col in cols:
+                if col.lower() not in lower_keys:
+                    counts[col.lower()] = counts.get(col.lower(), 0) + 1
+
+        # B. SQL ###############################################################
+        join = {'inner' : 'INNER JOIN', 'left' : 'LEFT JOIN', 'outer' : 'FULL OUTER JOIN'}[how]
+        key_expr = {x : f't0.{x}' for x in keys}
+        ls_from = [f'{ls_sources[0]} t0']
+        for i in range(1, len(ls_sources)):
+            condition = ' AND '.join(f'{key_expr[x]} = t{i}.{x}' for x in keys)
+            ls_from.append(f'{join} {ls_sources[i]} t{i} ON {condition}')
+            if how == 'outer': # later tables match any side's key
+                key_expr = {x : f'COALESCE({key_expr[x]}, t{i}.{x})' for x in keys}
+        ls_select = [f'{key_expr[x]} AS {x}' if how == 'outer' else key_expr[x] for x in keys]
+        for i, cols in enumerate(ls_cols):
+            for col in cols:
+                if col.lower() in lower_keys:
+                    continue
+                alias = f' AS {col}_{i}' if counts[col.lower()] > 1 else ''
+                ls_select.append(f't{i}.{col}{alias}')
+        sql = f"SELECT {', '.join(ls_select)} FROM {' '.join(ls_from)}"
+        return self.read_sql(sql, silent=silent)
+
+    def table(self, table:str, schema:str=None) -> query:
+        """
+        lazy query over table, e.g.,
+        db.table('VISITS').filter(DEPT='ED').groupby('DX').agg(n=('*', 'count'))
+        compiled for this dialect and run on the server by .to_df(); see query.py
+        """
+        return query(self, table, schema)
+
+    def _compile(self, statement) -> str:
+        """SQLAlchemy statement -> SQL, values inlined where the dialect can"""
+        try:
+            compiled = statement.compile(dialect=self.engine.dialect,
+                                         compile_kwargs={'literal_binds' : True})
+        except (exc.CompileError, NotImplementedError): # e.g., no literal for a type
+            compiled = statement.compile(dialect=self.engine.dialect)
+        return str(compiled)
+
+    def read_sql(self, sql_statement, silent=False, save_hx=True,
+                 slow_threshold:float=None, compact:bool=False,
+                 arraysize:Union[int, str]=None, prefetchrows:int=None,
+                 lobs:str=None):
+        """
+        Imitation of the pandas read_sql
+        sql_statement: SQL, or a SQLAlchemy statement (e.g., query.statement)
+        slow_threshold: seconds; overrides set_slow_log() for this call
+        compact: smaller dtypes (categoricals, nullable/downcast ints, float32,
+            string[pyarrow]); the saving is printed and kept in
+            df.attrs['compact']. See df_tools.compact_frame
+        arraysize/prefetchrows: rows per fetch round trip for this call, or
+            arraysize='auto'; see set_fetch_size()
+        lobs: 'inline' fetches Oracle CLOB/BLOBs as str/bytes with the rows
+            (see lob.py; stream_lobs() and select_lazy() for large LOBs)
+        """
+        statement = None
+        if isinstance(sql_statement, ClauseElement):
+            statement, sql_statement = sql_statement, self._compile(sql_statement)
         sql = self._readify_sql(sql_statement)
         if not silent:
             print(sql)
+        st = self._stats.statement(sql, 'read_sql')
         try:
-            return pd.read_sql(sql, self.engine)
-        except exc.ResourceClosedError as error:
-            pass # if no rows returned
-        except AttributeError:
-            # AttributeError: 'OptionEngine' object has no attribute 'execute'
-            # breaking error from sqlalchemy 2.0.0+
-            from sqlalchemy import text
-            with self.engine.connect() as conn:
-                return pd.read_sql(text(sql), conn)
+            df_output = self._read_sql(sql, st, statement, compact,
+                                       arraysize=arraysize, prefetchrows=prefetchrows,
+                                       lobs=lobs)
+        finally:
+            if save_hx:
+                self._save_sql_hx(sql, st.record['total'], st.record['rows'])
+        self._check_slow(st.record, slow_threshold)
+        if compact and df_output is not None:
+            report = df_output.attrs['compact']
+            msg = f"compact: {report['bytes_before']:,} -> {report['bytes_after']:,} bytes " \
+                  f"({report['bytes_saved']:,} saved)"
+            log.info(msg)
+            if not silent:
+                print(msg)
+        return df_output
+
+    def _read_sql(self, sql:str, st, statement=None, compact:bool=False,
+                  arraysize:Union[int, str]=None, prefetchrows:int=None,
+                  lobs:str=None):
+        """
+        same steps as pd.read_sql(), split up so each phase can be timed;
+        engine.begin() commits on exit just like pandas does for DDL/DML
+        (inside db.transaction(), the transaction commits instead).
+        statement: SQLAlchemy statement to execute (with binds) instead of sql
+        """
+        with st:
+            with self._begin() as conn:
+                st.lap('connect_wait')
+                options = {k : v for k, v in [('arraysize', arraysize),
+                                              ('prefetchrows', prefetchrows),
+                                              ('lobs', lobs)] if v is not None}
+                # per execute, not conn.execution_options(): that would stick
+                # to a transaction's shared connection
+                if statement is not None:
+                    result = conn.execute(statement, execution_options=options)
+                else:
+                    result = conn.exec_driver_sql(sql, execution_options=options)
+                st.lap('execute')
+                if not result.returns_rows:
+                    if result.rowcount is not None and result.rowcount >= 0:
+                        st.record['rows'] = result.rowcount
+                    return None # if no rows returned
+                columns = list(result.keys())
+                st.record['arraysize'] = self._fetch.after_execute(result.cursor, arraysize)
+                description = result.cursor.description if compact else None
+                rows = result.fetchall()
+                st.lap('fetch')
+            # compact_frame() decides what the Decimals become, from the hints
+            df_output = pd.DataFrame.from_records(rows,
+                                                  columns=columns,
+                                                  coerce_float=not compact)
+            st.lap('to_df')
+            st.record['rows'] = len(df_output)
+            if compact:
+                df_output, report = compact_frame(df_output, description)
+                df_output.attrs['compact'] = report
+                st.lap('compact')
+                st.record['bytes'] = report['bytes_after']
+            else:
+                st.record['bytes'] = estimate_df_bytes(df_output)
+            return df_output
+
+
+    def read_sql_iter(self, sql_statement, chunksize:int=ITER_CHUNKSIZE,
+                      prefetch:int=PREFETCH_CHUNKS, silent=False, save_hx=True,
+                      compact:bool=False, arraysize:int=None) -> prefetch_reader:
+        """
+        the result of sql_statement as pd.DataFrame chunks of chunksize rows,
+        e.g., for df_chunk in db.read_sql_iter(sql): ...
+        A background thread fetches up to prefetch chunks ahead while the
+        loop body works on the current one. See prefetch.py
+        """
+        if isinstance(sql_statement, ClauseElement):
+            sql_statement = self._compile(sql_statement)
+        sql = self._readify_sql(sql_statement)
+        if not silent:
+            print(sql)
+        return prefetch_reader(self, sql, chunksize=chunksize, prefetch=prefetch,
+                               compact=compact, arraysize=arraysize, save_hx=save_hx)
+
+    def set_slow_log(self,
+                     threshold:float=1.0,
+                     path=SLOW_LOG_PATH,
+                     explain:bool=True,
+                     **kwargs) -> None:
+        """
+        Log statements slower than `threshold` seconds, with their execution
+        plan, to a rotating file. Pass threshold=None to turn it off.
+        kwargs: max_bytes, backup_count
+        """
+        if threshold is None:
+            self._slow_log = None
+        else:
+            self._slow_log = slow_query_log(threshold, path, explain=explain, **kwargs)
+
+    def stream_lobs(self,
+                    sql:str,
+                    directory,
+                    name_col:int=0,
+                    lob_col:int=1,
+                    suffix:str='',
+                    chunk_size:int=LOB_CHUNK_SIZE) -> pd.DataFrame:
+        """
+        one file per row: directory/<name_col value><suffix> holds the row's
+        lob_col, read in chunks; returns name, path, size. See lob.py
+        """
+        return stream_lobs(self, sql, directory, name_col=name_col, lob_col=lob_col,
+                           suffix=suffix, chunk_size=chunk_size)
+
+    def select_lazy(self,
+                    table:str,
+                    key:Union[str, list]=None,
+                    lob_cols:list=None,
+                    where:str=None,
+                    schema:str=None) -> pd.DataFrame:
+        """
+        table with LOB columns as lob_ref accessors (length now, .read() on
+        demand); key identifies rows, Oracle defaults to ROWID. See lob.py
+        """
+        return select_lazy(self, table, key=key, lob_cols=lob_cols, where=where,
+                           schema=schema)
+
+    def set_fetch_size(self,
+                       arraysize:Union[int, str]=None,
+                       prefetchrows:int=None,
+                       budget_mb:float=None) -> None:
+        """
+        Rows per fetch round trip for every query on this connection (the
+        db_config.ini entry sets the same: arraysize, prefetchrows,
+        fetch_budget_mb). arraysize='auto' sizes each query's batches from its
+        row width to fit budget_mb; prefetchrows defaults to arraysize + 1.
+        """
+        self._fetch.arraysize = arraysize
+        self._fetch.prefetchrows = prefetchrows
+        if budget_mb is not None:
+            self._fetch.budget = int(budget_mb * 2**20)
+
+    def _check_slow(self, record:dict, slow_threshold:float=None) -> None:
+        """writes the statement to the slow log if it was over threshold"""
+        slow_log = self._slow_log
+        if slow_log is None:
+            if slow_threshold is None:
+                return
+            # per-call threshold only: a default log for this call, not kept
+            slow_log = slow_query_log(threshold=None)
+        threshold = slow_log.threshold if slow_threshold is None else slow_threshold
+        if not slow_log.is_slow(record['total'], threshold):
+            return
+        plan, plan_format = None, None
+        if slow_log.explain and is_explainable(record['sql']):
+            try:
+                plan, plan_format = self._explain(record['sql'])
+            except Exception as error: # never fail the query over its plan
+                log.warning(f'Could not capture plan: {error}')
+        slow_log.write(self.prefix, record, threshold, plan, plan_format)
 
+    def _explain(self, sql:str) -> tuple:
+        """returns (plan, plan_format); override per dialect"""
+        return None, None
 
     def tables(self):
         try:
@@ -198,10 +680,21 @@ class SQL: # level 0
     def _readify_sql(sql_input):
         return (' ').join(sql_input.replace('\n','').split())
         
-    def _save_sql_hx(self, sql_statement):
-        sql_statement = ' '.join(sql_statement.split()) #remove extra whitespace
-        #self.sqlHx = self.sqlHx.append(pd.Series(sql_statement), ignore_index=True)
-        self.sqlHx = pd.concat([self.sqlHx, pd.Series(sql_statement)]) # fixed for pandas deprecating append()
+    def _save_sql_hx(self, sql_statement, duration=None, rowcount=None):
+        self._hx.append(sql_statement, duration, rowcount)
+
+    @property
+    def sqlHx(self) -> pd.Series:
+        """SQL text of the history, oldest first (kept for compatibility)"""
+        return pd.Series(self._hx.sql(), dtype='object')
+
+    def history(self) -> pd.DataFrame:
+        """query history: ts, sql, fingerprint, duration, rowcount"""
+        return self._hx.to_frame()
+
+    def hot_queries(self, n:int=10, by:str='total_duration') -> pd.DataFrame:
+        """top n statements grouped by fingerprint, see query_history.hot()"""
+        return self._hx.hot(n=n, by=by)
 
     def close(self):
         self.__del__()
@@ -232,6 +725,77 @@ class SQL: # level 0
             sql_statement = f"{sql_statement} WHERE {where}"
         return sql_statement  
     
+    @staticmethod
+    def _and(where:str, predicate:str) -> str:
+        if not where:
+            return predicate
+        return f'({where}) AND {predicate}'
+
+    @staticmethod
+    def _page_order(order_by:str, desc:bool) -> str:
+        """pages need one direction for every column, not just the last"""
+        if not order_by or not desc:
+            return order_by
+        return ', '.join(f'{x.strip()} DESC' for x in order_by.split(','))
+
+    def _keyset(self, order_by:str, after, desc:bool=False) -> str:
+        """
+        rows strictly after the key `after` in order_by, e.g., for (A, B):
+        (A > a) OR (A = a AND B > b), so an index on the keys seeks straight
+        to the page instead of reading and skipping the earlier rows
+        """
+        if not order_by:
+            raise ValueError('after= (keyset paging) needs order_by=')
+        cols = [x.strip() for x in order_by.split(',')]
+        values = list(after) if isinstance(after, (list, tuple)) else [after]
+        if len(values) != len(cols):
+            raise ValueError(f'after= needs one value per order_by column {cols}')
+        op = '<' if desc else '>'
+        terms = []
+        for i, col in enumerate(cols):
+            ls_equal = [f'{cols[j]} = {self._literal(values[j])}' for j in range(i)]
+            terms.append(' AND '.join(ls_equal + [f'{col} {op} {self._literal(values[i])}']))
+        if len(terms) == 1:
+            return terms[0]
+        return '(' + ' OR '.join(f'({x})' for x in terms) + ')'
+
+    @staticmethod
+    def _literal(value) -> str:
+        """a python value as a SQL literal, for keyset predicates"""
+        if value is None:
+            return 'NULL'
+        if isinstance(value, bool):
+            return '1' if value else '0'
+        if isinstance(value, (int, float, decimal.Decimal)) or pd.api.types.is_number(value):
+            return str(value)
+        if isinstance(value, datetime.datetime): # incl. pd.Timestamp
+            fmt = '%Y-%m-%d %H:%M:%S.%f' if value.microsecond else '%Y-%m-%d %H:%M:%S'
+            return f"'{value.strftime(fmt)}'"
+        if isinstance(value, datetime.date):
+            return f"'{value.strftime('%Y-%m-%d')}'"
+        return "'" + str(value).replace("'", "''") + "'"
+
+    def iter_pages(self, tbl_name:str, order_by:str, page_size:int=PAGE_SIZE,
+                   desc:bool=False, **kwargs):
+        """
+        yields pd.DataFrame pages of select(tbl_name, ...) by keyset: each page
+        starts after the last row's order_by values, so deep pages cost the
+        same as the first. order_by should be unique (e.g., the primary key)
+        and its columns selected; kwargs go to select().
+        """
+        after = None
+        while True:
+            df_page = self.select(tbl_name, order_by=order_by, desc=desc, limit=None,
+                                  page_size=page_size, after=after, **kwargs)
+            if len(df_page) == 0:
+                return
+            yield df_page
+            if len(df_page) < page_size:
+                return
+            lookup = {x.lower() : x for x in df_page.columns}
+            keys = [x.strip().split('.')[-1].lower() for x in order_by.split(',')]
+            after = tuple(df_page[lookup[x]].iloc[-1] for x in keys)
+
     @staticmethod
     def _order_by(sql_statement:str, cols:list, order_by:str, desc:bool):
         if order_by:
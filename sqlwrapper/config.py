@@ -16,14 +16,14 @@ Research Infrastructure, IT Health Informatics, UC Davis Health
 """
 import os
 import logging
+from collections import namedtuple
 from pathlib import Path, PurePath
-import pandas as pd
 
 # SQLWrapper
 #from sqlwrapper.dbmenu import db_menu
 from sqlwrapper.prompter import Prompter
 from typing import Union
-from configparser import ConfigParser, RawConfigParser
+from configparser import ConfigParser, RawConfigParser, SectionProxy
 # logging
 log = logging.getLogger(__name__)
 
@@ -46,6 +46,78 @@ LS_CONFIG_FILES = [
 # prompter
 p = Prompter()
 
+# one row of the config search: does path / file exist?
+config_candidate = namedtuple('config_candidate', ['exists', 'path', 'file'])
+
+################################################################################
+# parsed config cache: {Path: (mtime, text, {section: {key: raw_value}})}
+################################################################################
+_PARSED_CONFIGS = {}
+# parsers built from it: {(Path, parser class): (mtime, parser)}
+_BUILT_CONFIGS = {}
+
+def _cached_config(config_file) -> tuple:
+    """
+    Reads and parses the config file once per mtime. Later calls only pay an
+    os.stat(); an edited file is re-read automatically. Returns (text, parsed)
+    """
+    config_file = Path(config_file)
+    try:
+        mtime = os.path.getmtime(config_file)
+    except OSError: # same as ConfigParser.read(), missing files are skipped
+        return '', {}
+    cached = _PARSED_CONFIGS.get(config_file)
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2]
+    with open(config_file) as f: # locale encoding, as ConfigParser.read()
+        text = f.read()
+    raw = RawConfigParser()
+    raw.read_string(text, source=str(config_file))
+    parsed = {'DEFAULT' : dict(raw.defaults())}
+    for section in raw.sections():
+        parsed[section] = {k : v for k, v in raw.items(section, raw=True)}
+    _PARSED_CONFIGS[config_file] = (mtime, text, parsed)
+    log.debug(f'parsed config file {config_file}')
+    return text, parsed
+
+def _parse_config(config_file) -> dict:
+    """{section: {key: raw_value}} of the config file, cached"""
+    return _cached_config(config_file)[1]
+
+def _load_config(config_file, parser_class):
+    """
+    a parser_class over the cached text, built once per mtime and shared;
+    read_string() doesn't validate interpolation (read_dict() would, so a
+    bare % in any value would raise). Use detach_section() before editing.
+    """
+    text = _cached_config(config_file)[0]
+    cached = _PARSED_CONFIGS.get(Path(config_file))
+    if cached is None: # missing file
+        return parser_class()
+    key = (Path(config_file), parser_class)
+    built = _BUILT_CONFIGS.get(key)
+    if built is None or built[0] != cached[0]:
+        config = parser_class()
+        config.read_string(text, source=str(config_file))
+        built = _BUILT_CONFIGS[key] = (cached[0], config)
+    return built[1]
+
+def detach_section(section):
+    """
+    a copy of one section on its own parser, so a db object can edit its
+    config (e.g., SQLServer.use()) without touching the shared cached one
+    """
+    if not isinstance(section, SectionProxy):
+        return section
+    parser = RawConfigParser() # values are already interpolated, if at all
+    parser[section.name] = dict(section.items())
+    return parser[section.name]
+
+def clear_config_cache():
+    """forces the next access to re-read every config file"""
+    _PARSED_CONFIGS.clear()
+    _BUILT_CONFIGS.clear()
+
 
 class config_looker:
     """This looks for different config files on your computer"""
@@ -96,7 +168,7 @@ class config_looker:
                     return path, file
 
     def _init_if_none(self):
-        while self.df_config.empty:
+        while not self.ls_config:
             print(self.df_config_all)
             print('No config file was found.')
             msg = 'Do you want to init `db_config.ini` '
@@ -132,21 +204,34 @@ class config_looker:
         self._LS_PATH.append(path)
         #print(self.config_paths)
 
+    @property
+    def ls_config(self) -> list:
+        """config files that exist, in search order"""
+        return [x for x in self.ls_config_all if x.exists]
+
+    @property
+    def ls_config_all(self) -> list:
+        """every (exists, path, file) candidate, in search order"""
+        from os.path import exists
+        return [config_candidate(exists(path / file), path, file)
+                for path in self._LS_PATH
+                for file in self._LS_CONFIG_FILES]
+
     @property
     def df_config(self):
-        return self.df_config_all.loc[self.df_config_all['exists?'], :]
+        """display only; use ls_config for lookups"""
+        df_all = self.df_config_all
+        return df_all.loc[df_all['exists?'], :]
 
     @property
     def df_config_all(self):
-        from os.path import exists
-        return pd.DataFrame([(exists(path / file), path, file)
-             for path in self._LS_PATH 
-             for file in self._LS_CONFIG_FILES],
+        """display only; use ls_config_all for lookups"""
+        import pandas as pd
+        return pd.DataFrame(self.ls_config_all,
              columns=['exists?', 'path', 'file'])
     
     def select_config(self):
-        ls_menu = [(x,y) for x,y in zip(self.df_config['path'], 
-                                        self.df_config['file'])]
+        ls_menu = [(x.path, x.file) for x in self.ls_config]
         new_config = p.prompt_menu('Select config', ls_menu)
         print(f"Old config: {self.current}")
         print(f"New config: {new_config}")
@@ -180,23 +265,19 @@ class config_reader(config_looker):
     @property
     def config(self):
         
-        """the actual config file"""
-        config = ConfigParser()#interpolation=None)
-        config.read(self.CONFIG)
-        return config
+        """the actual config file; built from the cached text, no file I/O"""
+        return _load_config(self.CONFIG, ConfigParser)
 
     @property
     def config_raw(self):
         
-        """the actual config file"""
-        config = RawConfigParser()
-        config.read(self.CONFIG)
-        return config
+        """the actual config file; built from the cached text, no file I/O"""
+        return _load_config(self.CONFIG, RawConfigParser)
     
     @property
     def entries(self) -> list:
-        config = self.config
-        return sorted(list(config.keys()))
+        ls_entries = set(_parse_config(self.CONFIG)) | {'DEFAULT'}
+        return sorted(ls_entries)
     
     def _print_conn_msg(self, opt_print, db_entry:str, sec_path:str=None, vault=False):
         if opt_print:
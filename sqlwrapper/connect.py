@@ -1,6 +1,7 @@
 from typing import Union
 from pathlib import Path, PurePath
 from sqlwrapper.dbmenu import db_menu
+from sqlwrapper.vault import vault_cache
 from dotenv import load_dotenv
 from pathlib import Path
 import hvac
@@ -15,22 +16,32 @@ log = logging.getLogger(__name__)
 ################################################################################
 def connect_vault(sec_path='rifr/ProfilesProd',
                   db_entry:str=None,
-                  env_path=Path.cwd() / '.env'):
+                  env_path=Path.cwd() / '.env',
+                  cache=True):
     """ 
     Vault Support
     * default path for env path is current directory
+    * cache=True reuses the secret until its lease runs out and keeps the
+      db object's credentials current when the secret rotates; pass
+      cache=False to always read straight from vault
     """
-    load_dotenv(env_path)
-    #load_dotenv(Path.home() / '.mypylib' / '.env')
-    vault_client = hvac.Client(url=os.environ.get('VAULT_SERVER'),
-                               token=os.environ.get('VAULT_TOKEN'))
-    map_secrets = vault_client.read(sec_path)['data']
+    if cache:
+        map_secrets = vault_cache.read(sec_path, env_path)
+    else:
+        load_dotenv(env_path)
+        #load_dotenv(Path.home() / '.mypylib' / '.env')
+        vault_client = hvac.Client(url=os.environ.get('VAULT_SERVER'),
+                                   token=os.environ.get('VAULT_TOKEN'))
+        map_secrets = vault_client.read(sec_path)['data']
     ## DEBUG ###
     print(' connecting via Vault '.center(80, '='))
     print(os.environ.get('VAULT_SERVER').center(80, ' ') )
     print('='*80)
     menu = db_menu()
-    return menu.connect(sec_path=sec_path, map_secrets=map_secrets)
+    db = menu.connect(sec_path=sec_path, map_secrets=map_secrets)
+    if cache and db is not None:
+        vault_cache.subscribe(sec_path, db._refresh_credentials)
+    return db
     # convert this to config reader entry
     # use entry to return database
 
@@ -46,6 +57,6 @@ def connect(db_entry:str=None, sec_path:str=None, **kwargs):
     remember.
     """
     if sec_path is not None:
-        return connect_vault(sec_path=sec_path, db_entry=db_entry)
+        return connect_vault(sec_path=sec_path, db_entry=db_entry, **kwargs)
     else:
         return connect_db_config(db_entry)
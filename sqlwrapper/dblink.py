@@ -0,0 +1,240 @@
+"""
+dblink.py
+    |--> oracle.py
+
+DESCRIPTION:
+    Oracle database links, keeping cross-database work on the servers.
+    * db_links() - the links this user can see (ALL_DB_LINKS)
+    * remote_agg() - GROUP BY on a remote table, optionally joined to a local
+      table (e.g., a cohort), with /*+ DRIVING_SITE(r) */ so the local rows
+      are shipped to the remote site and only the aggregate comes back
+    * snapshot() - a local copy of a remote table, created with CREATE TABLE
+      AS SELECT over the link and refreshed incrementally: MERGE of the rows
+      changed since the local MAX(updated_col), or append-only when there is
+      no key. method='mview' uses a materialized view instead, refreshed
+      with DBMS_MVIEW.REFRESH(..., '?') - fast when the remote table has a
+      materialized view log, complete otherwise.
+
+    Deletes on the remote side are not seen by the 'table' method's
+    incremental refresh; refresh with full=True to pick them up. A full
+    reload is DELETE + INSERT in one transaction, so a failed reload leaves
+    the old rows in place (TRUNCATE would commit the empty table first).
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import logging
+import re
+import time
+
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_METHODS = ('table', 'mview')
+REMOTE_ALIAS = 'r'
+LOCAL_ALIAS = 'l'
+
+AGG_SQL = {
+    'count' : 'COUNT({})',
+    'sum' : 'SUM({})',
+    'mean' : 'AVG({})',
+    'avg' : 'AVG({})',
+    'min' : 'MIN({})',
+    'max' : 'MAX({})',
+    'nunique' : 'COUNT(DISTINCT {})',
+}
+
+
+def db_links(db) -> pd.DataFrame:
+    sql = 'SELECT owner, db_link, username, host, created FROM all_db_links ' \
+          'ORDER BY owner, db_link'
+    return db.read_sql(sql, silent=True, save_hx=False)
+
+
+def remote_name(table:str, db_link:str, schema:str=None) -> str:
+    return f'{schema}.{table}@{db_link}' if schema else f'{table}@{db_link}'
+
+
+def driving_site(sql:str, alias:str=REMOTE_ALIAS) -> str:
+    """adds /*+ DRIVING_SITE(alias) */ to the first SELECT of sql"""
+    return re.sub(r'^\s*SELECT\b', f'SELECT /*+ DRIVING_SITE({alias}) */', sql,
+                  count=1, flags=re.IGNORECASE)
+
+
+def remote_agg(db,
+               table:str,
+               db_link:str,
+               groupby:list=None,
+               agg:dict=None,
+               where:str=None,
+               local_table:str=None,
+               on:list=None,
+               schema:str=None) -> pd.DataFrame:
+    """
+    Aggregates table@db_link on the remote site.
+    * groupby - remote columns; agg - {col: func or [funcs]} (count, sum,
+      mean, min, max, nunique), default COUNT(*) AS n
+    * local_table/on - inner join to a local table on those columns first;
+      DRIVING_SITE ships it to the remote side rather than pulling the
+      remote table here. where may use the aliases r. and l.
+    """
+    groupby = [groupby] if isinstance(groupby, str) else list(groupby or [])
+    ls_select = [f'{REMOTE_ALIAS}.{x}' for x in groupby]
+    if not agg:
+        ls_select.append('COUNT(*) AS n')
+    for col, funcs in (agg or {}).items():
+        funcs = [funcs] if isinstance(funcs, str) else list(funcs)
+        for func in funcs:
+            if func not in AGG_SQL:
+                raise ValueError(f'Unknown aggregation {func}; one of {list(AGG_SQL)}')
+            label = col if len(funcs) == 1 else f'{col}_{func}'
+            ls_select.append(f'{AGG_SQL[func].format(REMOTE_ALIAS + "." + col)} AS {label}')
+    sql = f"SELECT {', '.join(ls_select)} " \
+          f"FROM {remote_name(table, db_link, schema)} {REMOTE_ALIAS}"
+    if local_table is not None:
+        if not on:
+            raise ValueError('local_table needs on= (the join columns)')
+        on = [on] if isinstance(on, str) else list(on)
+        condition = ' AND '.join(f'{REMOTE_ALIAS}.{x} = {LOCAL_ALIAS}.{x}' for x in on)
+        sql += f' JOIN {local_table} {LOCAL_ALIAS} ON {condition}'
+    if where:
+        sql += f' WHERE {where}'
+    if groupby:
+        sql += f" GROUP BY {', '.join(f'{REMOTE_ALIAS}.{x}' for x in groupby)}"
+    return db.read_sql(driving_site(sql))
+
+
+################################################################################
+# snapshots
+################################################################################
+def snapshot(db,
+             table:str,
+             db_link:str,
+             local_table:str=None,
+             key:list=None,
+             updated_col:str=None,
+             where:str=None,
+             schema:str=None,
+             method:str='table',
+             full:bool=False,
+             nologging:bool=True,
+             print_bool:bool=True) -> dict:
+    """
+    Creates local_table (default: table) as a copy of table@db_link, or
+    refreshes it if it exists:
+    * method='table' - key and updated_col: MERGE of the remote rows with
+      updated_col past the local maximum; updated_col only: append them;
+      neither (or full=True): DELETE and reload, in one transaction
+    * method='mview' - DBMS_MVIEW.REFRESH, fast if the remote has an MV log
+    where filters the remote rows, on creation and on every refresh.
+    print_bool: print each statement before it runs.
+    Returns a report: table, method, action, rows, seconds, watermark.
+    """
+    if method not in SNAPSHOT_METHODS:
+        raise ValueError(f'method must be one of {SNAPSHOT_METHODS}')
+    local_table = local_table or table
+    remote = remote_name(table, db_link, schema)
+    source = f'SELECT * FROM {remote}' + (f' WHERE {where}' if where else '')
+    logging_clause = ' NOLOGGING' if nologging else ''
+    start_time = time.perf_counter()
+    report = {'table' : local_table, 'method' : method, 'action' : None,
+              'rows' : None, 'seconds' : None, 'watermark' : None}
+
+    if not db._has_table(local_table):
+        if method == 'mview':
+            _execute(db, f'CREATE MATERIALIZED VIEW {local_table}{logging_clause} '
+                         f'BUILD IMMEDIATE REFRESH FORCE ON DEMAND AS {source}',
+                     print_bool=print_bool)
+        else:
+            _execute(db, f'CREATE TABLE {local_table}{logging_clause} AS {source}',
+                     print_bool=print_bool)
+        db.inspector.clear_cache()
+        report['action'] = 'created'
+        report['rows'] = _count(db, local_table)
+    elif method == 'mview':
+        refresh = 'C' if full else '?'
+        _execute(db, f"BEGIN DBMS_MVIEW.REFRESH('{local_table}', '{refresh}'); END;",
+                 print_bool=print_bool)
+        report['action'] = 'complete' if full else 'refresh'
+        report['rows'] = _count(db, local_table)
+    elif full or updated_col is None:
+        # not TRUNCATE (it commits) nor APPEND (loads above the deleted space)
+        report['rows'] = _execute_all(db, [f'DELETE FROM {local_table}',
+                                           f'INSERT INTO {local_table} {source}'],
+                                      print_bool=print_bool)[-1]
+        report['action'] = 'complete'
+    else:
+        report.update(_incremental(db, local_table, remote, key, updated_col, where,
+                                   print_bool))
+    report['seconds'] = time.perf_counter() - start_time
+    log.info(f"snapshot {remote} -> {local_table}: {report['action']}, " \
+             f"{report['rows']} rows in {report['seconds']:.2f}s")
+    return report
+
+
+def _incremental(db, local_table:str, remote:str, key:list, updated_col:str,
+                 where:str=None, print_bool:bool=True) -> dict:
+    """rows of remote with updated_col past the local high-water mark"""
+    with db.engine.connect() as conn:
+        watermark = conn.exec_driver_sql(f'SELECT MAX({updated_col}) FROM {local_table}').scalar()
+    predicates = [f'({where})'] if where else []
+    params = {}
+    if watermark is not None:
+        # rows sharing the max timestamp may have arrived after the last
+        # refresh; >= re-reads them, which only the keyed MERGE can absorb
+        op = '>' if key is None else '>='
+        predicates.append(f'{updated_col} {op} :watermark')
+        params['watermark'] = watermark
+    changed = f'SELECT * FROM {remote}' \
+              + (f" WHERE {' AND '.join(predicates)}" if predicates else '')
+    if key is None: # append-only, e.g., logs
+        rows = _execute(db, f'INSERT INTO {local_table} {changed}', params, print_bool)
+        return {'action' : 'append', 'rows' : rows, 'watermark' : watermark}
+
+    keys = [key] if isinstance(key, str) else list(key)
+    lower_keys = {x.lower() for x in keys}
+    cols = [x['name'] for x in db.inspector.get_columns(local_table.lower())]
+    others = [x for x in cols if x.lower() not in lower_keys]
+    condition = ' AND '.join(f'{LOCAL_ALIAS}.{x} = {REMOTE_ALIAS}.{x}' for x in keys)
+    sql = f'MERGE INTO {local_table} {LOCAL_ALIAS} USING ({changed}) {REMOTE_ALIAS} ' \
+          f'ON ({condition})'
+    if others:
+        sql += ' WHEN MATCHED THEN UPDATE SET ' \
+               + ', '.join(f'{LOCAL_ALIAS}.{x} = {REMOTE_ALIAS}.{x}' for x in others)
+    sql += f" WHEN NOT MATCHED THEN INSERT ({', '.join(cols)}) " \
+           f"VALUES ({', '.join(f'{REMOTE_ALIAS}.{x}' for x in cols)})"
+    rows = _execute(db, sql, params, print_bool)
+    return {'action' : 'merge', 'rows' : rows, 'watermark' : watermark}
+
+
+def _execute(db, sql:str, params:dict=None, print_bool:bool=True) -> int:
+    """one statement, committed; timed and kept in history. Returns rowcount"""
+    return _execute_all(db, [sql], params, print_bool)[0]
+
+
+def _execute_all(db, ls_sql:list, params:dict=None, print_bool:bool=True) -> list:
+    """
+    statements in one transaction, committed together or rolled back
+    together; each timed and kept in history. Returns their rowcounts
+    """
+    ls_rows, ls_hx = [], []
+    with db.engine.begin() as conn:
+        for sql in ls_sql:
+            if print_bool:
+                print(sql)
+            with db._stats.statement(sql, 'snapshot') as st:
+                result = conn.exec_driver_sql(sql, params or None)
+                st.lap('execute')
+                rows = result.rowcount if result.rowcount is not None and result.rowcount >= 0 else None
+                st.record['rows'] = rows
+            ls_rows.append(rows)
+            ls_hx.append((sql, st.record['total'], rows))
+    for sql, total, rows in ls_hx: # only once committed
+        db._save_sql_hx(sql, total, rows)
+    return ls_rows
+
+
+def _count(db, table:str) -> int:
+    with db.engine.connect() as conn:
+        return conn.exec_driver_sql(f'SELECT COUNT(*) FROM {table}').scalar()
@@ -1,8 +1,363 @@
+"""
+df_tools.py
+
+DESCRIPTION:
+    Schema inference for pd.DataFrames and DDL generation.
+    * infer_schema() - one vectorized pass per column: kind, max length,
+      numeric precision/scale, nullability and date detection. Accepts a
+      DataFrame, or an iterable of DataFrame chunks (e.g., read_csv or
+      read_sql with chunksize) for frames larger than memory; `sample=` only
+      looks at a random subset of rows.
+    * schema_to_ddl() / generate_create_statement() - CREATE TABLE for
+      Oracle, SQL Server and MariaDB
+    * max_len_cols() - the older helpers, now built on infer_schema()
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import math
+import numpy as np
 import pandas as pd
-import warnings
-from sqlalchemy.dialects.oracle import NUMBER, VARCHAR2, DATE
-#from typing import Union
+from sqlalchemy.dialects.oracle import NUMBER, VARCHAR2, DATE, TIMESTAMP, \
+    BINARY_DOUBLE, CLOB
+from typing import Union, Iterable
+
+# widening order; mixing families (e.g., int + date) falls back to string
+KINDS_NUMERIC = ['bool', 'int', 'decimal', 'float']
+KINDS_TEMPORAL = ['date', 'datetime']
+
+# scale (digits after the decimal point) checked before giving up -> float
+MAX_SCALE = 10
+# rows checked before trying to parse a whole string column as dates
+DATE_PROBE_ROWS = 1000
+
+
+class column_stats:
+    """what infer_schema() knows about one column; chunks merge()"""
+    def __init__(self, name:str):
+        self.name = name
+        self.kind = 'null'     # null, bool, int, decimal, float, date, datetime, string
+        self.count = 0         # rows seen
+        self.nulls = 0
+        self.max_len = 0       # chars, as str(); for strings this is the width
+        self.int_digits = 0    # digits left of the decimal point
+        self.scale = 0         # digits right of the decimal point
+        self.min = None
+        self.max = None
+        self.sampled = False
+
+    def __repr__(self):
+        return (f'column_stats({self.name!r}, kind={self.kind!r}, '
+                f'max_len={self.max_len}, precision={self.precision}, '
+                f'scale={self.scale}, nullable={self.nullable})')
+
+    @property
+    def nullable(self) -> bool:
+        """sampled columns are always nullable; we never saw every row"""
+        return self.sampled or self.nulls > 0 or self.count == 0
+
+    @property
+    def precision(self) -> int:
+        return max(self.int_digits + self.scale, 1)
+
+    def merge(self, other:'column_stats') -> 'column_stats':
+        self.kind = _merge_kind(self.kind, other.kind)
+        self.count += other.count
+        self.nulls += other.nulls
+        self.max_len = max(self.max_len, other.max_len)
+        self.int_digits = max(self.int_digits, other.int_digits)
+        self.scale = max(self.scale, other.scale)
+        self.sampled = self.sampled or other.sampled
+        if self.kind in KINDS_NUMERIC[1:] or self.kind in KINDS_TEMPORAL:
+            try:
+                self.min = other.min if self.min is None else \
+                    (self.min if other.min is None else min(self.min, other.min))
+                self.max = other.max if self.max is None else \
+                    (self.max if other.max is None else max(self.max, other.max))
+            except TypeError: # e.g., date vs datetime
+                pass
+        return self
+
+    def to_dict(self) -> dict:
+        return {'name' : self.name, 'kind' : self.kind, 'nullable' : self.nullable,
+                'max_len' : self.max_len, 'precision' : self.precision,
+                'scale' : self.scale, 'min' : self.min, 'max' : self.max,
+                'nulls' : self.nulls, 'count' : self.count}
+
+
+def _merge_kind(a:str, b:str) -> str:
+    if a == 'null':
+        return b
+    if b == 'null' or a == b:
+        return a
+    for family in (KINDS_NUMERIC, KINDS_TEMPORAL):
+        if a in family and b in family:
+            return family[max(family.index(a), family.index(b))]
+    return 'string'
+
+
+################################################################################
+# A. INFERENCE
+################################################################################
+def infer_schema(data:Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                 sample:int=None,
+                 detect_dates:bool=True,
+                 max_scale:int=MAX_SCALE,
+                 random_state:int=0) -> dict:
+    """
+    returns {column_name: column_stats}, in column order
+    * data - a DataFrame, or an iterable of DataFrame chunks (streaming)
+    * sample - only inspect this many random rows per frame/chunk; lengths
+      may be underestimated, so pad them with schema_to_ddl(factor=)
+    * detect_dates - string columns that are all ISO dates become date/datetime
+    """
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+    schema = {}
+    for df_chunk in chunks:
+        sampled = sample is not None and len(df_chunk) > sample
+        if sampled:
+            df_chunk = df_chunk.sample(n=sample, random_state=random_state)
+        for col in df_chunk.columns:
+            stats = _infer_series(str(col), df_chunk[col], detect_dates, max_scale)
+            stats.sampled = sampled
+            if col in schema:
+                schema[col].merge(stats)
+            else:
+                schema[col] = stats
+    return schema
+
+
+def _infer_series(name:str, s:pd.Series, detect_dates:bool, max_scale:int) -> column_stats:
+    stats = column_stats(name)
+    mask = s.notna()
+    values = s[mask]
+    stats.count = len(s)
+    stats.nulls = int(len(s) - len(values))
+    if len(values) == 0:
+        return stats
+    dtype = s.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        stats.kind, stats.max_len, stats.int_digits = 'bool', 1, 1
+    elif pd.api.types.is_integer_dtype(dtype):
+        _int_stats(stats, values)
+    elif pd.api.types.is_float_dtype(dtype):
+        _float_stats(stats, values.astype('float64'), max_scale)
+    elif pd.api.types.is_datetime64_any_dtype(dtype):
+        _datetime_stats(stats, values)
+    else:
+        _object_stats(stats, values, detect_dates, max_scale)
+    return stats
+
+
+def _int_stats(stats:column_stats, values:pd.Series) -> None:
+    vmin, vmax = int(values.min()), int(values.max())
+    stats.kind = 'int'
+    stats.min, stats.max = vmin, vmax
+    stats.int_digits = len(str(max(abs(vmin), abs(vmax))))
+    stats.max_len = max(len(str(vmin)), len(str(vmax)))
+
+
+def _float_stats(stats:column_stats, values:pd.Series, max_scale:int) -> None:
+    arr = values.to_numpy()
+    if not np.isfinite(arr).all():
+        stats.kind, stats.max_len = 'float', 24
+        return
+    if (np.mod(arr, 1) == 0).all() and np.abs(arr).max() < 2 ** 53: # ints stored as float (NaN)
+        _int_stats(stats, values.astype('int64'))
+        return
+    vmax_abs = float(np.abs(arr).max())
+    stats.int_digits = len(str(int(vmax_abs))) if vmax_abs >= 1 else 1
+    stats.min, stats.max = float(arr.min()), float(arr.max())
+    for scale in range(1, max_scale + 1):
+        # exact: an absolute tolerance would let 3.2e-9 pass at scale 2
+        if (np.round(arr, scale) == arr).all():
+            stats.kind, stats.scale = 'decimal', scale
+            stats.max_len = stats.int_digits + scale + 2 # sign and point
+            return
+    stats.kind, stats.max_len = 'float', 24
+
+
+def _decimal_stats(stats:column_stats, values:pd.Series) -> None:
+    """python Decimals, e.g., NUMBER columns fetched as decimal.Decimal"""
+    exponents = values.map(lambda x: x.as_tuple().exponent)
+    stats.scale = max(int(-exponents.min()), 0)
+    vmax_abs = max(abs(values.min()), abs(values.max()))
+    stats.int_digits = max(len(str(int(vmax_abs))), 1)
+    stats.kind = 'decimal' if stats.scale > 0 else 'int'
+    stats.min, stats.max = values.min(), values.max()
+    stats.max_len = stats.int_digits + stats.scale + 2
+
+
+def _datetime_stats(stats:column_stats, values:pd.Series) -> None:
+    values = pd.to_datetime(values)
+    has_time = (values != values.dt.normalize()).any()
+    stats.kind = 'datetime' if has_time else 'date'
+    stats.min, stats.max = values.min(), values.max()
+    stats.max_len = 26 if has_time else 10
+
+
+def _object_stats(stats:column_stats, values:pd.Series, detect_dates:bool, max_scale:int) -> None:
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred == 'boolean':
+        stats.kind, stats.max_len, stats.int_digits = 'bool', 1, 1
+    elif inferred == 'integer':
+        _int_stats(stats, values)
+    elif inferred in ('floating', 'mixed-integer-float'):
+        _float_stats(stats, values.astype('float64'), max_scale)
+    elif inferred == 'decimal':
+        _decimal_stats(stats, values)
+    elif inferred in ('date', 'datetime', 'datetime64'):
+        _datetime_stats(stats, values)
+    elif inferred == 'string' and detect_dates and _looks_like_dates(values):
+        _datetime_stats(stats, pd.to_datetime(values, format='ISO8601'))
+    else:
+        stats.kind = 'string'
+        strings = values if inferred == 'string' else values.astype(str)
+        stats.max_len = int(strings.str.len().max())
+
+
+def _looks_like_dates(values:pd.Series) -> bool:
+    """ISO-8601 only (YYYY-MM-DD...), so codes like '000136' stay strings"""
+    head = values.iloc[:DATE_PROBE_ROWS]
+    if not head.str.match(r'^\d{4}-\d{2}-\d{2}').all():
+        return False
+    try:
+        parsed = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    except (ValueError, TypeError): # older pandas without format='ISO8601'
+        return False
+    return bool(parsed.notna().all())
+
+
+################################################################################
+# B. TYPES + DDL
+################################################################################
+DIALECTS = ['oracle', 'sqlserver', 'mariadb']
+
+def column_type(stats:column_stats, dialect:str='oracle', factor:float=1.0) -> str:
+    """smallest sensible column type, as DDL text"""
+    dialect = dialect.lower().replace('mysql', 'mariadb').replace('mssql', 'sqlserver')
+    if dialect not in DIALECTS:
+        raise ValueError(f'dialect must be one of {DIALECTS}')
+    kind = stats.kind
+    length = max(int(math.ceil(stats.max_len * factor)), 1)
+    precision = stats.precision
+    if kind == 'null':
+        kind, length = 'string', max(length, 1)
+    if kind == 'decimal' and precision > {'oracle' : 38, 'sqlserver' : 38, 'mariadb' : 65}[dialect]:
+        kind = 'float'
+    if dialect == 'oracle':
+        if kind == 'int':
+            return f'NUMBER({precision})' if precision <= 38 else 'NUMBER'
+        return {
+            'bool' : 'NUMBER(1)',
+            'decimal' : f'NUMBER({precision},{stats.scale})',
+            'float' : 'BINARY_DOUBLE',
+            'date' : 'DATE',
+            'datetime' : 'TIMESTAMP',
+            'string' : f'VARCHAR2({length} CHAR)' if length <= 4000 else 'CLOB',
+        }[kind]
+    elif dialect == 'sqlserver':
+        if kind == 'int':
+            return _sized_int(stats, [('TINYINT', 0, 255), ('SMALLINT', -2**15, 2**15 - 1),
+                                      ('INT', -2**31, 2**31 - 1), ('BIGINT', -2**63, 2**63 - 1)],
+                              f'DECIMAL({min(precision, 38)},0)')
+        return {
+            'bool' : 'BIT',
+            'decimal' : f'DECIMAL({precision},{stats.scale})',
+            'float' : 'FLOAT',
+            'date' : 'DATE',
+            'datetime' : 'DATETIME2',
+            'string' : f'NVARCHAR({length})' if length <= 4000 else 'NVARCHAR(MAX)',
+        }[kind]
+    elif dialect == 'mariadb':
+        if kind == 'int':
+            return _sized_int(stats, [('TINYINT', -128, 127), ('SMALLINT', -2**15, 2**15 - 1),
+                                      ('MEDIUMINT', -2**23, 2**23 - 1), ('INT', -2**31, 2**31 - 1),
+                                      ('BIGINT', -2**63, 2**63 - 1)],
+                              f'DECIMAL({min(precision, 65)},0)')
+        return {
+            'bool' : 'BOOLEAN',
+            'decimal' : f'DECIMAL({precision},{min(stats.scale, 30)})',
+            'float' : 'DOUBLE',
+            'date' : 'DATE',
+            'datetime' : 'DATETIME(6)',
+            'string' : f'VARCHAR({length})' if length <= 16383 else 'LONGTEXT',
+        }[kind]
+
+
+def _sized_int(stats:column_stats, ls_types:list, fallback:str) -> str:
+    if stats.min is None:
+        return ls_types[0][0]
+    for name, lo, hi in ls_types:
+        if lo <= stats.min and stats.max <= hi:
+            return name
+    return fallback
+
+
+def _quote(name:str, dialect:str) -> str:
+    if dialect == 'mariadb':
+        return f'`{name}`'
+    if dialect == 'sqlserver':
+        return f'[{name}]'
+    return f'"{name}"'
+
+
+def schema_to_ddl(schema:dict,
+                  table_name:str,
+                  dialect:str='oracle',
+                  factor:float=1.0,
+                  not_null:bool=False,
+                  schema_name:str=None,
+                  table_options:str=None) -> str:
+    """
+    CREATE TABLE from infer_schema() output
+    * factor - headroom on string lengths, e.g., 1.5
+    * not_null - add NOT NULL where no nulls were seen (never when sampled)
+    * table_options - appended after the column list, e.g., 'NOLOGGING'
+    """
+    dialect = dialect.lower().replace('mysql', 'mariadb').replace('mssql', 'sqlserver')
+    full_name = _quote(table_name, dialect)
+    if schema_name:
+        full_name = f'{_quote(schema_name, dialect)}.{full_name}'
+    ls_cols = []
+    for stats in schema.values():
+        col = f'    {_quote(stats.name, dialect)} {column_type(stats, dialect, factor)}'
+        if not_null and not stats.nullable:
+            col += ' NOT NULL'
+        ls_cols.append(col)
+    ddl = f'CREATE TABLE {full_name} (\n' + ',\n'.join(ls_cols) + '\n)'
+    if table_options:
+        ddl += f' {table_options}'
+    return ddl
+
+
+def generate_create_statement(df_input:pd.DataFrame,
+                              table_name:str,
+                              extra_space:float=1.5,
+                              dialect:str='oracle',
+                              sample:int=None,
+                              not_null:bool=False,
+                              print_bool:bool=True) -> str:
+    """
+    Generates the CREATE TABLE statement for df_input; string lengths are
+    padded by extra_space. df_input may also be an iterable of chunks.
+    """
+    schema = infer_schema(df_input, sample=sample)
+    ddl = schema_to_ddl(schema, table_name, dialect=dialect,
+                        factor=extra_space, not_null=not_null)
+    if print_bool:
+        print(ddl + ';')
+    return ddl
+
 
+def schema_report(schema:dict) -> pd.DataFrame:
+    """infer_schema() output as a DataFrame, for eyeballing"""
+    return pd.DataFrame([x.to_dict() for x in schema.values()])
+
+
+################################################################################
+# C. max_len_cols (older interface)
+################################################################################
 def max_len_cols(df_input:pd.DataFrame, method='default', *args,  **kwargs):
     """
     Manages calling the two functions:
@@ -14,69 +369,370 @@ def max_len_cols(df_input:pd.DataFrame, method='default', *args,  **kwargs):
     else:
         return max_len_cols_default(df_input, *args, **kwargs)
 
-def max_len_cols_default(df_input:pd.DataFrame) -> dict:
-    """returns a dict of max count of each column in pd.DataFrame"""
+def max_len_cols_default(df_input:pd.DataFrame, sample:int=None) -> dict:
+    """returns a dict of max count of each string column, else the dtype"""
     max_len = {}
-    df_input = df_input.fillna('')
-    for col in df_input.columns:
-        try:
-            max_len[col.upper()] = int(df_input[col].str.len().max())
-        except AttributeError as error:
+    for col, stats in infer_schema(df_input, sample=sample, detect_dates=False).items():
+        if stats.kind == 'string':
+            max_len[col.upper()] = stats.max_len
+        else:
             max_len[col] = df_input[col].dtype
     return max_len
 
-def max_len_cols_oracle(df_input:pd.DataFrame, factor=1) -> dict:
-    """returns datatype with ORACLE NUMBER TYPE"""
-    max_len = {}
-    for col in df_input.columns:
-        try:
-            warnings.filterwarnings("ignore")
-            #if df_input[col].dtype.name is 'bool':
-            if df_input[col].dtype.name == 'bool':
-                max_len[col] = NUMBER(1,0)
-            else:
-                max_len[col.upper()] = df_input[col].str.len().max()
-        except AttributeError as error:
-            if 'date' in col.lower():
-                max_len[col.upper()] = 'date'
-            print(error)
-            print(col)
-    #  setting datatypes
-    warnings.filterwarnings("default")
+def max_len_cols_oracle(df_input:pd.DataFrame, factor=1, sample:int=None) -> dict:
+    """returns sqlalchemy Oracle types, e.g., for df.to_sql(dtype=...)"""
     result_dict = {}
-    for col, dtype in max_len.items():
-        try:
-            if 'date' in col.lower():
-                result_dict[col] = DATE
-            elif type(dtype) == NUMBER:
-                result_dict[col.upper()] = dtype
-            else:
-                result_dict[col] = VARCHAR2(int(int(dtype)* factor))
-        except:
-            print(col, dtype)
-            result_dict[col] = VARCHAR2(100)
+    for col, stats in infer_schema(df_input, sample=sample).items():
+        length = max(int(math.ceil(stats.max_len * factor)), 1)
+        if stats.kind == 'bool':
+            dtype = NUMBER(1, 0)
+        elif stats.kind == 'int':
+            dtype = NUMBER(min(stats.precision, 38), 0)
+        elif stats.kind == 'decimal' and stats.precision <= 38:
+            dtype = NUMBER(stats.precision, stats.scale)
+        elif stats.kind in ('decimal', 'float'):
+            dtype = BINARY_DOUBLE
+        elif stats.kind == 'date':
+            dtype = DATE
+        elif stats.kind == 'datetime':
+            dtype = TIMESTAMP
+        elif length > 4000:
+            dtype = CLOB
+        else:
+            dtype = VARCHAR2(length)
+        result_dict[col.upper()] = dtype
     return result_dict
 
 
+################################################################################
+# D. JOINS
+################################################################################
+JOIN_HOWS = ('inner', 'left', 'outer')
 
-def generate_create_statement(df_input:pd.DataFrame, table_name:str, extra_space:int=1.5) -> list:
+def join_frames(frames:list,
+                on:Union[str, list],
+                how:str='inner',
+                normalize:bool=True,
+                categorical:bool=False) -> pd.DataFrame:
     """
-    This function is not meant to perfectly generate the create statement,
-    but rather, it will give you a skeleton to work with
+    n-way join of frames on the key column(s) `on`.
+    * each frame is indexed on the key once; when the keys don't repeat,
+      the base frame's keys are looked up once per frame and the rows taken
+      by position, with no intermediate merge results
+    * inner joins start from the smallest frame, so intermediates only
+      shrink; left joins keep frames[0] as the left side
+    * normalize - cast each key to one dtype across frames, e.g., int64 from
+      one source and float64 or numbers-as-text from another
+    * categorical - text keys become categoricals with shared categories, so
+      the joins compare integer codes
+    Non-key columns found in several frames get a '_<frame number>' suffix.
+    Returns the keys, then the other columns in frames order.
     """
-    map_cols = max_len_cols(df_input)
-    ls_cols = sorted(list(map_cols.keys()))
-    ls_result = [f'CREATE TABLE "{table_name}" ( \n']
-    for col in ls_cols:
-        col_name = col
-        if type(map_cols[col]) == int: # if oracle string
-            col_length = map_cols[col]
-            col_length = col_length* extra_space
-            col_name += f'\t VARCHAR2({str(col_length)}), \n'
-        else:
-            col_name += f' {str(map_cols[col])}, \n'
-        ls_result.append(col_name)
-    ls_result.append(');')
-    print(''.join(ls_result))
-    return ls_result
+    if how not in JOIN_HOWS:
+        raise ValueError(f'how must be one of {JOIN_HOWS}')
+    keys = [on] if isinstance(on, str) else list(on)
+    if not frames:
+        raise ValueError('No frames to join')
+    for i, df in enumerate(frames):
+        missing = [x for x in keys if x not in df.columns]
+        if missing:
+            raise KeyError(f'frames[{i}] has no key column(s) {missing}')
+    if len(frames) == 1:
+        return frames[0].copy()
+
+    # A. KEYS ##################################################################
+    key_values = {} # key -> the converted key of each frame
+    for key in keys:
+        ls_series = [df[key] for df in frames]
+        normalized = _normalize_keys(ls_series) if normalize else None
+        if normalized is not None:
+            ls_series = normalized
+        if categorical and all(pd.api.types.is_string_dtype(s) for s in ls_series):
+            categories = pd.Index([])
+            for s in ls_series:
+                categories = categories.union(pd.Index(s.dropna().unique()))
+            ls_series = [s.astype(pd.CategoricalDtype(categories)) for s in ls_series]
+            normalized = ls_series
+        if normalized is not None:
+            key_values[key] = ls_series
+
+    # B. INDEX ONCE ############################################################
+    counts = {}
+    for df in frames:
+        for col in df.columns:
+            if col not in keys:
+                counts[col] = counts.get(col, 0) + 1
+    ls_indexed, ls_cols = [], []
+    for i, df in enumerate(frames):
+        rename = {x : f'{x}_{i}' for x in df.columns if counts.get(x, 0) > 1}
+        df = df.rename(columns=rename) if rename else df
+        if key_values:
+            df = df.assign(**{k : v[i] for k, v in key_values.items()})
+        ls_indexed.append(df.set_index(keys))
+        ls_cols += [x for x in df.columns if x not in keys]
+
+    # C. JOIN ##################################################################
+    if how == 'left':
+        base, others = ls_indexed[0], sorted(ls_indexed[1:], key=len)
+    else:
+        ordered = sorted(ls_indexed, key=len)
+        base, others = ordered[0], ordered[1:]
+    # concat can't align a repeated key, so an outer join needs a unique base
+    if not all(x.index.is_unique for x in others) \
+            or (how == 'outer' and not base.index.is_unique):
+        df_joined = base
+        for df in others: # one index join per frame when keys repeat
+            df_joined = df_joined.join(df, how=how)
+        df_joined = df_joined.reset_index()
+    elif how == 'outer':
+        df_joined = pd.concat([base] + others, axis=1, join='outer').reset_index()
+    else:
+        # one hash lookup of the base keys per frame, then positional takes
+        positions = [x.index.get_indexer(base.index) for x in others]
+        if how == 'inner':
+            mask = np.logical_and.reduce([x >= 0 for x in positions])
+            base, positions = base[mask], [x[mask] for x in positions]
+        parts = [base.reset_index()]
+        for df, pos in zip(others, positions):
+            if how == 'inner':
+                parts.append(df.iloc[pos].reset_index(drop=True))
+            else:
+                parts.append(df.reindex(base.index).reset_index(drop=True))
+        df_joined = pd.concat(parts, axis=1)
+    return df_joined[keys + ls_cols]
+
+
+def _normalize_keys(ls_series:list) -> Union[list, None]:
+    """the key of each frame cast to one dtype, or None if they already agree"""
+    dtypes = [x.dtype for x in ls_series]
+    if all(x == dtypes[0] for x in dtypes):
+        return None
+    if all(pd.api.types.is_datetime64_any_dtype(x) for x in dtypes):
+        return [x.astype('datetime64[ns]') for x in ls_series]
+    numeric = []
+    for s in ls_series: # numbers as text, e.g., from read_csv or xlsx, join numbers
+        if pd.api.types.is_bool_dtype(s):
+            break
+        if not pd.api.types.is_numeric_dtype(s):
+            try:
+                s = pd.to_numeric(s)
+            except (ValueError, TypeError):
+                break
+        numeric.append(s)
+    else:
+        is_whole = all(pd.api.types.is_integer_dtype(s) \
+                       or bool((s.dropna() % 1 == 0).all()) for s in numeric)
+        if is_whole: # 3 and 3.0 join either way; Int64 keeps NULL keys
+            return [s.astype('Int64') for s in numeric]
+        return [s.astype('float64') for s in numeric]
+    return [x.astype('string') for x in ls_series]
+
+
+################################################################################
+# E. COMPACT DTYPES
+################################################################################
+# text columns with at most this share of distinct values -> categorical
+CATEGORY_RATIO = 0.5
+# rows checked before counting distinct values over a whole column
+CATEGORY_PROBE_ROWS = 10000
+# NUMBER(p, 0) with p up to this fits int64
+INT64_DIGITS = 18
+# DECIMAL(p, s) with p up to this converts to float64 without loss
+FLOAT64_DIGITS = 15
+
+try:
+    import pyarrow # noqa: F401
+    COMPACT_STRING = pd.StringDtype('pyarrow')
+except ImportError: # python strings save nothing over object
+    COMPACT_STRING = None
+
+def compact_frame(df_input:pd.DataFrame,
+                  description:list=None,
+                  category_ratio:float=CATEGORY_RATIO) -> tuple:
+    """
+    Smaller dtypes for a query result, without changing any value:
+    * text - categorical when few values repeat a lot (codes, statuses),
+      else string[pyarrow] when pyarrow is installed
+    * integers - the smallest numpy int; with NULLs (float64 from the
+      driver) or as Decimals, the smallest nullable Int8..Int64
+    * floats - float32 when every value survives the round trip
+    * bool with NULLs - nullable boolean
+    description: cursor.description; (p, s) of NUMBER/DECIMAL columns tells
+    whole numbers from decimals without looking at the values.
+    Returns (df, report), report being bytes before/after/saved and
+    {column: (old dtype, new dtype)}.
+    """
+    hints = {}
+    for col in description or []:
+        precision, scale = col[4], col[5]
+        if precision is not None and scale is not None and precision > 0:
+            hints[col[0].lower()] = (precision, scale)
+
+    bytes_before = int(df_input.memory_usage(deep=True).sum())
+    df_output, changes = df_input.copy(deep=False), {}
+    for col in df_input.columns:
+        s = df_input[col]
+        new = _compact_series(s, hints.get(str(col).lower()), category_ratio)
+        if new is not None and new.dtype != s.dtype:
+            df_output[col] = new
+            changes[col] = (str(s.dtype), str(new.dtype))
+    bytes_after = int(df_output.memory_usage(deep=True).sum())
+    report = {
+        'bytes_before' : bytes_before,
+        'bytes_after' : bytes_after,
+        'bytes_saved' : bytes_before - bytes_after,
+        'columns' : changes,
+    }
+    return df_output, report
+
+class compact_plan:
+    """
+    compact_frame() for a stream of chunks of one result: the first chunk
+    picks the dtypes, the others are cast to them, so the chunks agree.
+    * integers are nullable, in case NULLs only show up later, and as wide
+      as the column's NUMBER(p, 0)/DECIMAL(p, 0) precision when known
+    * a chunk that doesn't fit widens its column from then on (e.g., Int8
+      -> Int16, float32 -> float64); report['widened'] lists those
+    * categoricals add the values they haven't seen to the end of the
+      categories, so the codes of earlier values never change and the last
+      chunk's categories cover all the chunks before it (cast the chunks to
+      it before pd.concat() to keep the column categorical)
+    """
+    def __init__(self, description:list=None, category_ratio:float=CATEGORY_RATIO):
+        self.description = description
+        self.category_ratio = category_ratio
+        self.hints = None
+        self.dtypes = None # {column: dtype}, the compacted columns
+
+    def apply(self, df_input:pd.DataFrame) -> tuple:
+        """(df, report) as from compact_frame(), in this plan's dtypes"""
+        if self.dtypes is None:
+            df_output, report = compact_frame(df_input, self.description, self.category_ratio)
+            self.hints = {str(x[0]).lower() : (x[4], x[5]) for x in self.description or []
+                          if x[4] is not None and x[5] is not None and x[4] > 0}
+            self.dtypes = {}
+            for col in report['columns']:
+                dtype = df_output[col].dtype
+                if pd.api.types.is_integer_dtype(dtype):
+                    dtype = _wider(dtype, dtype) # nullable
+                    hint = self.hints.get(str(col).lower())
+                    if hint is not None and hint[1] == 0 and hint[0] <= INT64_DIGITS:
+                        top = 10**hint[0] - 1 # NUMBER(p, 0): size for p digits
+                        dtype = _wider(dtype, _smallest_int(pd.Series([-top, top]), True))
+                    dtype = pd.api.types.pandas_dtype(dtype)
+                    df_output[col] = df_output[col].astype(dtype)
+                self.dtypes[col] = dtype
+            report['widened'] = {}
+            return df_output, report
+
+        bytes_before = int(df_input.memory_usage(deep=True).sum())
+        df_output, changes, widened = df_input.copy(deep=False), {}, {}
+        for col, dtype in self.dtypes.items():
+            s = df_input[col]
+            new = self._cast(col, s, dtype)
+            if new.dtype != dtype and not isinstance(dtype, pd.CategoricalDtype):
+                widened[col] = (str(dtype), str(new.dtype))
+            self.dtypes[col] = new.dtype
+            df_output[col] = new
+            changes[col] = (str(s.dtype), str(new.dtype))
+        bytes_after = int(df_output.memory_usage(deep=True).sum())
+        report = {
+            'bytes_before' : bytes_before,
+            'bytes_after' : bytes_after,
+            'bytes_saved' : bytes_before - bytes_after,
+            'columns' : changes,
+            'widened' : widened,
+        }
+        return df_output, report
+
+    def _cast(self, col, s:pd.Series, dtype) -> pd.Series:
+        if s.isna().all():
+            return s.astype(dtype)
+        if isinstance(dtype, pd.CategoricalDtype):
+            unseen = pd.Index(s.dropna().unique()).difference(dtype.categories)
+            if len(unseen):
+                dtype = pd.CategoricalDtype(dtype.categories.append(unseen))
+            return s.astype(dtype)
+        if not _is_number(dtype): # text, boolean
+            try:
+                return s.astype(dtype)
+            except (TypeError, ValueError):
+                return s.astype(object)
+        new = _compact_series(s, self.hints.get(str(col).lower()), self.category_ratio)
+        new = s if new is None else new
+        if not _is_number(new.dtype):
+            return new # e.g., Decimals past float64's digits
+        return new.astype(_wider(dtype, new.dtype))
+
+def _is_number(dtype) -> bool:
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+def _wider(a, b):
+    """a numeric dtype holding both a and b; integers stay nullable"""
+    a, b = pd.api.types.pandas_dtype(a), pd.api.types.pandas_dtype(b)
+    if pd.api.types.is_integer_dtype(a) and pd.api.types.is_integer_dtype(b):
+        bits = max(np.dtype(getattr(x, 'numpy_dtype', x)).itemsize for x in (a, b)) * 8
+        return f'Int{bits}'
+    if a == b == np.dtype('float32'):
+        return 'float32'
+    return 'float64'
+
+def _compact_series(s:pd.Series, hint:tuple, category_ratio:float) -> Union[pd.Series, None]:
+    """the compact version of s, or None to keep it"""
+    values = s.dropna()
+    if len(values) == 0 or pd.api.types.is_bool_dtype(s):
+        return None
+    if pd.api.types.is_integer_dtype(s):
+        dtype = _smallest_int(values, nullable=not isinstance(s.dtype, np.dtype))
+        return s.astype(dtype) if dtype else None
+    if pd.api.types.is_float_dtype(s):
+        if _is_whole(values):
+            dtype = _smallest_int(values, nullable=True)
+            return s.astype(dtype) if dtype else None
+        with np.errstate(over='ignore'):
+            as_float32 = values.to_numpy(dtype='float64').astype('float32')
+        if np.array_equal(as_float32.astype('float64'), values.to_numpy(dtype='float64')):
+            return s.astype('float32')
+        return None
+    if not (s.dtype == object or pd.api.types.is_string_dtype(s)):
+        return None # dates, categoricals, ...
+
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == 'boolean':
+        return s.astype('boolean')
+    if kind == 'integer': # python ints, e.g., NUMBER(p, 0) with NULLs
+        dtype = _smallest_int(values, nullable=True)
+        return s.astype(dtype) if dtype else None
+    if kind == 'decimal':
+        if all(x == x.to_integral_value() for x in values):
+            if hint is not None and hint[0] > INT64_DIGITS:
+                return None
+            ints = pd.Series([None if pd.isna(x) else int(x) for x in s], index=s.index,
+                             dtype=object)
+            dtype = _smallest_int(ints.dropna(), nullable=True)
+            return ints.astype(dtype) if dtype else None
+        if hint is None or hint[0] > FLOAT64_DIGITS:
+            return None # float64 would round it
+        return s.astype('float64')
+    if kind != 'string':
+        return None
+    probe = values.iloc[:CATEGORY_PROBE_ROWS]
+    if probe.nunique() <= category_ratio * len(probe) \
+            and values.nunique() <= category_ratio * len(values):
+        return s.astype('category')
+    if COMPACT_STRING is not None:
+        return s.astype(COMPACT_STRING)
+    return None
+
+def _is_whole(values:pd.Series) -> bool:
+    """floats without NaN that are all whole numbers"""
+    numbers = values.to_numpy(dtype='float64')
+    return bool(np.isfinite(numbers).all() and (numbers % 1 == 0).all())
 
+def _smallest_int(values:pd.Series, nullable:bool) -> Union[str, None]:
+    """narrowest signed int dtype holding min..max, None past int64"""
+    low, high = int(values.min()), int(values.max())
+    for bits in (8, 16, 32, 64):
+        if -2**(bits - 1) <= low and high < 2**(bits - 1):
+            return f'Int{bits}' if nullable else f'int{bits}'
+    return None
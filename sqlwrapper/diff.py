@@ -0,0 +1,264 @@
+"""
+diff.py
+    |--> base.py
+
+DESCRIPTION:
+    Table reconciliation between two connections, e.g., Oracle vs SQL Server
+    after a migration, without pulling either table into pandas.
+
+        df_diff = db_oracle.diff(db_mssql, 'VISITS', keys=['VISIT_ID'])
+
+    1. Each server renders every row as canonical text (numbers as
+       DECIMAL(38,10), dates as 'YYYY-MM-DD HH24:MI:SS', NULL as ''), hashes
+       it with MD5 (STANDARD_HASH, HASHBYTES, MD5()) and buckets rows by the
+       MD5 of their key, so the same row lands in the same bucket on both
+       servers.
+    2. Per bucket, only COUNT(*) and SUM(row hash) come back - kilobytes,
+       whatever the table size.
+    3. Rows are fetched (as canonical text) only for buckets that differ, and
+       compared in Python column by column.
+
+    Notes: NULL and '' compare equal (Oracle can't tell them apart);
+    fractional seconds are ignored; binary columns are skipped, and Oracle
+    CLOBs over 4000 bytes fail TO_CHAR (leave them out with columns=).
+    Non-ASCII text
+    may hash differently across servers, but step 3 compares the text
+    itself, so that only costs an extra fetch.
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import logging
+import time
+
+import pandas as pd
+from sqlalchemy import types as sqltypes
+
+log = logging.getLogger(__name__)
+
+# number of hash buckets; mismatched buckets are fetched whole
+DIFF_CHUNKS = 1024
+# buckets per IN (...) list when fetching mismatched rows
+FETCH_BUCKETS = 500
+NUMBER_SCALE = 10
+SEP = '|'
+
+
+################################################################################
+# dialect SQL
+################################################################################
+class oracle_sql:
+    number_format = 'FM' + '9' * 27 + '0.' + '0' * NUMBER_SCALE
+
+    def number(self, col:str) -> str:
+        return f"TO_CHAR({col}, '{self.number_format}')"
+
+    def datetime(self, col:str) -> str:
+        return f"TO_CHAR({col}, 'YYYY-MM-DD HH24:MI:SS')"
+
+    def text(self, col:str) -> str:
+        return f"TO_CHAR({col})"
+
+    def concat(self, ls_expr:list) -> str:
+        return f" || '{SEP}' || ".join(ls_expr) # NULL concatenates as ''
+
+    def hash_int(self, expr:str) -> str:
+        """first 32 bits of the MD5, as a number"""
+        return f"TO_NUMBER(SUBSTR(RAWTOHEX(STANDARD_HASH({expr}, 'MD5')), 1, 8), 'XXXXXXXX')"
+
+    def mod(self, expr:str, n:int) -> str:
+        return f"MOD({expr}, {n})"
+
+
+class sqlserver_sql(oracle_sql):
+    def number(self, col:str) -> str:
+        return f"CONVERT(VARCHAR(60), CAST({col} AS DECIMAL(38, {NUMBER_SCALE})))"
+
+    def datetime(self, col:str) -> str:
+        return f"CONVERT(VARCHAR(19), CAST({col} AS DATETIME2), 120)"
+
+    def text(self, col:str) -> str:
+        return f"CAST({col} AS NVARCHAR(MAX))"
+
+    def concat(self, ls_expr:list) -> str:
+        # CONCAT() treats NULL as '' and needs two arguments
+        if len(ls_expr) == 1:
+            ls_expr = ls_expr + ["''"]
+        return 'CONCAT(' + f", '{SEP}', ".join(ls_expr) + ')'
+
+    def hash_int(self, expr:str) -> str:
+        return f"CONVERT(BIGINT, SUBSTRING(HASHBYTES('MD5', CAST({expr} AS VARCHAR(MAX))), 1, 4))"
+
+    def mod(self, expr:str, n:int) -> str:
+        return f"({expr}) % {n}"
+
+
+class mariadb_sql(oracle_sql):
+    def number(self, col:str) -> str:
+        return f"CAST(CAST({col} AS DECIMAL(38, {NUMBER_SCALE})) AS CHAR)"
+
+    def datetime(self, col:str) -> str:
+        return f"DATE_FORMAT({col}, '%Y-%m-%d %H:%i:%s')"
+
+    def text(self, col:str) -> str:
+        return f"CAST({col} AS CHAR)"
+
+    def concat(self, ls_expr:list) -> str:
+        return 'CONCAT(COALESCE(' + f", ''), '{SEP}', COALESCE(".join(ls_expr) + ", ''))"
+
+    def hash_int(self, expr:str) -> str:
+        return f"CAST(CONV(SUBSTR(MD5({expr}), 1, 8), 16, 10) AS UNSIGNED)"
+
+
+DIALECT_SQL = {
+    'oracle' : oracle_sql,
+    'mssql' : sqlserver_sql,
+    'mysql' : mariadb_sql,
+    'mariadb' : mariadb_sql,
+}
+
+
+################################################################################
+# diff
+################################################################################
+def diff_tables(left_db,
+                right_db,
+                table:str,
+                keys:list,
+                right_table:str=None,
+                columns:list=None,
+                where:str=None,
+                chunks:int=DIFF_CHUNKS) -> pd.DataFrame:
+    """
+    Rows that differ between left_db's table and right_db's right_table
+    (default: same name). Returns one row per key that differs:
+        * keys (as canonical text)
+        * status - 'only_left', 'only_right' or 'changed'
+        * columns - for 'changed', the columns whose values differ
+    columns: compare only these (default: all columns in both tables)
+    """
+    start_time = time.perf_counter()
+    right_table = right_table or table
+    left, right = _side(left_db, table, where), _side(right_db, right_table, where)
+
+    # A. COLUMNS ###############################################################
+    ls_keys = [x.lower() for x in keys]
+    common = [x for x in left.kinds if x in right.kinds]
+    if columns is not None:
+        common = [x for x in common if x in {y.lower() for y in columns} or x in ls_keys]
+    missing = [x for x in ls_keys if x not in common]
+    if missing:
+        raise ValueError(f'keys {missing} are not comparable columns of both tables')
+    ls_cols = ls_keys + [x for x in common if x not in ls_keys]
+    skipped = sorted((set(left.names) | set(right.names)) - set(ls_cols))
+    if skipped:
+        log.info(f'diff: not compared {skipped}')
+
+    # B. BUCKET DIGESTS ########################################################
+    df_left = left.digests(ls_keys, ls_cols, chunks)
+    df_right = right.digests(ls_keys, ls_cols, chunks)
+    df_buckets = df_left.merge(df_right, on='bucket', how='outer',
+                               suffixes=('_left', '_right'))
+    mismatched = df_buckets.loc[(df_buckets['n_left'] != df_buckets['n_right']) \
+                                | (df_buckets['h_left'] != df_buckets['h_right']),
+                                'bucket'].astype(int).tolist()
+    log.info(f'diff: {len(mismatched)} of {len(df_buckets)} buckets differ ' \
+             f'({time.perf_counter() - start_time:.2f}s)')
+
+    # C. ROWS OF MISMATCHED BUCKETS ############################################
+    ls_result = []
+    for i in range(0, len(mismatched), FETCH_BUCKETS):
+        buckets = mismatched[i:i + FETCH_BUCKETS]
+        rows_left = left.rows(ls_keys, ls_cols, chunks, buckets)
+        rows_right = right.rows(ls_keys, ls_cols, chunks, buckets)
+        ls_result.append(_compare(rows_left, rows_right, ls_keys, ls_cols))
+    if ls_result:
+        df_diff = pd.concat(ls_result, ignore_index=True)
+    else:
+        df_diff = pd.DataFrame(columns=ls_keys + ['status', 'columns'])
+    log.info(f'diff: {len(df_diff)} rows differ ({time.perf_counter() - start_time:.2f}s)')
+    return df_diff
+
+
+class _side:
+    """one table on one connection, with its dialect's SQL"""
+    def __init__(self, db, table:str, where:str=None):
+        self.db = db
+        self.table = table
+        self.where = where
+        dialect = db.engine.dialect.name
+        if dialect not in DIALECT_SQL:
+            raise NotImplementedError(f'diff() not supported for {dialect}')
+        self.sql = DIALECT_SQL[dialect]()
+        self.kinds, self.names = {}, {}
+        for col in db.inspector.get_columns(table.lower()):
+            kind = _kind(col['type'])
+            self.names[col['name'].lower()] = col['name']
+            if kind is not None:
+                self.kinds[col['name'].lower()] = kind
+
+    def _text(self, col:str) -> str:
+        name = self.names[col]
+        return getattr(self.sql, self.kinds[col])(name)
+
+    def _subquery(self, ls_keys:list, ls_cols:list, chunks:int, select_text:bool) -> str:
+        key_hash = self.sql.hash_int(self.sql.concat([self._text(x) for x in ls_keys]))
+        row_hash = self.sql.hash_int(self.sql.concat([self._text(x) for x in ls_cols]))
+        select = [f'{self.sql.mod(key_hash, chunks)} AS bucket', f'{row_hash} AS h']
+        if select_text:
+            select += [f'{self._text(x)} AS c{i}' for i, x in enumerate(ls_cols)]
+        sql = f"SELECT {', '.join(select)} FROM {self.table}"
+        if self.where:
+            sql += f' WHERE {self.where}'
+        return sql
+
+    def digests(self, ls_keys:list, ls_cols:list, chunks:int) -> pd.DataFrame:
+        sql = f'SELECT bucket, COUNT(*) AS n, SUM(h) AS h ' \
+              f'FROM ({self._subquery(ls_keys, ls_cols, chunks, False)}) x GROUP BY bucket'
+        # the driver's values, not read_sql(): its coerce_float would round
+        # DECIMAL sums past 2**53 before they could be made exact ints
+        with self.db._begin() as conn:
+            ls_rows = [(int(b), int(n), int(h)) for b, n, h in conn.exec_driver_sql(sql)]
+        df_digest = pd.DataFrame(ls_rows, columns=['bucket', 'n', 'h'])
+        return df_digest.astype({'bucket' : 'int64', 'n' : 'int64', 'h' : 'object'})
+
+    def rows(self, ls_keys:list, ls_cols:list, chunks:int, buckets:list) -> pd.DataFrame:
+        sql = f'SELECT * FROM ({self._subquery(ls_keys, ls_cols, chunks, True)}) x ' \
+              f'WHERE bucket IN ({", ".join(str(x) for x in buckets)})'
+        df_rows = self.db.read_sql(sql, silent=True, save_hx=False)
+        df_rows.columns = [x.lower() for x in df_rows.columns]
+        df_rows = df_rows[[f'c{i}' for i in range(len(ls_cols))]]
+        df_rows.columns = ls_cols
+        return df_rows.fillna('').astype(str)
+
+
+def _compare(df_left:pd.DataFrame, df_right:pd.DataFrame, ls_keys:list,
+             ls_cols:list) -> pd.DataFrame:
+    df_both = df_left.merge(df_right, on=ls_keys, how='outer',
+                            suffixes=('_left', '_right'), indicator=True)
+    values = [x for x in ls_cols if x not in ls_keys]
+    changed = pd.DataFrame({x : df_both[f'{x}_left'] != df_both[f'{x}_right'] for x in values},
+                           index=df_both.index)
+    df_both['status'] = df_both['_merge'].map({'left_only' : 'only_left',
+                                                'right_only' : 'only_right',
+                                                'both' : 'changed'}).astype(str)
+    df_both['columns'] = [list(changed.columns[x]) if status == 'changed' else []
+                          for x, status in zip(changed.values, df_both['status'])]
+    is_diff = (df_both['status'] != 'changed') | changed.any(axis=1)
+    return df_both.loc[is_diff, ls_keys + ['status', 'columns']].reset_index(drop=True)
+
+
+def _kind(type_) -> str:
+    """which canonical text a column gets, or None to skip it"""
+    try:
+        generic = type_.as_generic()
+    except NotImplementedError:
+        return None
+    if isinstance(generic, (sqltypes.Integer, sqltypes.Numeric, sqltypes.Float,
+                            sqltypes.Boolean)):
+        return 'number'
+    if isinstance(generic, (sqltypes.DateTime, sqltypes.Date)):
+        return 'datetime'
+    if isinstance(generic, sqltypes.String): # incl. TEXT/CLOB
+        return 'text'
+    return None # BLOB, ...
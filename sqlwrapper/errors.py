@@ -13,4 +13,9 @@ class FailedInsertMissingTable(Exception):
 
 class Missing_DBCONFIG_ValueError(Exception):
     """raised when a value is missing"""
-    pass
\ No newline at end of file
+    pass
+
+
+class FailedCopyVerification(Exception):
+    """raised when copy_table's row counts or checksums don't match"""
+    pass
@@ -1,25 +1,16 @@
 """
-This provides a user timer decorator for ETL process functions.
+This provides a user timer decorator for ETL process functions, and a small
+pipeline runner for extract -> transform -> load jobs between connections.
 
-Duke LeTran <daletran@ucdavis.edu>
-Research Infrastructure, IT Health Informatics, UC Davis Health
-Copyright 2022, UC Regents
-"""
-import logging
-import functools
-import time
+    p = etl.pipeline('nightly_visits', queue_size=4)
+    p.extract(etl.extract_sql(src_db, 'SELECT * FROM VISITS', chunksize=50000))
+    p.transform(clean_visits, workers=2) # df -> df, None drops the chunk
+    p.load(etl.load_table(dst_db, 'VISITS'), workers=2)
+    df_report = p.run()
 
-log = logging.getLogger(__name__)
-
-def convert_time(time_elapsed) -> tuple:
-    hrs = time_elapsed // 3600
-    mins = (time_elapsed % 3600) // 60
-    secs = (time_elapsed % 3600) % 60
-    return hrs, mins, secs
-
-
-"""
-This provides a user timer decorator for ETL process functions.
+Each stage runs on its own worker threads with bounded queues in between, so
+the next chunk is extracted while the last one is transformed and loaded
+(DBAPI calls release the GIL). Chunk order is not kept with workers > 1.
 
 Duke LeTran <daletran@ucdavis.edu>
 Research Infrastructure, IT Health Informatics, UC Davis Health
@@ -27,10 +18,18 @@ Copyright 2022, UC Regents
 """
 import logging
 import functools
+import queue
+import threading
 import time
+from typing import Callable, Iterable, Union
 
 log = logging.getLogger(__name__)
 
+# chunks held between two stages
+QUEUE_SIZE = 4
+# how often blocked workers check whether the pipeline failed
+POLL_SECONDS = 0.1
+
 def convert_time(time_elapsed) -> tuple:
     hrs = time_elapsed // 3600
     mins = (time_elapsed % 3600) // 60
@@ -60,4 +59,261 @@ def timer(func):
         elif time_elapsed >= 3600: # if hours
             log.info(f"ETL process [{func.__module__}.{func.__name__}()] completed in {hrs} hr(s), {mins} min(s) and {secs:.1f}s..")
         return output
-    return wrapper_timer
\ No newline at end of file
+    return wrapper_timer
+
+
+################################################################################
+# pipeline
+################################################################################
+_DONE = object() # end-of-stream marker, one per downstream worker
+
+
+class _PipelineFailed(Exception):
+    """raised inside workers once another worker has failed"""
+    pass
+
+
+class stage_stats:
+    """counters for one stage, summed over its workers"""
+    def __init__(self, name:str, kind:str, workers:int):
+        self.name = name
+        self.kind = kind
+        self.workers = workers
+        self.items = 0
+        self.rows = 0
+        self.busy = 0.0 # seconds in the stage's func
+        self.wait_in = 0.0 # seconds waiting on the upstream queue
+        self.wait_out = 0.0 # seconds waiting on a full downstream queue
+        self.start = None
+        self.end = None
+        self._lock = threading.Lock()
+
+    def add(self, item, busy:float=0.0, wait_in:float=0.0, wait_out:float=0.0) -> None:
+        with self._lock:
+            if item is not None:
+                self.items += 1
+                self.rows += _count_rows(item)
+            self.busy += busy
+            self.wait_in += wait_in
+            self.wait_out += wait_out
+
+    def to_dict(self) -> dict:
+        wall = (self.end - self.start) if self.start is not None and self.end is not None else 0.0
+        return {
+            'stage' : self.name,
+            'kind' : self.kind,
+            'workers' : self.workers,
+            'items' : self.items,
+            'rows' : self.rows,
+            'busy' : self.busy,
+            'wait_in' : self.wait_in,
+            'wait_out' : self.wait_out,
+            'wall' : wall,
+            'rows_per_sec' : self.rows / wall if wall else None,
+            # share of worker time spent working, rather than waiting
+            'utilization' : self.busy / (wall * self.workers) if wall else None,
+        }
+
+
+class pipeline:
+    """
+    extract -> transform(s) -> load, see module docstring.
+    * extract(source, workers) - source is a callable returning an iterable of
+      chunks, or a list of them (e.g., one per partition) shared by workers
+    * transform(func, workers) - func(chunk) -> chunk, or None to drop it
+    * load(func, workers) - func(chunk); return value ignored
+    """
+    def __init__(self, name:str='pipeline', queue_size:int=QUEUE_SIZE):
+        self.name = name
+        self.queue_size = queue_size
+        self._stages = [] # (kind, name, func, workers)
+        self.report = None
+
+    def extract(self, source:Union[Callable, list], workers:int=1, name:str='extract'):
+        sources = list(source) if isinstance(source, (list, tuple)) else [source]
+        self._stages.append(('extract', name, sources, workers))
+        return self
+
+    def transform(self, func:Callable, workers:int=1, name:str=None):
+        self._stages.append(('transform', name or getattr(func, '__name__', 'transform'),
+                             func, workers))
+        return self
+
+    def load(self, func:Callable, workers:int=1, name:str='load'):
+        self._stages.append(('load', name, func, workers))
+        return self
+
+    def _validate(self) -> None:
+        kinds = [x[0] for x in self._stages]
+        if not kinds or kinds[0] != 'extract' or kinds.count('extract') != 1:
+            raise ValueError('a pipeline starts with exactly one extract()')
+        if kinds[-1] != 'load' or kinds.count('load') != 1:
+            raise ValueError('a pipeline ends with exactly one load()')
+
+    def run(self):
+        """runs the job; returns (and keeps as .report) a pd.DataFrame per stage"""
+        self._validate()
+        failed = threading.Event()
+        errors = []
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self._stages[1:]]
+        ls_stats = [stage_stats(name, kind, workers) for kind, name, _, workers in self._stages]
+
+        def fail(error):
+            errors.append(error)
+            failed.set()
+
+        def put(q, item) -> float:
+            t0 = time.perf_counter()
+            while True:
+                if failed.is_set():
+                    raise _PipelineFailed()
+                try:
+                    q.put(item, timeout=POLL_SECONDS)
+                    return time.perf_counter() - t0
+                except queue.Full:
+                    pass
+
+        def get(q) -> tuple:
+            t0 = time.perf_counter()
+            while True:
+                if failed.is_set():
+                    raise _PipelineFailed()
+                try:
+                    return q.get(timeout=POLL_SECONDS), time.perf_counter() - t0
+                except queue.Empty:
+                    pass
+
+        # A. WORKERS ###########################################################
+        sources = queue.Queue()
+        for x in self._stages[0][2]:
+            sources.put(x)
+
+        def extract_worker(stats:stage_stats, q_out):
+            try:
+                while True:
+                    try:
+                        source = sources.get_nowait()
+                    except queue.Empty:
+                        return
+                    iterator = iter(source())
+                    while True:
+                        t0 = time.perf_counter()
+                        item = next(iterator, _DONE)
+                        busy = time.perf_counter() - t0
+                        if item is _DONE:
+                            stats.add(None, busy=busy)
+                            break
+                        stats.add(item, busy=busy, wait_out=put(q_out, item))
+            except _PipelineFailed:
+                pass
+            except Exception as error:
+                log.error(f'[{self.name}] extract failed: {error!r}', exc_info=True)
+                fail(error)
+
+        def worker(stats:stage_stats, func, q_in, q_out):
+            try:
+                while True:
+                    item, wait_in = get(q_in)
+                    if item is _DONE:
+                        stats.add(None, wait_in=wait_in)
+                        return
+                    t0 = time.perf_counter()
+                    output = func(item)
+                    busy = time.perf_counter() - t0
+                    wait_out = 0.0
+                    if q_out is None: # load
+                        stats.add(item, busy, wait_in)
+                        continue
+                    if output is not None:
+                        wait_out = put(q_out, output)
+                    stats.add(output, busy, wait_in, wait_out)
+            except _PipelineFailed:
+                pass
+            except Exception as error:
+                log.error(f'[{self.name}] {stats.name} failed: {error!r}', exc_info=True)
+                fail(error)
+
+        # B. RUN ###############################################################
+        log.info(f'ETL pipeline [{self.name}] started: ' \
+                 + ' -> '.join(f'{x[1]}({x[3]})' for x in self._stages))
+        start_time = time.perf_counter()
+        ls_threads = []
+        for i, (kind, name, func, workers) in enumerate(self._stages):
+            q_in = queues[i - 1] if i > 0 else None
+            q_out = queues[i] if i < len(queues) else None
+            threads = []
+            for n in range(workers):
+                if kind == 'extract':
+                    target, args = extract_worker, (ls_stats[i], q_out)
+                else:
+                    target, args = worker, (ls_stats[i], func, q_in, q_out)
+                threads.append(threading.Thread(target=target, args=args, daemon=True,
+                                                name=f'{self.name}-{name}-{n}'))
+            ls_threads.append(threads)
+            ls_stats[i].start = time.perf_counter()
+            for x in threads:
+                x.start()
+
+        # stages finish in order; each passes one end marker per next worker
+        for i, threads in enumerate(ls_threads):
+            for x in threads:
+                x.join()
+            ls_stats[i].end = time.perf_counter()
+            if i < len(queues):
+                for _ in range(self._stages[i + 1][3]):
+                    try:
+                        put(queues[i], _DONE)
+                    except _PipelineFailed:
+                        break
+
+        time_elapsed = time.perf_counter() - start_time
+        self.report = self._report(ls_stats)
+        if errors:
+            log.error(f'ETL pipeline [{self.name}] failed after {time_elapsed:.2f}s.')
+            raise errors[0]
+        hrs, mins, secs = convert_time(time_elapsed)
+        log.info(f'ETL pipeline [{self.name}] completed in {int(hrs)} hr(s), ' \
+                 f'{int(mins)} min(s) and {secs:.2f}s.')
+        for row in self.report.itertuples():
+            log.info(f'  {row.stage:<20} items={row.items} rows={row.rows} ' \
+                     f'busy={row.busy:.2f}s wall={row.wall:.2f}s ' \
+                     f'rows/s={row.rows_per_sec or 0:.0f}')
+        return self.report
+
+    @staticmethod
+    def _report(ls_stats:list):
+        import pandas as pd
+        return pd.DataFrame([x.to_dict() for x in ls_stats])
+
+
+def _count_rows(item) -> int:
+    try:
+        return len(item)
+    except TypeError:
+        return 1
+
+
+################################################################################
+# sources and sinks between sqlwrapper connections
+################################################################################
+def extract_sql(db, sql:str, chunksize:int=50000) -> Callable:
+    """
+    source for pipeline.extract(): the result of sql, as pd.DataFrame chunks,
+    streamed with a server-side cursor
+    """
+    def source() -> Iterable:
+        import pandas as pd
+        with db.engine.connect().execution_options(stream_results=True,
+                                                   arraysize=chunksize) as conn:
+            for df_chunk in pd.read_sql(sql, conn, chunksize=chunksize):
+                yield df_chunk
+    source.__name__ = 'extract_sql'
+    return source
+
+
+def load_table(db, table:str, **kwargs) -> Callable:
+    """sink for pipeline.load(): db.insert(chunk, table, **kwargs)"""
+    def sink(df_chunk):
+        return db.insert(df_chunk, table, **kwargs)
+    sink.__name__ = f'load_{table}'
+    return sink
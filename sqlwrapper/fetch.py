@@ -0,0 +1,109 @@
+"""
+fetch.py
+    |--> base.py
+
+DESCRIPTION:
+    Fetch batch sizes for the `db` object. DBAPI cursors fetch `arraysize`
+    rows per network round trip (cx_Oracle's default is 100), and Oracle
+    also sends `prefetchrows` with the execute() reply, so wide extracts
+    pay one round trip every few rows unless these are raised.
+
+    Set them in the db_config.ini entry,
+        arraysize = 5000      # or auto
+        prefetchrows = 5001
+        fetch_budget_mb = 64  # memory per batch, for arraysize = auto
+    with db.set_fetch_size(), or per call: db.read_sql(sql, arraysize='auto').
+    'auto' sizes the batch from the row width in cursor.description:
+    budget / bytes per row, between MIN_ARRAYSIZE and MAX_ARRAYSIZE.
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import logging
+
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+# memory for one fetched batch when arraysize is 'auto'
+FETCH_BUDGET_BYTES = 64 * 2**20
+MIN_ARRAYSIZE = 100
+MAX_ARRAYSIZE = 100000
+# bytes per column when the driver doesn't say (sqlite, NUMBER, LOBs)
+DEFAULT_COLUMN_BYTES = 32
+# python object overhead per value, on top of the data
+VALUE_OVERHEAD_BYTES = 16
+
+
+def row_bytes(description) -> int:
+    """estimated bytes of one fetched row, from cursor.description"""
+    total = 0
+    for col in description or []:
+        size = col[3] if len(col) > 3 else None # internal_size
+        if not isinstance(size, int) or size <= 0:
+            size = col[2] if len(col) > 2 else None # display_size
+        if not isinstance(size, int) or size <= 0:
+            size = DEFAULT_COLUMN_BYTES
+        total += size + VALUE_OVERHEAD_BYTES
+    return max(total, 1)
+
+
+def tune_arraysize(description, budget:int=FETCH_BUDGET_BYTES) -> int:
+    """rows per fetch that fit budget bytes, within MIN/MAX_ARRAYSIZE"""
+    return int(min(max(budget // row_bytes(description), MIN_ARRAYSIZE), MAX_ARRAYSIZE))
+
+
+class fetch_sizes:
+    """
+    arraysize/prefetchrows applied to every cursor of one engine; read_sql()
+    overrides them per call through execution options of the same names
+    """
+    def __init__(self, arraysize=None, prefetchrows:int=None,
+                 budget:int=FETCH_BUDGET_BYTES):
+        self.arraysize = arraysize # int, 'auto' or None (driver default)
+        self.prefetchrows = prefetchrows
+        self.budget = budget
+
+    def configure(self, config) -> None:
+        """arraysize, prefetchrows and fetch_budget_mb from a config entry"""
+        if config is None:
+            return
+        arraysize = config.get('arraysize')
+        if arraysize is not None:
+            self.arraysize = 'auto' if str(arraysize).strip().lower() == 'auto' \
+                             else int(arraysize)
+        if config.get('prefetchrows') is not None:
+            self.prefetchrows = int(config.get('prefetchrows'))
+        if config.get('fetch_budget_mb') is not None:
+            self.budget = int(float(config.get('fetch_budget_mb')) * 2**20)
+
+    def instrument(self, engine) -> None:
+        if getattr(engine, '_sqlwrapper_fetch', None) is self:
+            return
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        engine._sqlwrapper_fetch = self
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            return
+        options = context.execution_options if context is not None else {}
+        arraysize = options.get('arraysize', self.arraysize)
+        prefetchrows = options.get('prefetchrows', self.prefetchrows)
+        if isinstance(arraysize, int):
+            cursor.arraysize = arraysize
+            if prefetchrows is None: # Oracle: the first batch rides on execute()
+                prefetchrows = arraysize + 1
+        if prefetchrows is not None and hasattr(cursor, 'prefetchrows'):
+            cursor.prefetchrows = prefetchrows
+
+    def after_execute(self, cursor, arraysize=None) -> int:
+        """
+        sizes arraysize='auto' now that the description is known; returns the
+        arraysize the fetch will use
+        """
+        arraysize = self.arraysize if arraysize is None else arraysize
+        if arraysize == 'auto' and cursor is not None and cursor.description:
+            cursor.arraysize = tune_arraysize(cursor.description, self.budget)
+            log.debug(f'arraysize auto: {cursor.arraysize} rows ' \
+                      f'({row_bytes(cursor.description)} bytes/row)')
+        return getattr(cursor, 'arraysize', None)
@@ -0,0 +1,97 @@
+"""
+history.py
+    |--> base.py
+
+DESCRIPTION:
+    Bounded query history for the `db` object. Replaces the old `sqlHx`
+    pd.Series, which was copied with pd.concat() on every statement. Records
+    live in a ring buffer (oldest dropped first) and are only turned into a
+    pd.DataFrame on demand, i.e., `db.history()` and `db.hot_queries()`.
+
+    Statements are grouped by fingerprint: literals and numbers are replaced
+    with `?` and whitespace/case are normalized, so the same query with
+    different parameters aggregates together.
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import deque
+
+# default number of statements kept per db object
+HX_MAXLEN = 5000
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMBER = re.compile(r"(?<![\w.])[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_RE_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql:str) -> str:
+    """strips literals so the same statement shape compares equal"""
+    sql = _RE_STRING.sub('?', sql)
+    sql = _RE_NUMBER.sub('?', sql)
+    sql = _RE_IN_LIST.sub('(?+)', sql)
+    sql = _RE_SPACE.sub(' ', sql).strip().rstrip(';').strip()
+    return sql.upper()
+
+def fingerprint(sql:str) -> str:
+    return hashlib.md5(normalize_sql(sql).encode('utf-8')).hexdigest()[:16]
+
+
+class query_history:
+    """ring buffer of {sql, fingerprint, ts, duration, rowcount}"""
+    def __init__(self, maxlen:int=HX_MAXLEN):
+        self.records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def append(self, sql:str, duration:float=None, rowcount:int=None) -> None:
+        sql = ' '.join(sql.split()) #remove extra whitespace
+        record = {
+            'ts' : time.time(),
+            'sql' : sql,
+            'fingerprint' : fingerprint(sql),
+            'duration' : duration,
+            'rowcount' : rowcount,
+        }
+        with self._lock:
+            self.records.append(record)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.records.clear()
+
+    def sql(self) -> list:
+        with self._lock:
+            return [x['sql'] for x in self.records]
+
+    def to_frame(self):
+        import pandas as pd
+        with self._lock:
+            records = list(self.records)
+        df_hx = pd.DataFrame(records,
+            columns=['ts', 'sql', 'fingerprint', 'duration', 'rowcount'])
+        df_hx['ts'] = pd.to_datetime(df_hx['ts'], unit='s')
+        return df_hx
+
+    def hot(self, n:int=10, by:str='total_duration'):
+        """
+        aggregates by fingerprint; by is one of:
+        count, total_duration, mean_duration, max_duration, total_rows
+        """
+        df_hx = self.to_frame()
+        df_hot = df_hx.groupby('fingerprint').agg(
+            count=('sql', 'size'),
+            total_duration=('duration', 'sum'),
+            mean_duration=('duration', 'mean'),
+            max_duration=('duration', 'max'),
+            total_rows=('rowcount', 'sum'),
+            last_seen=('ts', 'max'),
+            sql=('sql', 'last'))
+        return df_hot.sort_values(by, ascending=False).head(n)
@@ -0,0 +1,242 @@
+"""
+lob.py
+    |--> base.py
+
+DESCRIPTION:
+    CLOB/BLOB (Oracle), NVARCHAR(MAX)/VARBINARY(MAX) (SQL Server) and
+    TEXT/BLOB (MariaDB) columns, three ways:
+    1. inline - db.read_sql(sql, lobs='inline'); Oracle fetches LOBs as
+       str/bytes with the rest of the row (an output type handler), instead
+       of a locator plus one round trip per value. pyodbc and pymysql
+       already fetch inline.
+    2. to files - db.stream_lobs(sql, directory) writes each row's LOB to
+       its own file; Oracle reads the locator in LOB_CHUNK_SIZE pieces, so
+       memory stays flat whatever the LOB size.
+    3. lazy - db.select_lazy(table, key=...) fetches the other columns and
+       each LOB's length only; values are read on demand with lob_ref.read().
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import logging
+import pathlib
+import re
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy import types as sqltypes
+
+log = logging.getLogger(__name__)
+
+# chars (CLOB) or bytes (BLOB) per LOB.read(); rounded to the LOB's chunk size
+LOB_CHUNK_SIZE = 2**20
+LOB_MODES = ('inline', 'locator')
+# Oracle name of the ROWID column select_lazy() adds when no key is given
+ROWID_COL = 'rowid_'
+
+LOB_LENGTH = {
+    'oracle' : 'DBMS_LOB.GETLENGTH({})',
+    'mssql' : 'DATALENGTH({})',
+    'mysql' : 'LENGTH({})',
+    'mariadb' : 'LENGTH({})',
+}
+
+
+################################################################################
+# A. ORACLE OUTPUT TYPE HANDLERS
+################################################################################
+def _oracle_types():
+    import cx_Oracle
+    return {
+        cx_Oracle.DB_TYPE_CLOB : cx_Oracle.DB_TYPE_LONG,
+        cx_Oracle.DB_TYPE_NCLOB : cx_Oracle.DB_TYPE_LONG_NVARCHAR,
+        cx_Oracle.DB_TYPE_BLOB : cx_Oracle.DB_TYPE_LONG_RAW,
+    }
+
+def inline_handler(cursor, name, default_type, size, precision, scale):
+    """LOBs as str/bytes, fetched arraysize rows at a time"""
+    inline = _oracle_types().get(default_type)
+    if inline is not None:
+        return cursor.var(inline, arraysize=cursor.arraysize)
+
+def locator_handler(cursor, name, default_type, size, precision, scale):
+    """LOBs as cx_Oracle.LOB locators, for chunked reads"""
+    if default_type in _oracle_types():
+        return cursor.var(default_type, arraysize=cursor.arraysize)
+
+
+class lob_hook:
+    """applies read_sql(lobs=...) to Oracle cursors, via execution options"""
+    handlers = {'inline' : inline_handler, 'locator' : locator_handler}
+
+    def instrument(self, engine) -> None:
+        if getattr(engine, '_sqlwrapper_lobs', None) is self:
+            return
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        engine._sqlwrapper_lobs = self
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        mode = context.execution_options.get('lobs') if context is not None else None
+        if mode is None:
+            return
+        if mode not in LOB_MODES:
+            raise ValueError(f'lobs must be one of {LOB_MODES}')
+        if hasattr(cursor, 'outputtypehandler'): # cx_Oracle; others fetch inline
+            cursor.outputtypehandler = self.handlers[mode]
+
+
+################################################################################
+# B. STREAM TO FILES
+################################################################################
+def stream_lobs(db,
+                sql:str,
+                directory:pathlib.Path,
+                name_col:int=0,
+                lob_col:int=1,
+                suffix:str='',
+                chunk_size:int=LOB_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Writes the LOB of each row of sql to directory/<name><suffix>, e.g.,
+    stream_lobs(db, 'SELECT NOTE_ID, NOTE_TEXT FROM NOTES', 'notes', suffix='.txt')
+    name_col/lob_col: positions in the select list. Text is written UTF-8.
+    Returns name, path and size (chars or bytes) per file.
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    ls_files = []
+    with db._stats.statement(sql, 'stream_lobs') as st:
+        try:
+            with db.engine.connect().execution_options(stream_results=True,
+                                                       lobs='locator') as conn:
+                result = conn.exec_driver_sql(sql)
+                st.lap('execute')
+                for row in result:
+                    name, value = row[name_col], row[lob_col]
+                    path = directory / (_safe_name(name) + suffix)
+                    ls_files.append({'name' : name, 'path' : path,
+                                     'size' : _write_lob(value, path, chunk_size)})
+                st.lap('fetch')
+        finally:
+            st.record['rows'] = len(ls_files)
+            st.record['bytes'] = sum(x['size'] for x in ls_files)
+    log.info(f'stream_lobs: {len(ls_files)} files to {directory}')
+    return pd.DataFrame(ls_files, columns=['name', 'path', 'size'])
+
+def _write_lob(value, path:pathlib.Path, chunk_size:int) -> int:
+    """one LOB (locator, str or bytes) to path; returns chars/bytes written"""
+    if value is None:
+        path.touch()
+        return 0
+    if hasattr(value, 'read') and hasattr(value, 'size'): # Oracle locator
+        is_text = value.type is not _oracle_blob()
+        chunk = max(chunk_size // value.getchunksize(), 1) * value.getchunksize()
+        total, offset = value.size(), 1
+        f = open(path, 'w', encoding='utf-8') if is_text else open(path, 'wb')
+        with f:
+            while offset <= total:
+                data = value.read(offset, chunk)
+                if not data:
+                    break
+                f.write(data)
+                offset += len(data)
+        return offset - 1
+    if isinstance(value, str):
+        path.write_text(value, encoding='utf-8')
+    else:
+        path.write_bytes(bytes(value))
+    return len(value)
+
+def _oracle_blob():
+    import cx_Oracle
+    return cx_Oracle.DB_TYPE_BLOB
+
+def _safe_name(name) -> str:
+    return re.sub(r'[^\w.-]', '_', str(name))
+
+
+################################################################################
+# C. LAZY
+################################################################################
+class lob_ref:
+    """one LOB value, read on demand with .read(); len() is its length"""
+    def __init__(self, db, sql:str, params:dict, length):
+        self._db = db
+        self._sql = sql
+        self._params = params
+        self.length = None if pd.isna(length) else int(length)
+
+    def __len__(self):
+        return self.length or 0
+
+    def __repr__(self):
+        return 'lob_ref(NULL)' if self.length is None else f'lob_ref({self.length:,})'
+
+    def read(self):
+        """the value, as str or bytes (None for NULL)"""
+        if self.length is None:
+            return None
+        with self._db.engine.connect().execution_options(lobs='inline') as conn:
+            return conn.execute(sqlalchemy.text(self._sql), self._params).scalar()
+
+
+def select_lazy(db,
+                table:str,
+                key:list=None,
+                lob_cols:list=None,
+                where:str=None,
+                schema:str=None) -> pd.DataFrame:
+    """
+    table with each LOB column as lob_ref accessors; only the lengths cross
+    the wire. key: columns identifying a row (Oracle defaults to ROWID).
+    lob_cols: default, every CLOB/BLOB/TEXT/(MAX) column.
+    """
+    dialect = db.engine.dialect.name
+    if dialect not in LOB_LENGTH:
+        raise NotImplementedError(f'select_lazy() not supported for {dialect}')
+    ls_meta = db.inspector.get_columns(table.lower(), schema=schema)
+    if lob_cols is None:
+        lob_cols = [x['name'] for x in ls_meta if is_lob(x['type'])]
+    lob_lower = {x.lower() for x in lob_cols}
+    other_cols = [x['name'] for x in ls_meta if x['name'].lower() not in lob_lower]
+    if key is None and dialect != 'oracle':
+        raise ValueError('select_lazy() needs key= (the columns identifying a row)')
+    source = f'{schema}.{table}' if schema else table
+
+    # A. SELECT OTHERS + LENGTHS ###############################################
+    ls_select = list(other_cols)
+    if key is None:
+        keys, ls_select = [ROWID_COL], ls_select + [f'ROWIDTOCHAR(ROWID) AS {ROWID_COL}']
+        conditions = f'ROWID = CHARTOROWID(:k0)'
+    else:
+        keys = [key] if isinstance(key, str) else list(key)
+        conditions = ' AND '.join(f'{x} = :k{i}' for i, x in enumerate(keys))
+    ls_select += [f'{LOB_LENGTH[dialect].format(x)} AS len_{i}' for i, x in enumerate(lob_cols)]
+    sql = f"SELECT {', '.join(ls_select)} FROM {source}"
+    if where:
+        sql += f' WHERE {where}'
+    df_lazy = db.read_sql(sql, silent=True, save_hx=False)
+    lookup = {x.lower() : x for x in df_lazy.columns}
+
+    # B. ACCESSORS #############################################################
+    key_values = list(zip(*[df_lazy[lookup[x.lower()]] for x in keys]))
+    for i, col in enumerate(lob_cols):
+        read_sql = f'SELECT {col} FROM {source} WHERE {conditions}'
+        lengths = df_lazy.pop(lookup[f'len_{i}'])
+        df_lazy[col] = [lob_ref(db, read_sql, {f'k{j}' : _native(v) for j, v in enumerate(values)},
+                                length)
+                        for values, length in zip(key_values, lengths)]
+    return df_lazy
+
+def is_lob(type_) -> bool:
+    """CLOB/BLOB/TEXT, and unbounded NVARCHAR(MAX)/VARBINARY(MAX)"""
+    try:
+        generic = type_.as_generic()
+    except NotImplementedError:
+        return False
+    return isinstance(generic, (sqltypes.String, sqltypes.LargeBinary)) \
+        and (isinstance(generic, sqltypes.Text) or generic.length is None)
+
+def _native(value):
+    """numpy scalars -> python, for bind parameters"""
+    return value.item() if hasattr(value, 'item') else value
@@ -4,6 +4,7 @@ from typing import Union
 from typing_extensions import Literal
 import pandas as pd
 from sqlwrapper.base import SQL
+from sqlwrapper.stats import estimate_lines_bytes
 # from sqlwrapper.config import PATH_TO_CONFIG, CONFIG_FILE
 from sqlwrapper.config import config_reader
 from sqlwrapper.parameters import parameters
@@ -22,6 +23,8 @@ class MariaDB(SQL, parameters): # level 1
     This assumse you have all your Oracle ENV variables set correctly, e.g.
 
     """
+    _dialect = 'mariadb'
+
     def __init__(self, db_entry='redcap', opt_print=True, db_section:SectionProxy=None): 
         config = self._init_config(db_section, db_entry, opt_print)
         # initialize config
@@ -60,6 +63,10 @@ class MariaDB(SQL, parameters): # level 1
             sql_statement += f' LIMIT {str(limit)}'
             return sql_statement
 
+    @staticmethod
+    def _paginate(sql_statement:str, page_size:int, offset:int=0) -> str:
+        return f'{sql_statement} LIMIT {page_size} OFFSET {offset}'
+
     def tables(self, silent=True):
         try:
             return list(self.read_sql('SHOW TABLES;', silent=silent)[f'Tables_in_{self._database}'])
@@ -100,14 +107,29 @@ class MariaDB(SQL, parameters): # level 1
                order_by:str=None,
                desc:bool=False,
                index=False,
-               silent=False):
+               silent=False,
+               slow_threshold:float=None,
+               page_size:int=None,
+               offset:int=0,
+               after=None,
+               compact:bool=False):
         """
         Function: returns a pd.DataFrame
         cols: list of columns
         tbl: table name
         schema: schema name (or default is selected)
         limit: limit number of rows
+        slow_threshold: seconds, log to the slow-query log if slower
+        page_size: rows per page (replaces limit), skipping offset rows
+        after: keyset paging, the last page's order_by value(s); pages start
+            after it (see iter_pages)
+        compact: smaller dtypes, see read_sql
         """
+        # PAGING
+        if after is not None:
+            where = self._and(where, self._keyset(order_by, after, desc))
+        if page_size is not None:
+            order_by, desc = self._page_order(order_by, desc), False
         #SELECT
         col_names = self._select_cols(cols) 
         # SCHEMA
@@ -119,16 +141,31 @@ class MariaDB(SQL, parameters): # level 1
         # ORDER BY
         sql_statement = self._order_by(sql_statement, cols, order_by, desc)
         # LIMIT
-        sql_statement = self._limit(sql_statement, limit)
-        # LOG
-        if print_bool:
-            self._save_sql_hx(sql_statement + ';')
+        if page_size is not None:
+            sql_statement = self._paginate(sql_statement, page_size, offset)
+        else:
+            sql_statement = self._limit(sql_statement, limit)
+        # LOG - history is saved by read_sql, with duration and rowcount
         # read_sql
-        df_output = self.read_sql(sql_statement, silent=silent)
+        df_output = self.read_sql(sql_statement, silent=silent, save_hx=print_bool,
+                                  slow_threshold=slow_threshold,
+                                  compact=compact)
         # convert names to capital for consistency
         df_output = self._cols_case(caps_case, df_output)
         return df_output
 
+    def _explain(self, sql:str) -> tuple:
+        """EXPLAIN FORMAT=JSON, parsed so it nests in the slow log"""
+        import json
+        conn = self.engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f'EXPLAIN FORMAT=JSON {sql}')
+                plan = cur.fetchone()[0]
+        finally:
+            conn.close()
+        return json.loads(plan), 'json'
+
     def truncate(self, table:str, schema:str=None, engine=None, answer=None, cap_case=Literal['lower', 'upper']):
         """
         You can use this to truncate other tables too, static method
@@ -154,19 +191,25 @@ class MariaDB(SQL, parameters): # level 1
         #     table = table.upper()
 
         # create connection and truncate
-        conn = engine.raw_connection()
-        cursor = conn.cursor()
-        log.info("=======================================================")
-        log.info(f"TRUNCATE TABLE {table}... ")
-        log.info("=======================================================")
-        try:
-            cursor.execute(f"TRUNCATE TABLE {table}")
-        except ProgrammingError as e:
-            cursor.execute(f"TRUNCATE TABLE {table.lower()}")
-        except ProgrammingError as e:
-            cursor.execute(f"TRUNCATE TABLE {table.upper()}")
+        with self._stats.statement(f"TRUNCATE TABLE {table}", 'truncate') as st:
+            conn = self._raw_connection(engine)
+            st.lap('connect_wait')
+            try:
+                cursor = conn.cursor()
+                log.info("=======================================================")
+                log.info(f"TRUNCATE TABLE {table}... ")
+                log.info("=======================================================")
+                try:
+                    cursor.execute(self._truncate_sql(table))
+                except ProgrammingError as e:
+                    cursor.execute(self._truncate_sql(table.lower()))
+                except ProgrammingError as e:
+                    cursor.execute(self._truncate_sql(table.upper()))
+                finally:
+                    st.lap('execute')
+            finally:
+                conn.close()
         log.info("Table truncated, done!")
-        conn.close()
 
     def drop(self, tbl_name:str, what:str='TABLE', skip_prompt=False, answer=None):
         """For now this only drops tables, will expand in future to include sequences, etc."""
@@ -190,7 +233,20 @@ class MariaDB(SQL, parameters): # level 1
         else:
             return str(value) # set everything else to strings
 
-    def insert(self, df_input, table, engine=None, cap_cols=False):
+    def _has_table(self, table:str, schema:str=None) -> bool:
+        return self.inspector.has_table(table.lower(), schema=schema)
+
+    def create_table(self, df_input:pd.DataFrame, table:str, **kwargs) -> str:
+        """see SQL.create_table; table names are lower case, as in insert()"""
+        return super(MariaDB, self).create_table(df_input, table.lower(), **kwargs)
+
+    def insert(self, df_input, table, engine=None, cap_cols=False, create=False,
+               bulk=False, create_kwargs:dict=None):
+        """
+        executemany() of df_input into table
+        create: if the table doesn't exist, create it from df_input's inferred
+            schema (see create_table, which takes create_kwargs, e.g., sample=)
+        """
         # SET DEFAULTS #########################################################
         if cap_cols:
             df_input.columns = [x.upper() for x in df_input.columns]
@@ -198,6 +254,12 @@ class MariaDB(SQL, parameters): # level 1
         if engine is None:
             engine = self.engine
 
+        if create: # the inspector memoizes; the table may have changed since
+            self.inspector.clear_cache()
+            if not self._has_table(table):
+                self.create_table(df_input, table, engine=engine, bulk=bulk,
+                                  **(create_kwargs or {}))
+
         # A. GENERATE CONN AND CURSOR ##########################################
         # conn = self.engine.raw_connection()
         # cur = conn.cursor()
@@ -236,16 +298,24 @@ class MariaDB(SQL, parameters): # level 1
         log.info('=======================================================')
         log.info(f' pymysql EXECUTEMANY, INSERT INTO {table}')
         log.info('=======================================================')
-        try:
-            conn = self.engine.raw_connection()
-            with conn.cursor() as cur: # a good practice to follow
-                cur.executemany(sql, lines)
+        with self._stats.statement(sql, 'insert') as st:
+            st.record['rows'] = len(lines)
+            st.record['bytes'] = estimate_lines_bytes(lines)
+            conn = self._raw_connection(engine)
+            st.lap('connect_wait')
+            try:
+                with conn.cursor() as cur: # a good practice to follow
+                    cur.executemany(sql, lines)
 
-            conn.commit()
-        except Exception as e:
-            log.warning(e)
-        finally:
-            conn.close
+                conn.commit()
+            except Exception as e:
+                st.record['error'] = repr(e) # logged, not raised
+                log.warning(e)
+                if self._active_tx() is not None: # don't commit the rest of the unit of work
+                    raise
+            finally:
+                st.lap('execute')
+                conn.close()
 
 
 
@@ -13,12 +13,26 @@ from sqlwrapper.config import config_reader
 from sqlwrapper.parameters import parameters
 from sqlwrapper.errors import Missing_DBCONFIG_ValueError
 from sqlwrapper.base import SQL
+from sqlwrapper import dblink
 from sqlwrapper.errors import FailedInsertMissingTable
+from sqlwrapper.stats import estimate_lines_bytes
 from typing import Union
+from typing_extensions import Literal
 from configparser import SectionProxy
 
 log = logging.getLogger(__name__)
 
+# rows per APPEND_VALUES executemany(); each batch is committed
+DIRECT_BATCH_SIZE = 100000
+DIRECT_PHASES = ['connect_wait', 'prepare', 'nologging', 'disable_indexes', 'execute',
+                 'rebuild_indexes']
+# row number column of pre-12c OFFSET paging, dropped from the result
+ROWNUM_COL = 'rownum_'
+# rows per callproc_many() executemany() round trip
+CALLPROC_BATCH_SIZE = 10000
+# max chars of a str OUT parameter of callproc_many()
+OUT_STR_SIZE = 4000
+
 class Oracle(SQL, parameters): # level 1
     """
     Oracle Database Wrapper
@@ -33,6 +47,11 @@ class Oracle(SQL, parameters): # level 1
         * (full) LD_LIBRARY_PATH=$ORACLE_HOME/lib:$LD_LIBRARY_PATH
         * (instant) LD_LIBRARY_PATH=$ORACLE_HOME:$LD_LIBRARY_PATH
     """
+    _dialect = 'oracle'
+    # no free space for updates, no redo for direct-path loads
+    _bulk_table_options = 'PCTFREE 0 NOLOGGING'
+    _version = None # version(), cached
+
     def __init__(self, db_entry='Velos', opt_print=True, db_section:SectionProxy=None): #defaults to Velos
         # initialize config
         config = self._init_config(db_section, db_entry, opt_print)
@@ -125,14 +144,22 @@ class Oracle(SQL, parameters): # level 1
             print('Did not truncate, canceled by user.')
 
         # create connection and truncate
-        conn = engine.raw_connection()
-        cursor = conn.cursor()
-        log.info("=======================================================")
-        log.info(f"TRUNCATE TABLE {schema}.{table}... ")
-        log.info("=======================================================")
-        cursor.execute(f"TRUNCATE TABLE {schema}.{table}")
+        with self._stats.statement(f"TRUNCATE TABLE {schema}.{table}", 'truncate') as st:
+            conn = self._raw_connection(engine)
+            st.lap('connect_wait')
+            try:
+                cursor = conn.cursor()
+                log.info("=======================================================")
+                log.info(f"TRUNCATE TABLE {schema}.{table}... ")
+                log.info("=======================================================")
+                try:
+                    cursor.execute(self._truncate_sql(f"{schema}.{table}"))
+                    st.lap('execute')
+                finally:
+                    cursor.close()
+            finally:
+                conn.close()
         log.info("Table truncated, done!")
-        conn.close()
     
     def ls_schemas(self):
         sql_statement = (f'SELECT username AS schema_name ' \
@@ -165,29 +192,59 @@ class Oracle(SQL, parameters): # level 1
               'Schema/User:', self.schema_name, '\n',
               'DB type:', self._config['db_type'])
     
-    def version(self):
-        """prints the Oracle DB version"""
-        conn = self.engine.raw_connection()
-        str_version = conn.version
-        ls_verStr = [int(x) for x in str_version.split('.')]
-        d_ver = {10 : '10g',
-                 11 : '11g',
-                 12 : '12c',
-                 1 : 'Release 1',
-                 2 : 'Release 2'}
-        msg = 'Oracle Database '
-        msg += d_ver[ls_verStr[0]] + ' '
-        msg += d_ver[ls_verStr[1]] + ' '
-        msg += '['+str_version+']'
-        print(msg)
-        
-    @staticmethod
-    def _limit(sql_statement, limit):
+    def version(self, print_bool:bool=True) -> tuple:
+        """the Oracle DB version, e.g., (19, 3, 0, 0, 0); cached after the first call"""
+        if self._version is None:
+            conn = self.engine.raw_connection()
+            try:
+                str_version = conn.version
+            finally:
+                conn.close()
+            self._version = tuple(int(x) for x in str_version.split('.'))
+        if print_bool:
+            d_ver = {10 : '10g',
+                     11 : '11g',
+                     12 : '12c',
+                     23 : '23ai'}
+            d_rel = {1 : 'Release 1',
+                     2 : 'Release 2'}
+            major, release = self._version[0], self._version[1]
+            msg = 'Oracle Database '
+            msg += d_ver.get(major, f'{major}c') + ' '
+            if major <= 12: # 18c onwards are yearly releases
+                msg += d_rel.get(release, '') + ' '
+            msg += '['+'.'.join(str(x) for x in self._version)+']'
+            print(msg)
+        return self._version
+
+    def _limit(self, sql_statement, limit):
         if type(limit) is int: # if SELECT TOP is defined correctly as int
-            sql_statement = (f"SELECT * FROM ({sql_statement}) " \
-                             f"WHERE ROWNUM <= {str(limit)}")
+            sql_statement = self._paginate(sql_statement, limit)
         return sql_statement
-        
+
+    def _paginate(self, sql_statement:str, page_size:int, offset:int=0) -> str:
+        """
+        12c+: OFFSET/FETCH, so the optimizer can stop early (top-n sort);
+        before: ROWNUM, which stops the scan at offset + page_size rows
+        """
+        if self.version(print_bool=False)[0] >= 12:
+            if offset:
+                return f"{sql_statement} OFFSET {offset} ROWS FETCH NEXT {page_size} ROWS ONLY"
+            return f"{sql_statement} FETCH FIRST {page_size} ROWS ONLY"
+        if not offset:
+            return f"SELECT * FROM ({sql_statement}) WHERE ROWNUM <= {page_size}"
+        return (f"SELECT * FROM (SELECT a.*, ROWNUM {ROWNUM_COL} FROM ({sql_statement}) a " \
+                f"WHERE ROWNUM <= {offset + page_size}) WHERE {ROWNUM_COL} > {offset}")
+
+    @staticmethod
+    def _literal(value) -> str:
+        """ANSI date/timestamp literals don't depend on NLS formats"""
+        if isinstance(value, datetime.datetime):
+            return f"TIMESTAMP '{value.strftime('%Y-%m-%d %H:%M:%S.%f')}'"
+        if isinstance(value, datetime.date):
+            return f"DATE '{value.strftime('%Y-%m-%d')}'"
+        return SQL._literal(value)
+
     def select(self,
                tbl_name:str,
                cols:Union[list, str]='*',
@@ -197,14 +254,29 @@ class Oracle(SQL, parameters): # level 1
                limit:int=10, # default to 10
                where:str=None,
                order_by:str=None,
-               desc:bool=False):
+               desc:bool=False,
+               slow_threshold:float=None,
+               page_size:int=None,
+               offset:int=0,
+               after=None,
+               compact:bool=False):
         """
         Function: returns a pd.DataFrame
         cols: list of columns
         tbl: table name
         schema: schema name (or default is selected)
         limit: limit number of rows
+        slow_threshold: seconds, log to the slow-query log if slower
+        page_size: rows per page (replaces limit), skipping offset rows
+        after: keyset paging, the last page's order_by value(s); pages start
+            after it (see iter_pages)
+        compact: smaller dtypes, see read_sql
         """
+        # PAGING
+        if after is not None:
+            where = self._and(where, self._keyset(order_by, after, desc))
+        if page_size is not None:
+            order_by, desc = self._page_order(order_by, desc), False
         #SELECT
         col_names = self._select_cols(cols) 
         # SCHEMA
@@ -221,16 +293,66 @@ class Oracle(SQL, parameters): # level 1
         # ORDER BYselect_cols
         sql_statement = self._order_by(sql_statement, cols, order_by, desc)
         # LIMIT
-        sql_statement = self._limit(sql_statement, limit)
-        # LOG
-        if print_bool:
-            self._save_sql_hx(sql_statement + ';')
+        if page_size is not None:
+            sql_statement = self._paginate(sql_statement, page_size, offset)
+        else:
+            sql_statement = self._limit(sql_statement, limit)
+        # LOG - history is saved by read_sql, with duration and rowcount
         #df_output = pd.read_sql(sql_statement, con=self.engine)
-        df_output = self.read_sql(sql_statement)
+        df_output = self.read_sql(sql_statement, save_hx=print_bool,
+                                  slow_threshold=slow_threshold,
+                                  compact=compact)
         # convert names to capital for consistency
         df_output.columns = [x.upper() for x in df_output.columns]
+        if ROWNUM_COL.upper() in df_output.columns: # 11g paging
+            df_output = df_output.drop(columns=ROWNUM_COL.upper())
         return df_output
 
+    def db_links(self) -> pd.DataFrame:
+        """database links visible to this user (ALL_DB_LINKS)"""
+        return dblink.db_links(self)
+
+    def remote_agg(self,
+                   tbl_name:str,
+                   db_link:str,
+                   groupby:list=None,
+                   agg:dict=None,
+                   where:str=None,
+                   local_table:str=None,
+                   on:list=None,
+                   schema:str=None) -> pd.DataFrame:
+        """
+        GROUP BY on tbl_name@db_link, run on the remote site (DRIVING_SITE)
+        so only the aggregate crosses the link, e.g.,
+        db.remote_agg('ENCOUNTERS', 'CLARITY', groupby='DEPT_ID', agg={'LOS' : 'mean'},
+                      local_table='MY_COHORT', on='PAT_ID')
+        see dblink.remote_agg
+        """
+        return dblink.remote_agg(self, tbl_name, db_link, groupby=groupby, agg=agg,
+                                 where=where, local_table=local_table, on=on,
+                                 schema=schema)
+
+    def snapshot(self,
+                 tbl_name:str,
+                 db_link:str,
+                 local_table:str=None,
+                 key:list=None,
+                 updated_col:str=None,
+                 where:str=None,
+                 schema:str=None,
+                 method:Literal['table', 'mview']='table',
+                 full:bool=False,
+                 print_bool:bool=True) -> dict:
+        """
+        local copy of tbl_name@db_link: created on the first call, refreshed
+        incrementally after (MERGE on key of rows with updated_col past the
+        local maximum), or a materialized view with method='mview'.
+        see dblink.snapshot
+        """
+        return dblink.snapshot(self, tbl_name, db_link, local_table=local_table, key=key,
+                               updated_col=updated_col, where=where, schema=schema,
+                               method=method, full=full, print_bool=print_bool)
+
     def drop(self, tbl_name:str, what:str='TABLE', skip_prompt=False, answer=None):
         """For now this only drops tables, will expand in future to include sequences, etc."""
         if skip_prompt:
@@ -244,6 +366,42 @@ class Oracle(SQL, parameters): # level 1
         if self.p.prompt_confirmation(msg=f'Are you sure your want to drop {tbl_name}?', answer=answer):
             self.read_sql(sql_statement)
     
+    def _explain(self, sql:str) -> tuple:
+        """EXPLAIN PLAN, then read it back with DBMS_XPLAN.DISPLAY"""
+        statement_id = f'SQLWRAPPER_{int(time.time() * 1000)}'
+        conn, cursor = self._generate_conn_cursor()
+        try:
+            cursor.execute(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {sql}")
+            cursor.execute("SELECT plan_table_output " \
+                           "FROM TABLE(DBMS_XPLAN.DISPLAY('PLAN_TABLE', :stmt_id, 'TYPICAL'))",
+                           stmt_id=statement_id)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            conn.rollback() # plan_table rows are scratch
+        finally:
+            cursor.close()
+            conn.close()
+        return plan, 'dbms_xplan'
+
+    def _has_table(self, table:str, schema:str=None) -> bool:
+        if schema is None:
+            schema = self.schema_name
+        return self.inspector.has_table(table.lower(), schema=schema.lower())
+
+    def create_table(self, df_input:pd.DataFrame, table:str, schema:str=None, **kwargs) -> str:
+        """
+        see SQL.create_table; names are upper-cased since the DDL quotes them
+        and insert() does not
+        """
+        upper = lambda x: str(x).upper()
+        if isinstance(df_input, pd.DataFrame):
+            df_input = df_input.rename(columns=upper)
+        else: # chunks
+            df_input = (x.rename(columns=upper) for x in df_input)
+        if schema is None:
+            schema = self.schema_name
+        return super(Oracle, self).create_table(df_input, table.upper(),
+                                                schema=schema.upper(), **kwargs)
+
     def _fix_data(self, df_input:pd.DataFrame):
         """
         * str: replace the actual string "None" with an empty string
@@ -262,10 +420,10 @@ class Oracle(SQL, parameters): # level 1
                 #print('INTEGER: ', col)
                 log.debug('INTEGER: ' + col)
                 # convert to string
-                df_temp.loc[:,col] = df_temp[col].astype(str)
-                log.info(df_temp.loc[:,col])
+                df_temp[col] = df_temp[col].astype(str)
+                log.debug(df_temp.loc[:,col])
                 # replace pd.IntDtype64 with empty string
-                df_temp.loc[:,col] = df_temp[col].replace('<NA>', '')
+                df_temp[col] = df_temp[col].replace('<NA>', '')
             elif 'date' in col.lower():
                 #print('DATE: ', col)
                 log.debug('DATE: ' + col)
@@ -291,26 +449,33 @@ class Oracle(SQL, parameters): # level 1
         """
         * Generate a temporary cursor
         * Remember to close the cursor once done 
+        * Inside db.transaction(), the transaction's connection
         """
-        if engine==None:
-            engine = self.engine
-
-        conn = engine.raw_connection()
+        conn = self._raw_connection(engine)
         cursor = conn.cursor()
         return conn, cursor
 
     #def to_oracle(self, df_input, table, schema=None, engine=None, cap_cols=False):
-    def insert(self, df_input, table, schema=None, engine=None, cap_cols=False):
+    def insert(self, df_input, table, schema=None, engine=None, cap_cols=False,
+               create=False, bulk=False, create_kwargs:dict=None,
+               mode:Literal['conventional', 'direct']='conventional',
+               disable_indexes=False, nologging=False, parallel:int=None,
+               batch_size:int=DIRECT_BATCH_SIZE):
         """
         Utilizes cx_oracle's executemany() method, which is much faster
         Credit to Bill Riedl's function, see repository:
             - gitlab/ucd-ri-pydbutils/PandasDBDataStreamer.py
+        create: if the table doesn't exist, create it from df_input's inferred
+            schema (see create_table, which takes create_kwargs, e.g., sample=)
+        bulk: with create, use load-once storage options (PCTFREE 0 NOLOGGING)
+        mode='direct': direct-path load for full reloads, see _insert_direct;
+            returns a pd.Series of seconds per phase instead of (sql, lines)
+            * disable_indexes - non-unique indexes UNUSABLE, rebuilt after
+            * nologging - table NOLOGGING during the load (take a backup after)
+            * parallel - degree for parallel DML and the index rebuilds
         """
         from sqlalchemy.exc import DatabaseError
 
-        if not self.inspector.has_table(table):
-            raise FailedInsertMissingTable(f"Table doesn't exist in db")
-
         # SET DEFAULTS #########################################################
         if cap_cols:
             df_input.columns = [x.upper() for x in df_input.columns]
@@ -321,52 +486,193 @@ class Oracle(SQL, parameters): # level 1
         if schema is None:
             schema = self.schema_name
 
-        # A. GENERATE CONN AND CURSOR ##########################################
-        conn, cursor = self._generate_conn_cursor()
+        if not self._has_table(table, schema=schema):
+            if not create:
+                raise FailedInsertMissingTable(f"Table doesn't exist in db")
+            self.create_table(df_input, table, schema=schema, engine=engine,
+                              bulk=bulk, **(create_kwargs or {}))
 
-        # B. GRAB COLS AS STRING ###############################################
-        df_temp = self._fix_data(df_input.copy())
-        cols = str(', '.join(df_temp.columns.tolist()))
-        ## if df has more cols than in the database, filter using this below:
-        cols_tbl = (', '.join(self.columns(table)))
+        if mode == 'direct':
+            if self._active_tx() is not None:
+                raise ValueError("mode='direct' commits per batch; run it outside db.transaction()")
+            return self._insert_direct(df_input, table, schema, engine,
+                                       disable_indexes=disable_indexes,
+                                       nologging=nologging,
+                                       parallel=parallel,
+                                       batch_size=batch_size)
+
+        # A. GENERATE CONN AND CURSOR ##########################################
+        with self._stats.statement(f'INSERT INTO {schema}.{table.upper()}', 'insert') as st:
+            conn, cursor = self._generate_conn_cursor(engine)
+            st.lap('connect_wait')
+            try:
+                # B. GRAB COLS AS STRING #######################################
+                df_temp = self._fix_data(df_input.copy())
+                cols = str(', '.join(df_temp.columns.tolist()))
+                ## if df has more cols than in the database, filter using this below:
+                cols_tbl = (', '.join(self.columns(table)))
 
-        # C. CONVERT EACH VAL OF EACH ROW --> STRING ###########################
-        func = lambda ls : [str(x).replace('NaT','') for x in ls]
-        # converts df to a list of string values 
-        lines = [tuple(func(x)) for x in df_temp.values]
+                # C. CONVERT EACH VAL OF EACH ROW --> STRING ###################
+                func = lambda ls : [str(x).replace('NaT','') for x in ls]
+                # converts df to a list of string values 
+                lines = [tuple(func(x)) for x in df_temp.values]
+                st.record['rows'] = len(lines)
+                st.record['bytes'] = estimate_lines_bytes(lines)
         
-        # D. BIND VARS #########################################################
-        bind_vars = ''
-        for i in range(len(df_temp.columns)):
-            bind_vars = bind_vars + ':' + str(i + 1) + ','
+                # D. BIND VARS #################################################
+                bind_vars = ''
+                for i in range(len(df_temp.columns)):
+                    bind_vars = bind_vars + ':' + str(i + 1) + ','
         
-        ## remove trailing
-        bind_vars = bind_vars[:-1]
-
-        # E. GENERATE INSERT STATEMENT #########################################
-        sql = f'INSERT INTO {schema}.{table.upper()} ({cols}) values ({bind_vars})'
-        print(sql)
-
-        # F. EXECUTE SQL #######################################################
-        cursor.execute("ALTER SESSION SET NLS_DATE_FORMAT = 'YYYY-MM-DD HH24:MI:SS'")
-        log.info("=======================================================")
-        log.info(f" cx_Oracle EXECUTEMANY, INSERT INTO {schema}.{table}... ")
-        log.info("=======================================================")
-        log.debug(sql)
-        try:
-            cursor.executemany(sql, lines)
-            conn.commit()
-        except Exception as e:
-            #log.warning(e) # definitely want this to fail....
-            log.error('sqlwrapper.oracle.insert() error')
-            log.error(f"cx_Oracle.cursor.executemany() error: {e}",  exc_info=True)
-            raise
-            #log.error('[sql]: ' + sql)
-            #log.error('[lines[:10]]: ' + '; '.join(lines[:10]))
-        finally:
-            cursor.close()
-            conn.close()
-            return sql, lines[:10]
+                ## remove trailing
+                bind_vars = bind_vars[:-1]
+
+                # E. GENERATE INSERT STATEMENT #################################
+                sql = f'INSERT INTO {schema}.{table.upper()} ({cols}) values ({bind_vars})'
+                print(sql)
+                st.record['sql'] = sql
+                st.lap('prepare')
+
+                # F. EXECUTE SQL ###############################################
+                cursor.execute("ALTER SESSION SET NLS_DATE_FORMAT = 'YYYY-MM-DD HH24:MI:SS'")
+                cursor.execute("ALTER SESSION SET NLS_TIMESTAMP_FORMAT = 'YYYY-MM-DD HH24:MI:SS.FF'")
+                log.info("=======================================================")
+                log.info(f" cx_Oracle EXECUTEMANY, INSERT INTO {schema}.{table}... ")
+                log.info("=======================================================")
+                log.debug(sql)
+                try:
+                    cursor.executemany(sql, lines)
+                    conn.commit()
+                except Exception as e:
+                    #log.warning(e) # definitely want this to fail....
+                    log.error('sqlwrapper.oracle.insert() error')
+                    log.error(f"cx_Oracle.cursor.executemany() error: {e}",  exc_info=True)
+                    raise
+                    #log.error('[sql]: ' + sql)
+                    #log.error('[lines[:10]]: ' + '; '.join(lines[:10]))
+                finally:
+                    st.lap('execute')
+            finally:
+                cursor.close()
+                conn.close()
+        return sql, lines[:10]
+
+    def _insert_direct(self,
+                       df_input:pd.DataFrame,
+                       table:str,
+                       schema:str,
+                       engine=None,
+                       disable_indexes=False,
+                       nologging=False,
+                       parallel:int=None,
+                       batch_size:int=DIRECT_BATCH_SIZE) -> pd.Series:
+        """
+        Direct-path load: INSERT /*+ APPEND_VALUES */ array inserts above the
+        high-water mark, committed per batch (ORA-12838, the session cannot
+        touch the table again until a direct-path insert is committed).
+        Indexes and table logging are always restored, even on failure.
+        """
+        owner, table = schema.upper(), table.upper()
+
+        # A. GENERATE CONN AND CURSOR ##########################################
+        with self._stats.statement(f'INSERT /*+ APPEND_VALUES */ INTO {owner}.{table}',
+                                   'insert') as st:
+            conn, cursor = self._generate_conn_cursor(engine)
+            st.lap('connect_wait')
+            try:
+                # B. CONVERT EACH VAL OF EACH ROW --> STRING ###################
+                df_temp = self._fix_data(df_input.copy())
+                cols = ', '.join(df_temp.columns.tolist())
+                bind_vars = ','.join([f':{i + 1}' for i in range(len(df_temp.columns))])
+                func = lambda ls : [str(x).replace('NaT','') for x in ls]
+                lines = [tuple(func(x)) for x in df_temp.values]
+                st.record['rows'] = len(lines)
+                st.record['bytes'] = estimate_lines_bytes(lines)
+                sql = f'INSERT /*+ APPEND_VALUES */ INTO {owner}.{table} ({cols}) values ({bind_vars})'
+                print(sql)
+                st.record['sql'] = sql
+                st.lap('prepare')
+
+                # C. SESSION ###################################################
+                cursor.execute("ALTER SESSION SET NLS_DATE_FORMAT = 'YYYY-MM-DD HH24:MI:SS'")
+                cursor.execute("ALTER SESSION SET NLS_TIMESTAMP_FORMAT = 'YYYY-MM-DD HH24:MI:SS.FF'")
+                if parallel:
+                    cursor.execute('ALTER SESSION ENABLE PARALLEL DML')
+                log.info("=======================================================")
+                log.info(f" cx_Oracle DIRECT-PATH, INSERT INTO {owner}.{table}... ")
+                log.info("=======================================================")
+                ls_indexes = []
+                restore_logging = False
+                batches = 0
+                try:
+                    # D. NOLOGGING / DISABLE INDEXES ###########################
+                    if nologging:
+                        cursor.execute("SELECT logging FROM all_tables " \
+                                       "WHERE owner = :owner AND table_name = :tbl",
+                                       owner=owner, tbl=table)
+                        row = cursor.fetchone()
+                        if row is not None and row[0] == 'YES':
+                            cursor.execute(f'ALTER TABLE {owner}.{table} NOLOGGING')
+                            restore_logging = True
+                        st.lap('nologging')
+                    if disable_indexes:
+                        ls_indexes = self._unusable_candidates(cursor, owner, table)
+                        for idx in ls_indexes:
+                            log.info(f'ALTER INDEX {owner}.{idx} UNUSABLE')
+                            cursor.execute(f'ALTER INDEX {owner}.{idx} UNUSABLE')
+                        st.lap('disable_indexes')
+
+                    # E. EXECUTE SQL ###########################################
+                    for i in range(0, len(lines), batch_size):
+                        cursor.executemany(sql, lines[i:i + batch_size])
+                        conn.commit()
+                        batches += 1
+                    st.lap('execute')
+                except Exception as e:
+                    conn.rollback()
+                    log.error('sqlwrapper.oracle.insert(mode="direct") error')
+                    log.error(f"cx_Oracle.cursor.executemany() error: {e}", exc_info=True)
+                    raise
+                finally:
+                    # F. RESTORE ###############################################
+                    degree = f' PARALLEL {parallel}' if parallel else ''
+                    for idx in ls_indexes:
+                        log.info(f'ALTER INDEX {owner}.{idx} REBUILD{degree}')
+                        cursor.execute(f'ALTER INDEX {owner}.{idx} REBUILD{degree}')
+                        if parallel: # the degree would stick to the index otherwise
+                            cursor.execute(f'ALTER INDEX {owner}.{idx} NOPARALLEL')
+                    if ls_indexes:
+                        st.lap('rebuild_indexes')
+                    if restore_logging:
+                        cursor.execute(f'ALTER TABLE {owner}.{table} LOGGING')
+                    if parallel: # connections are pooled; don't leak session state
+                        cursor.execute('ALTER SESSION DISABLE PARALLEL DML')
+            finally:
+                cursor.close()
+                conn.close()
+
+        report = pd.Series({x : st.record.get(x, 0.0) for x in DIRECT_PHASES},
+                           name=f'{owner}.{table}')
+        report['total'] = st.record['total']
+        report['rows'] = len(lines)
+        report['batches'] = batches
+        report['indexes'] = len(ls_indexes)
+        log.info(f'direct-path load report:\n{report}')
+        return report
+
+    @staticmethod
+    def _unusable_candidates(cursor, owner:str, table:str) -> list:
+        """
+        non-unique, non-partitioned, valid B-tree/bitmap indexes on the table;
+        unique indexes are maintained by the load and can't be skipped
+        """
+        cursor.execute("SELECT index_name FROM all_indexes " \
+                       "WHERE table_owner = :owner AND table_name = :tbl " \
+                       "AND uniqueness = 'NONUNIQUE' AND partitioned = 'NO' " \
+                       "AND status = 'VALID' " \
+                       "AND index_type IN ('NORMAL', 'BITMAP', 'FUNCTION-BASED NORMAL')",
+                       owner=owner, tbl=table)
+        return [x[0] for x in cursor.fetchall()]
 
     def update(self,
                tbl_name:str,
@@ -390,9 +696,10 @@ class Oracle(SQL, parameters): # level 1
         sql = self._readify_sql(sql_statement)
         if not silent:
             print(sql)
+        in_tx = self._active_tx() is not None # commits with the transaction
         try:
             cursor.execute(sql)
-            if autocommit==True:
+            if autocommit==True or in_tx:
                 conn.commit()
             else:
                 if p.prompt_confirmation(msg=f'Do you want to commit the update?'):
@@ -403,6 +710,8 @@ class Oracle(SQL, parameters): # level 1
             log.warning(e)
             cursor.close()
             conn.close()
+            if in_tx: # don't commit the rest of the unit of work
+                raise
 
     def callproc(self, name_of_stored_procedure:str, engine=None, *args, **kwargs):
         """
@@ -410,16 +719,84 @@ class Oracle(SQL, parameters): # level 1
         https://cx-oracle.readthedocs.io/en/latest/user_guide/plsql_execution.html#plsqlproc
         Note, you have to know the input, output variables of the stored procedure
         """
-        conn, cursor = self._generate_conn_cursor(engine=engine)
-        #out_val = cursor.var(str)
-        try:
-            cursor.callproc(name_of_stored_procedure, *args, **kwargs)
-            conn.commit()
-        except Exception as e:
-            log.warning(e)
-        finally:
-            conn.close()
-            cursor.close()
+        with self._stats.statement(name_of_stored_procedure, 'callproc') as st:
+            conn, cursor = self._generate_conn_cursor(engine=engine)
+            st.lap('connect_wait')
+            #out_val = cursor.var(str)
+            try:
+                cursor.callproc(name_of_stored_procedure, *args, **kwargs)
+                conn.commit()
+            except Exception as e:
+                st.record['error'] = repr(e) # logged, not raised
+                log.warning(e)
+                if self._active_tx() is not None: # don't commit the rest of the unit of work
+                    raise
+            finally:
+                st.lap('execute')
+                cursor.close()
+                conn.close()
 
+    def callproc_many(self,
+                      name_of_stored_procedure:str,
+                      params,
+                      out_params:dict=None,
+                      batch_size:int=CALLPROC_BATCH_SIZE,
+                      engine=None) -> pd.DataFrame:
+        """
+        Calls the procedure once per row of params, batch_size rows per round
+        trip: executemany() of an anonymous block, BEGIN proc(:1, :2); END;
+        * params - pd.DataFrame (columns are the IN parameter names, passed
+          as name => value) or a list of tuples (positional)
+        * out_params - {name: type}, e.g., {'P_STATUS' : str, 'P_ID' : int},
+          bound after the IN parameters (by name if params is a DataFrame)
+        One connection (the transaction's, inside db.transaction()) and one
+        commit; errors are raised, unlike callproc(). Returns the OUT
+        parameters, one row per params row (same index).
+        """
+        out_params = out_params or {}
+        if isinstance(params, pd.DataFrame):
+            index = params.index
+            names = list(params.columns)
+            rows = params.astype(object).where(params.notna(), None).values.tolist()
+        else:
+            rows = [tuple(x) for x in params]
+            index = pd.RangeIndex(len(rows))
+            names = None
+        n_in = len(rows[0]) if rows else len(names or [])
 
+        # A. ANONYMOUS BLOCK ###################################################
+        ls_binds = [f':{i + 1}' for i in range(n_in + len(out_params))]
+        if names is not None:
+            ls_binds = [f'{x} => {y}' for x, y in zip(names + list(out_params), ls_binds)]
+        sql = f"BEGIN {name_of_stored_procedure}({', '.join(ls_binds)}); END;"
+        log.info(f'callproc_many: {len(rows)} calls of {name_of_stored_procedure}')
+        log.debug(sql)
 
+        # B. EXECUTEMANY PER BATCH #############################################
+        with self._stats.statement(sql, 'callproc') as st:
+            st.record['rows'] = len(rows)
+            conn, cursor = self._generate_conn_cursor(engine=engine)
+            st.lap('connect_wait')
+            d_out = {x : [] for x in out_params}
+            try:
+                for i in range(0, len(rows), batch_size):
+                    batch = rows[i:i + batch_size]
+                    ls_vars = [cursor.var(t, OUT_STR_SIZE, arraysize=len(batch)) if t is str
+                               else cursor.var(t, arraysize=len(batch))
+                               for t in out_params.values()]
+                    if ls_vars:
+                        cursor.setinputsizes(*([None] * n_in + ls_vars))
+                    cursor.executemany(sql, batch)
+                    for col, var in zip(out_params, ls_vars):
+                        d_out[col] += [var.getvalue(j) for j in range(len(batch))]
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                log.error(f'callproc_many() error: {e}')
+                raise
+            finally:
+                st.lap('execute')
+                cursor.close()
+                conn.close()
+        self._save_sql_hx(sql, st.record['total'], len(rows))
+        return pd.DataFrame(d_out, index=index, columns=list(out_params))
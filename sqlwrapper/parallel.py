@@ -0,0 +1,252 @@
+"""
+parallel.py
+    |--> __init__.py
+
+DESCRIPTION:
+    CPU-heavy per-chunk pandas work on a process pool, for when one core is
+    the bottleneck of read -> transform -> insert:
+
+        chunks = db_src.read_sql_iter('SELECT * FROM NOTES', chunksize=50000)
+        for df_out in sqlwrapper.process_map(clean_notes, chunks, workers=8):
+            ...
+        report = sqlwrapper.process_insert(clean_notes, chunks, db_dst, 'NOTES_CLEAN',
+                                           workers=8)
+
+    * results come back in input order; at most in_flight chunks (default 2
+      per worker) are out at once, so memory stays bounded
+    * chunks cross to the workers and back through shared memory rather than
+      pickles: as Arrow IPC when pyarrow is installed, otherwise numeric,
+      bool and datetime columns as raw numpy blocks (text and other object
+      columns are still pickled)
+    * func(df) -> df, or None to drop the chunk; it must be importable
+      (module level), as for any process pool
+    * inserts run here, in order: connections can't cross processes
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import collections
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Iterable
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+TRANSPORTS = ('auto', 'arrow', 'numpy', 'pickle')
+# chunks submitted but not yet consumed, per worker
+IN_FLIGHT_PER_WORKER = 2
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+_DONE = object() # end-of-input marker
+
+
+################################################################################
+# A. SHARED-MEMORY FRAMES
+################################################################################
+class shm_frame:
+    """
+    a pd.DataFrame parked in a SharedMemory block; this small handle is what
+    gets pickled. The process that packs it owns the block (see release())
+    """
+    def __init__(self, df:pd.DataFrame, transport:str):
+        self.transport = transport
+        self.name = None
+        self.size = 0
+        self.meta = None # numpy: column layout; pickle: the frame itself
+        self._shm = None
+        if transport == 'pickle':
+            self.meta = df
+        elif transport == 'arrow':
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            self._write([np.frombuffer(sink.getvalue(), dtype=np.uint8)])
+        else:
+            self._pack_numpy(df)
+
+    def _write(self, arrays:list) -> list:
+        """arrays back to back into a new block; returns their offsets"""
+        offsets, total = [], 0
+        for arr in arrays:
+            offsets.append(total)
+            total += arr.nbytes
+        self._shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        self.name, self.size = self._shm.name, total
+        for arr, offset in zip(arrays, offsets):
+            view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=self._shm.buf, offset=offset)
+            view[...] = arr
+            del view # the block can't close while a view exists
+        return offsets
+
+    def _pack_numpy(self, df:pd.DataFrame) -> None:
+        arrays, layout, other = [], [], {}
+        for i in range(df.shape[1]):
+            col = df.iloc[:, i]
+            if isinstance(col.dtype, np.dtype) and col.dtype.kind in 'biufcmM':
+                arrays.append(np.ascontiguousarray(col.to_numpy()))
+                layout.append(i)
+            else:
+                other[i] = col # object, str, categorical, nullable: pickled
+        offsets = self._write(arrays)
+        self.meta = {
+            'columns' : df.columns,
+            'index' : df.index,
+            'blocks' : [(i, arr.dtype.str, arr.shape, offset)
+                        for i, arr, offset in zip(layout, arrays, offsets)],
+            'other' : other,
+        }
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_shm'] = None
+        return state
+
+    def unpack(self) -> pd.DataFrame:
+        """a copy of the frame, independent of the block"""
+        if self.transport == 'pickle':
+            return self.meta
+        shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            if self.transport == 'arrow':
+                data = pa.py_buffer(bytes(shm.buf[:self.size]))
+                return pa.ipc.open_stream(data).read_all().to_pandas()
+            d_cols = dict(self.meta['other'])
+            for i, dtype, shape, offset in self.meta['blocks']:
+                view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+                d_cols[i] = view.copy()
+                del view
+            df = pd.DataFrame({i : d_cols[i] for i in range(len(self.meta['columns']))},
+                              index=self.meta['index'])
+            df.columns = self.meta['columns']
+            return df
+        finally:
+            shm.close()
+
+    def close(self) -> None:
+        """detach, leaving the block for the receiver"""
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+    def release(self) -> None:
+        """free the block; by whichever side is done with it last"""
+        if self.name is None:
+            return
+        shm = self._shm or shared_memory.SharedMemory(name=self.name)
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+        self._shm = None
+
+
+def _transport(transport:str) -> str:
+    if transport not in TRANSPORTS:
+        raise ValueError(f'transport must be one of {TRANSPORTS}')
+    if transport == 'auto':
+        return 'arrow' if pa is not None else 'numpy'
+    if transport == 'arrow' and pa is None:
+        raise ImportError("transport='arrow' requires pyarrow")
+    return transport
+
+
+def _work(func:Callable, frame:shm_frame):
+    """runs in a worker: unpack, func, pack the result for the parent"""
+    df_out = func(frame.unpack())
+    if df_out is None:
+        return None
+    out = shm_frame(df_out, frame.transport)
+    out.close() # the parent reads it, then releases it
+    return out
+
+
+################################################################################
+# B. PROCESS MAP
+################################################################################
+def process_map(func:Callable,
+                chunks:Iterable,
+                workers:int=None,
+                in_flight:int=None,
+                transport:str='auto') -> Iterable:
+    """
+    yields func(chunk) for each pd.DataFrame in chunks, computed on a pool of
+    workers processes (default: CPU count), in the order of chunks
+    """
+    transport = _transport(transport)
+    workers = workers or os.cpu_count()
+    in_flight = in_flight or IN_FLIGHT_PER_WORKER * workers
+    chunks = iter(chunks)
+    pending = collections.deque() # (future, shm_frame), in input order
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < in_flight:
+                    df_chunk = next(chunks, _DONE)
+                    if df_chunk is _DONE:
+                        exhausted = True
+                        break
+                    frame = shm_frame(df_chunk, transport)
+                    pending.append((pool.submit(_work, func, frame), frame))
+                if not pending:
+                    return
+                future, frame = pending.popleft()
+                try:
+                    out = future.result()
+                finally:
+                    frame.release()
+                if out is None:
+                    continue
+                try:
+                    df_out = out.unpack()
+                finally:
+                    out.release()
+                yield df_out
+        finally: # consumer left early or a worker failed
+            for future, _ in pending:
+                future.cancel()
+            for future, frame in pending:
+                if not future.cancelled() and future.exception() is None \
+                        and future.result() is not None:
+                    future.result().release()
+                frame.release()
+
+
+def process_insert(func:Callable,
+                   chunks:Iterable,
+                   dest_db,
+                   table:str,
+                   workers:int=None,
+                   in_flight:int=None,
+                   transport:str='auto',
+                   **insert_kwargs) -> dict:
+    """
+    process_map(), with each result inserted into dest_db's table, in order;
+    insert_kwargs go to dest_db.insert() (e.g., create=True).
+    Returns chunks, rows, seconds and workers.
+    """
+    start_time = time.perf_counter()
+    n_chunks, rows = 0, 0
+    workers = workers or os.cpu_count()
+    for df_out in process_map(func, chunks, workers=workers, in_flight=in_flight,
+                              transport=transport):
+        dest_db.insert(df_out, table, **insert_kwargs)
+        n_chunks += 1
+        rows += len(df_out)
+    report = {'chunks' : n_chunks, 'rows' : rows,
+              'seconds' : time.perf_counter() - start_time, 'workers' : workers}
+    log.info(f"process_insert into {table}: {rows} rows in {n_chunks} chunks, " \
+             f"{report['seconds']:.2f}s on {workers} workers")
+    return report
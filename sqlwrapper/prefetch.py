@@ -0,0 +1,161 @@
+"""
+prefetch.py
+    |--> base.py
+
+DESCRIPTION:
+    Streamed reads that overlap the database with the loop body:
+
+        for df_chunk in db.read_sql_iter('SELECT * FROM VISITS', prefetch=2):
+            work_on(df_chunk)
+
+    A background thread runs the query on its own connection (server-side
+    cursor), fetches chunksize rows at a time, builds each DataFrame and
+    queues it; the queue holds `prefetch` chunks, so memory stays at about
+    prefetch + 1 chunks. While the consumer works on one chunk the next ones
+    are already crossing the network (DBAPI calls release the GIL).
+
+    With compact=True the first chunk picks the dtypes and every later chunk
+    is cast to them (see df_tools.compact_plan), so the chunks concat
+    cleanly; a column only widens when a later chunk doesn't fit.
+
+    Leaving the loop early (break, exception) stops the thread and closes
+    the cursor. reader.wait is how long the loop sat waiting for data: near
+    zero means the fetch keeps up, otherwise raise prefetch or chunksize.
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import logging
+import queue
+import threading
+import time
+
+import pandas as pd
+
+from sqlwrapper.stats import estimate_df_bytes
+from sqlwrapper.df_tools import compact_plan
+
+log = logging.getLogger(__name__)
+
+# rows per chunk
+ITER_CHUNKSIZE = 50000
+# chunks fetched ahead of the consumer
+PREFETCH_CHUNKS = 2
+# how often a blocked producer checks whether the consumer left
+POLL_SECONDS = 0.1
+
+_DONE = object() # end-of-stream marker
+
+
+class prefetch_reader:
+    """iterable of pd.DataFrame chunks of sql, see module docstring"""
+    def __init__(self, db, sql:str, chunksize:int=ITER_CHUNKSIZE,
+                 prefetch:int=PREFETCH_CHUNKS, compact:bool=False,
+                 arraysize:int=None, save_hx:bool=True):
+        self.db = db
+        self.sql = sql
+        self.chunksize = chunksize
+        self.prefetch = max(int(prefetch), 1)
+        self.compact = compact
+        self.arraysize = arraysize or chunksize
+        self.save_hx = save_hx
+        self.chunks = 0
+        self.wait = 0.0 # seconds the consumer waited on the queue
+        self.record = None # the statement's stats, once it has run
+        self._queue = queue.Queue(maxsize=self.prefetch)
+        self._stop = threading.Event()
+        self._started = False
+
+    def __iter__(self):
+        if self._started: # the stream can't be rewound
+            raise RuntimeError('read_sql_iter() readers can only be iterated once; ' \
+                               'call read_sql_iter() again to re-run the query')
+        self._started = True
+        thread = threading.Thread(target=self._produce, daemon=True,
+                                  name='sqlwrapper-prefetch')
+        thread.start()
+        try:
+            while True:
+                t0 = time.perf_counter()
+                item = self._get(thread)
+                self.wait += time.perf_counter() - t0
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                self.chunks += 1
+                yield item
+        finally:
+            self._stop.set()
+            while thread.is_alive(): # unblock a producer stuck on put()
+                try:
+                    self._queue.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    pass
+            thread.join()
+            if self.record is not None:
+                if self.save_hx:
+                    self.db._save_sql_hx(self.sql, self.record['total'], self.record['rows'])
+                log.info(f"read_sql_iter: {self.chunks} chunks, {self.record['rows']} rows; " \
+                         f"waited {self.wait:.2f}s for data, " \
+                         f"{self.record.get('queue_wait', 0.0):.2f}s blocked on a full queue")
+
+    def _get(self, thread:threading.Thread):
+        """the next item; _DONE if the producer is gone without saying so"""
+        while True:
+            try:
+                return self._queue.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if not thread.is_alive() and self._queue.empty():
+                    return _DONE
+
+    def _put(self, item) -> bool:
+        """queue item unless the consumer has gone; True if queued"""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self):
+        rows, n_bytes, n_chunks = 0, 0, 0
+        try:
+            with self.db._stats.statement(self.sql, 'read_sql_iter') as st:
+                self.record = st.record
+                try:
+                    with self.db.engine.connect() as conn:
+                        st.lap('connect_wait')
+                        options = {'stream_results' : True, 'arraysize' : self.arraysize}
+                        result = conn.exec_driver_sql(self.sql, execution_options=options)
+                        st.lap('execute')
+                        columns = list(result.keys())
+                        plan = compact_plan(result.cursor.description) if self.compact else None
+                        while not self._stop.is_set():
+                            batch = result.fetchmany(self.chunksize)
+                            st.lap('fetch')
+                            if not batch:
+                                break
+                            df_chunk = pd.DataFrame.from_records(batch, columns=columns,
+                                                                 coerce_float=not self.compact)
+                            n_chunks += 1
+                            if plan is not None:
+                                df_chunk, report = plan.apply(df_chunk)
+                                if report['widened']:
+                                    log.info(f"read_sql_iter: chunk {n_chunks} widened " \
+                                             f"{report['widened']}")
+                            st.lap('to_df')
+                            rows += len(df_chunk)
+                            n_bytes += estimate_df_bytes(df_chunk)
+                            if not self._put(df_chunk):
+                                break
+                            st.lap('queue_wait')
+                        result.close()
+                finally:
+                    st.record['rows'] = rows
+                    st.record['bytes'] = n_bytes
+        except Exception as e: # recorded on the statement; raised in the consumer
+            self._put(e)
+        finally:
+            self._put(_DONE)
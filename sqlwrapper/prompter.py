@@ -1,4 +1,4 @@
-from src.errors import YesNoParseError
+from sqlwrapper.errors import YesNoParseError
 
 class Prompter:
     def __init__(self):
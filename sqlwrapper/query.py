@@ -0,0 +1,224 @@
+"""
+query.py
+    |--> base.py
+
+DESCRIPTION:
+    A lazy, chainable query over one table, compiled by SQLAlchemy Core for
+    the connection's dialect, so filters, aggregations and projections run
+    on the server and only the result crosses the wire.
+
+        q = db.table('VISITS').filter(DEPT='ED', ADMIT_DATE__ge='2024-01-01')
+        df = q.groupby('DX').agg(n=('*', 'count'), los=('LOS', 'mean')) \
+              .order_by('n', desc=True).limit(20).to_df()
+
+    Every method returns a new query; nothing runs until to_df()/count().
+    * filter(*conditions, **kwargs) - conditions are SQL strings or SQLAlchemy
+      expressions (q.c.LOS > 3); kwargs are COL=value (list -> IN,
+      None -> IS NULL) or COL__op=value, op in gt, ge, lt, le, ne, in, like
+    * agg(name=(col, func)) or agg({col: func or [funcs]}), funcs: count,
+      size, nunique, sum, mean, min, max
+    Names are rendered as typed, unquoted, the same as select(); limit()
+    compiles to ROWNUM/FETCH FIRST, TOP or LIMIT depending on the dialect.
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import copy
+import logging
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import func
+from sqlalchemy.sql import quoted_name
+from sqlalchemy.sql.elements import ClauseElement
+
+log = logging.getLogger(__name__)
+
+FILTER_OPS = {
+    'eq' : lambda c, v: c.is_(None) if v is None else c == v,
+    'ne' : lambda c, v: c.is_not(None) if v is None else c != v,
+    'gt' : lambda c, v: c > v,
+    'ge' : lambda c, v: c >= v,
+    'lt' : lambda c, v: c < v,
+    'le' : lambda c, v: c <= v,
+    'in' : lambda c, v: c.in_(list(v)),
+    'like' : lambda c, v: c.like(v),
+}
+
+AGG_FUNCS = {
+    'count' : lambda c: func.count(c),
+    'size' : lambda c: func.count(),
+    'nunique' : lambda c: func.count(sqlalchemy.distinct(c)),
+    'sum' : func.sum,
+    'mean' : func.avg,
+    'avg' : func.avg,
+    'min' : func.min,
+    'max' : func.max,
+}
+
+
+def _name(identifier:str):
+    """identifier rendered as typed, i.e., unquoted like raw SQL"""
+    return quoted_name(identifier, quote=False)
+
+
+class columns:
+    """q.c.COL -> a column of the query's table, for expressions"""
+    def __init__(self, table):
+        self._table = table
+
+    def __getattr__(self, col:str):
+        if col.startswith('__'):
+            raise AttributeError(col)
+        return self[col]
+
+    def __getitem__(self, col:str):
+        return sqlalchemy.column(_name(col), _selectable=self._table)
+
+
+class query:
+    """see module docstring; created with db.table()"""
+    def __init__(self, db, table:str, schema:str=None):
+        self.db = db
+        self._table = sqlalchemy.table(_name(table),
+                                       schema=_name(schema) if schema else None)
+        self.c = columns(self._table)
+        self._cols = []
+        self._where = []
+        self._groupby = []
+        self._aggs = {} # label -> expression
+        self._having = []
+        self._order_by = []
+        self._limit = None
+        self._distinct = False
+
+    def _copy(self):
+        q = copy.copy(self)
+        for attr in ('_cols', '_where', '_groupby', '_having', '_order_by'):
+            setattr(q, attr, list(getattr(self, attr)))
+        q._aggs = dict(self._aggs)
+        return q
+
+    def _column(self, col):
+        if isinstance(col, ClauseElement):
+            return col
+        if col == '*':
+            return sqlalchemy.literal_column('*')
+        return self.c[col]
+
+    def _condition(self, condition):
+        if isinstance(condition, ClauseElement):
+            return condition
+        return sqlalchemy.text(condition)
+
+    # A. CHAIN #################################################################
+    def select(self, *cols):
+        """projection; column names or expressions"""
+        q = self._copy()
+        q._cols += [self._column(x) for x in cols]
+        return q
+
+    def filter(self, *conditions, **kwargs):
+        """WHERE, ANDed with any earlier filter()"""
+        q = self._copy()
+        q._where += [self._condition(x) for x in conditions]
+        for key, value in kwargs.items():
+            col, _, op = key.partition('__')
+            if op == '' and isinstance(value, (list, tuple, set)):
+                op = 'in'
+            if (op or 'eq') not in FILTER_OPS:
+                raise ValueError(f'Unknown filter {key}; ops: {list(FILTER_OPS)}')
+            q._where.append(FILTER_OPS[op or 'eq'](self._column(col), value))
+        return q
+
+    def groupby(self, *cols):
+        q = self._copy()
+        q._groupby += [self._column(x) for x in cols]
+        return q
+
+    def agg(self, spec:dict=None, **named):
+        """
+        agg(n=('*', 'count'), total=('AMOUNT', 'sum')), or as in pandas,
+        agg({'AMOUNT' : ['sum', 'mean']}) -> AMOUNT_sum, AMOUNT_mean
+        """
+        q = self._copy()
+        ls_aggs = list(named.items())
+        for col, funcs in (spec or {}).items():
+            if isinstance(funcs, str):
+                ls_aggs.append((col, (col, funcs)))
+            else:
+                ls_aggs += [(f'{col}_{x}', (col, x)) for x in funcs]
+        for label, (col, how) in ls_aggs:
+            if how not in AGG_FUNCS:
+                raise ValueError(f'Unknown aggregation {how}; one of {list(AGG_FUNCS)}')
+            q._aggs[label] = AGG_FUNCS[how](self._column(col)).label(label)
+        return q
+
+    def having(self, *conditions):
+        q = self._copy()
+        q._having += [self._condition(x) for x in conditions]
+        return q
+
+    def order_by(self, *cols, desc:bool=False):
+        """column names, agg() labels or expressions"""
+        q = self._copy()
+        for col in cols:
+            expr = q._aggs[col] if isinstance(col, str) and col in q._aggs \
+                   else self._column(col)
+            q._order_by.append(expr.desc() if desc else expr)
+        return q
+
+    def limit(self, n:int):
+        q = self._copy()
+        q._limit = n
+        return q
+
+    def distinct(self):
+        q = self._copy()
+        q._distinct = True
+        return q
+
+    # B. COMPILE ###############################################################
+    @property
+    def statement(self) -> sqlalchemy.Select:
+        """the SQLAlchemy Core SELECT"""
+        ls_cols = self._cols or ([] if (self._aggs or self._groupby) \
+                                 else [sqlalchemy.literal_column('*')])
+        if self._aggs or self._groupby: # group keys first, once
+            grouped = {str(x) for x in self._groupby}
+            ls_cols = self._groupby + [x for x in ls_cols if str(x) not in grouped] \
+                      + list(self._aggs.values())
+        stmt = sqlalchemy.select(*ls_cols).select_from(self._table)
+        if self._where:
+            stmt = stmt.where(*self._where)
+        if self._groupby:
+            stmt = stmt.group_by(*self._groupby)
+        if self._having:
+            stmt = stmt.having(*self._having)
+        if self._distinct:
+            stmt = stmt.distinct()
+        if self._order_by:
+            stmt = stmt.order_by(*self._order_by)
+        if self._limit is not None:
+            stmt = stmt.limit(self._limit)
+        return stmt
+
+    @property
+    def sql(self) -> str:
+        """the SQL for this connection's dialect, with values inlined"""
+        return self.db._compile(self.statement)
+
+    def __repr__(self):
+        return f'query({self.sql})'
+
+    # C. RUN ###################################################################
+    def to_df(self, silent:bool=False, slow_threshold:float=None,
+              compact:bool=False) -> pd.DataFrame:
+        return self.db.read_sql(self.statement, silent=silent,
+                                slow_threshold=slow_threshold, compact=compact)
+
+    def count(self) -> int:
+        """COUNT(*) of the rows this query returns, on the server"""
+        stmt = sqlalchemy.select(func.count()).select_from(self.statement.subquery())
+        with self.db.engine.connect() as conn:
+            return conn.execute(stmt).scalar()
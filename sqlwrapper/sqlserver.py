@@ -1,3 +1,4 @@
+import datetime
 import logging
 import urllib
 from sqlalchemy.engine import URL
@@ -21,6 +22,9 @@ class SQLServer(SQL, parameters): # level 1
     SQL Server Database Wrapper
     Set-up: authentication config
     """
+    _dialect = 'sqlserver'
+    _truncate_commits = False # TRUNCATE is transactional
+
     def __init__(self,
                  db_entry='OMOP_DeID',
                  schema_name='dbo',
@@ -43,18 +47,28 @@ class SQLServer(SQL, parameters): # level 1
         generates conn_string, also selects driver
         """
         # if FreeTDS driver
-        if self._driver.lower() in "{freetds}":
+        if self._is_freetds():
             return self._generate_freetds_conn_string()
         else: # if official microsoft ODBC drivers
             return self._generate_mssql_conn_string()
 
 
+    def _is_freetds(self) -> bool:
+        """DRIVER=FreeTDS or DRIVER={FreeTDS}, any case"""
+        return self._driver.strip().strip('{}').lower() == 'freetds'
+
     def _generate_mssql_conn_string(self):
         """ 
         Driver: {ODBC Driver 17 for SQL Server}: 
         * Generates conn_string using encoded odbc_connect method
         * supports windows auth
         """
+        conn_string = self._generate_odbc_string()
+        encoded_url_string = urllib.parse.quote_plus(conn_string)
+        return f'mssql+pyodbc:///?odbc_connect={encoded_url_string}'
+
+    def _generate_odbc_string(self):
+        """raw ODBC connection string, before url encoding"""
         try: # sql auth
             conn_string = (f"DRIVER={self._driver};" \
                                f"SERVER={self._hostname};" \
@@ -67,8 +81,14 @@ class SQLServer(SQL, parameters): # level 1
                            f"SERVER={self._hostname};" \
                            f"DATABASE={self._database};" \
                            f"TRUSTED_CONNECTION={self.trusted_bool};")
-        encoded_url_string = urllib.parse.quote_plus(conn_string)
-        return f'mssql+pyodbc:///?odbc_connect={encoded_url_string}'
+        return conn_string
+
+    def _on_do_connect(self, dialect, conn_rec, cargs, cparams):
+        """odbc_connect passes one positional string; rebuild it"""
+        if cargs and not self._is_freetds():
+            cargs[0] = self._generate_odbc_string()
+        else:
+            super(SQLServer, self)._on_do_connect(dialect, conn_rec, cargs, cparams)
 
     def _generate_freetds_conn_string(self):
         """
@@ -136,8 +156,7 @@ class SQLServer(SQL, parameters): # level 1
         #                        f"PWD={config['world']}")
         # self.encoded_url_string = urllib.parse.quote_plus(conn_string)
         self._flush()
-        self._generate_engine()
-        self._generate_inspector()
+        self._connect() # engine, inspector and every engine hook
 
     def use(self, db_name=None, schema_name=None):
         """USE DATABASE <new-db-name>;"""
@@ -243,7 +262,23 @@ class SQLServer(SQL, parameters): # level 1
         else: # else select all
             sql_statement = f"SELECT {col_names} FROM {prefix}.{tbl_name}"
         return sql_statement
+
+    @staticmethod
+    def _paginate(sql_statement:str, order_by:str, page_size:int, offset:int=0) -> str:
+        """OFFSET ... FETCH (2012+) needs an ORDER BY"""
+        if not order_by:
+            sql_statement = f"{sql_statement} ORDER BY (SELECT NULL)"
+        return f"{sql_statement} OFFSET {offset} ROWS FETCH NEXT {page_size} ROWS ONLY"
     
+    @staticmethod
+    def _literal(value) -> str:
+        """DATETIME takes 3 fractional digits at most (error 241); DATETIME2 takes 7"""
+        if isinstance(value, datetime.datetime):
+            return f"CONVERT(DATETIME2, '{value.strftime('%Y-%m-%d %H:%M:%S.%f')}', 121)"
+        if isinstance(value, datetime.date):
+            return f"CONVERT(DATE, '{value.strftime('%Y-%m-%d')}', 23)"
+        return SQL._literal(value)
+
     @staticmethod
     def _get_database(prefix, database, database_default):
         """ check if schema is defined, else use default"""
@@ -268,8 +303,25 @@ class SQLServer(SQL, parameters): # level 1
                limit:int=10, # default to 10
                where:str=None,
                order_by:str=None,
-               desc:bool=False):
-        """returns a pd.DataFrame"""
+               desc:bool=False,
+               slow_threshold:float=None,
+               page_size:int=None,
+               offset:int=0,
+               after=None,
+               compact:bool=False):
+        """
+        returns a pd.DataFrame
+        slow_threshold: seconds, log to the slow-query log if slower
+        page_size: rows per page (replaces limit), skipping offset rows
+        after: keyset paging, the last page's order_by value(s); pages start
+            after it (see iter_pages)
+        compact: smaller dtypes, see read_sql
+        """
+        # PAGING
+        if after is not None:
+            where = self._and(where, self._keyset(order_by, after, desc))
+        if page_size is not None:
+            order_by, desc, limit = self._page_order(order_by, desc), False, None
         # SELECT COLS
         col_names = self._select_cols(cols) 
         # SCHEMA
@@ -282,15 +334,35 @@ class SQLServer(SQL, parameters): # level 1
         sql_statement = self._where(sql_statement, where)
         # ORDER BY
         sql_statement = self._order_by(sql_statement, cols, order_by, desc)
-        # LOG
-        if print_bool:
-            self._save_sql_hx(sql_statement + ';')
+        # PAGE
+        if page_size is not None:
+            sql_statement = self._paginate(sql_statement, order_by, page_size, offset)
+        # LOG - history is saved by read_sql, with duration and rowcount
         #df_output = pd.read_sql(sql_statement, self.engine)
-        df_output = self.read_sql(sql_statement)#, self.engine)
+        df_output = self.read_sql(sql_statement, save_hx=print_bool,
+                                  slow_threshold=slow_threshold,
+                                  compact=compact)#, self.engine)
         # convert names to capital for consistency
         #df_output.columns = [x.upper() for x in df_output.columns]
         return df_output
 
+    def _explain(self, sql:str) -> tuple:
+        """
+        SET SHOWPLAN_XML must be alone in its batch; while it is on, the
+        statement is compiled but not run and the XML plan is returned
+        """
+        conn = self.engine.raw_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SET SHOWPLAN_XML ON')
+            cursor.execute(sql)
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.execute('SET SHOWPLAN_XML OFF') # connection goes back to the pool
+            cursor.close()
+            conn.close()
+        return plan, 'showplan_xml'
+
     def columns(self,
                 tbl_name:str,
                 verbose=False,
@@ -386,14 +458,22 @@ class SQLServer(SQL, parameters): # level 1
             table = table.lower()
 
         # create connection and truncate
-        conn = engine.raw_connection()
-        cursor = conn.cursor()
-        log.info("=======================================================")
-        log.info(f"TRUNCATE TABLE {schema}.{table}... ")
-        log.info("=======================================================")
-        cursor.execute(f"TRUNCATE TABLE {schema}.{table}")
+        with self._stats.statement(f"TRUNCATE TABLE {schema}.{table}", 'truncate') as st:
+            conn = self._raw_connection(engine)
+            st.lap('connect_wait')
+            try:
+                cursor = conn.cursor()
+                log.info("=======================================================")
+                log.info(f"TRUNCATE TABLE {schema}.{table}... ")
+                log.info("=======================================================")
+                try:
+                    cursor.execute(self._truncate_sql(f"{schema}.{table}"))
+                    st.lap('execute')
+                finally:
+                    cursor.close()
+            finally:
+                conn.close()
         log.info("Table truncated, done!")
-        conn.close()
 
     def drop(self, tbl_name:str,
              what:str='TABLE',
@@ -438,11 +518,17 @@ class SQLServer(SQL, parameters): # level 1
                      if_exists='append', #sets default to append
                      method="multi", # sets default to multi
                      chunksize=1000,
+                     create=False,
+                     bulk=False,
+                     create_kwargs:dict=None,
                      **kwargs):
         """
         Since pd.DataFrame.to_sql() supports executemany() natively, this func
         only sets some defaults to my preferences. Otherwise, it effectively
         is the same.
+        create: if the table doesn't exist, create it from df_input's inferred
+            schema first (see create_table, which takes create_kwargs), rather
+            than letting to_sql() create it with generic types
         * https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.DataFrame.to_sql.html
         * https://pandas.pydata.org/pandas-docs/stable/user_guide/io.html#io-sql-method
         * execute_many:https://stackoverflow.com/a/48861231/9335288
@@ -458,14 +544,22 @@ class SQLServer(SQL, parameters): # level 1
         if schema is None:
             schema = self.schema_name
 
+        if create and not self._has_table(table, schema=schema):
+            self.create_table(df_input, table, schema=schema, engine=engine,
+                              bulk=bulk, **(create_kwargs or {}))
+
         # Convert to strings
         if method == 'multi':
             for col in df_input.columns:
-                df_input.loc[:,col] = df[col].astype(str)
+                df_input[col] = df_input[col].astype(str)
+
+        # inside db.transaction(), its connection; to_sql() then doesn't commit
+        tx = self._active_tx()
+        con = tx.conn if tx is not None and engine is self.engine else engine
 
         # You can use pd.DataFrame.to_sql() for SQLServer!!
         df_input.to_sql(table,
-            engine,
+            con,
             if_exists=if_exists,
             index=index,
             schema=schema,
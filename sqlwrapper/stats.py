@@ -0,0 +1,254 @@
+"""
+stats.py
+    |--> base.py
+
+DESCRIPTION:
+    Per-statement instrumentation for the `db` object. Each statement is
+    recorded with its phase timings, i.e.,
+        * connect_wait - checking a connection out of the pool
+        * prepare - converting/binding values ahead of executemany()
+        * execute - cursor.execute()/executemany()
+        * fetch - pulling rows off the cursor
+        * to_df - building the pd.DataFrame
+    plus rows, an estimate of bytes and, for read_sql, the fetch arraysize. Use `db.stats()` for a DataFrame of the
+    recorded statements, and `db.add_exporter()` to ship each record elsewhere
+    (logging, OpenTelemetry, Prometheus textfile).
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+# estimating bytes on huge frames is expensive; sample this many rows
+BYTES_SAMPLE_ROWS = 1000
+
+PHASES = ['connect_wait', 'prepare', 'execute', 'fetch', 'to_df']
+
+
+class statement_timer:
+    """times one statement, phase by phase; use via query_stats.statement()"""
+    def __init__(self, stats, sql:str, kind:str):
+        self._stats = stats
+        self.record = {
+            'ts' : time.time(),
+            'kind' : kind,
+            'sql' : sql,
+            'connect_wait' : 0.0,
+            'prepare' : 0.0,
+            'execute' : 0.0,
+            'fetch' : 0.0,
+            'to_df' : 0.0,
+            'total' : 0.0,
+            'rows' : None,
+            'bytes' : None,
+            'error' : None,
+        }
+
+    def start(self):
+        self._start = self._lap = time.perf_counter()
+        self._outer = self._stats.active # nested, e.g., insert() -> columns()
+        self._stats._local.active = self
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def lap(self, phase:str) -> float:
+        """
+        adds the time since the last lap to `phase`; phases outside PHASES are
+        kept on the record but are not columns of db.stats()
+        """
+        now = time.perf_counter()
+        elapsed = now - self._lap
+        self.record[phase] = self.record.get(phase, 0.0) + elapsed
+        self._lap = now
+        return elapsed
+
+    def finish(self, error:BaseException=None):
+        if self._stats.active is not self: # already finished
+            return
+        self.record['total'] = time.perf_counter() - self._start
+        if error is not None:
+            self.record['error'] = repr(error)
+        self._stats._local.active = self._outer
+        self._stats._append(self.record)
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.finish(exc_value)
+        return False # never swallow
+
+
+class query_stats:
+    """bounded store of statement records, shared by one db object"""
+    def __init__(self, maxlen:int=10000):
+        self.records = deque(maxlen=maxlen)
+        self.exporters = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def statement(self, sql:str, kind:str='read_sql') -> statement_timer:
+        return statement_timer(self, sql, kind)
+
+    @property
+    def active(self):
+        return getattr(self._local, 'active', None)
+
+    def _append(self, record:dict) -> None:
+        with self._lock:
+            self.records.append(record)
+        for exporter in list(self.exporters):
+            try:
+                exporter(record)
+            except Exception as error: # exporters must never break a query
+                log.warning(f'stats exporter {exporter!r} failed: {error}')
+
+    # A. SQLALCHEMY HOOKS ######################################################
+    def instrument(self, engine) -> None:
+        """
+        Hooks the engine's cursor events so statements that do not go through
+        read_sql (pd.to_sql, the inspector, ...) are still recorded. Inside
+        read_sql the active statement_timer does the timing instead.
+        """
+        if getattr(engine, '_sqlwrapper_stats', None) is self:
+            return
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        engine._sqlwrapper_stats = self
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active is None:
+            conn.info.setdefault('_sqlwrapper_t0', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active is not None:
+            return
+        try:
+            t0 = conn.info['_sqlwrapper_t0'].pop()
+        except (KeyError, IndexError):
+            return
+        elapsed = time.perf_counter() - t0
+        rowcount = getattr(cursor, 'rowcount', -1)
+        record = statement_timer(self, statement,
+            'executemany' if executemany else 'execute').record
+        record['execute'] = record['total'] = elapsed
+        record['rows'] = rowcount if (rowcount is not None and rowcount >= 0) else None
+        self._append(record)
+
+    # B. OUTPUT ################################################################
+    def to_frame(self):
+        import pandas as pd
+        with self._lock:
+            records = list(self.records)
+        return pd.DataFrame(records, columns=['ts', 'kind', 'sql'] + PHASES \
+                            + ['total', 'rows', 'bytes', 'arraysize', 'error'])
+
+    def reset(self) -> None:
+        with self._lock:
+            self.records.clear()
+
+
+################################################################################
+# helpers
+################################################################################
+def estimate_df_bytes(df_input) -> int:
+    """deep memory usage, extrapolated from the first BYTES_SAMPLE_ROWS rows"""
+    n = len(df_input)
+    if n == 0:
+        return 0
+    sample = df_input.iloc[:BYTES_SAMPLE_ROWS]
+    sampled = int(sample.memory_usage(index=False, deep=True).sum())
+    return int(sampled * n / len(sample))
+
+def estimate_lines_bytes(lines:list) -> int:
+    """size of bound values (as str), extrapolated from a sample of rows"""
+    n = len(lines)
+    if n == 0:
+        return 0
+    sample = lines[:BYTES_SAMPLE_ROWS]
+    sampled = sum(len(str(x)) for row in sample for x in row if x is not None)
+    return int(sampled * n / len(sample))
+
+
+################################################################################
+# exporters - any callable(record:dict) works
+################################################################################
+def log_exporter(level=logging.INFO, logger:logging.Logger=None):
+    """logs one line per statement"""
+    logger = log if logger is None else logger
+    def export(record:dict):
+        logger.log(level,
+            f"[{record['kind']}] total={record['total']:.4f}s "
+            f"connect_wait={record['connect_wait']:.4f}s "
+            f"prepare={record['prepare']:.4f}s "
+            f"execute={record['execute']:.4f}s fetch={record['fetch']:.4f}s "
+            f"to_df={record['to_df']:.4f}s rows={record['rows']} "
+            f"bytes={record['bytes']} | {record['sql'][:200]}")
+    return export
+
+def otel_exporter(meter_name:str='sqlwrapper'):
+    """
+    Records each phase into an OpenTelemetry histogram. Requires
+    `pip install opentelemetry-api`; configure the SDK/exporter as usual.
+    """
+    from opentelemetry import metrics # optional dependency
+    meter = metrics.get_meter(meter_name)
+    duration = meter.create_histogram('sqlwrapper.statement.duration', unit='s',
+        description='sqlwrapper statement time by phase')
+    rows = meter.create_counter('sqlwrapper.statement.rows')
+    def export(record:dict):
+        for phase in PHASES + ['total']:
+            duration.record(record[phase], {'kind' : record['kind'], 'phase' : phase})
+        if record['rows']:
+            rows.add(record['rows'], {'kind' : record['kind']})
+    return export
+
+class prometheus_textfile_exporter:
+    """
+    Keeps running totals and rewrites a node_exporter textfile-collector file,
+    e.g., /var/lib/node_exporter/textfile/sqlwrapper.prom. The file is written
+    at most every `interval` seconds, and atomically (tmp + os.replace).
+    """
+    def __init__(self, path, interval:float=15.0, job:str='sqlwrapper'):
+        self.path = str(path)
+        self.interval = interval
+        self.job = job
+        self._totals = {} # (kind, metric) -> float
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, record:dict):
+        with self._lock:
+            kind = record['kind']
+            self._add(kind, 'statements_total', 1)
+            if record['error'] is not None:
+                self._add(kind, 'errors_total', 1)
+            for phase in PHASES + ['total']:
+                self._add(kind, f'{phase}_seconds_total', record[phase])
+            self._add(kind, 'rows_total', record['rows'] or 0)
+            self._add(kind, 'bytes_total', record['bytes'] or 0)
+            if time.monotonic() - self._last_write >= self.interval:
+                self.flush()
+
+    def _add(self, kind, metric, value):
+        self._totals[(kind, metric)] = self._totals.get((kind, metric), 0) + value
+
+    def flush(self):
+        lines = []
+        for metric in sorted({m for _, m in self._totals}):
+            lines.append(f'# TYPE sqlwrapper_{metric} counter')
+            for (kind, m), value in sorted(self._totals.items()):
+                if m == metric:
+                    lines.append(f'sqlwrapper_{metric}{{job="{self.job}",kind="{kind}"}} {value}')
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, self.path)
+        self._last_write = time.monotonic()
@@ -0,0 +1,108 @@
+"""
+transaction.py
+    |--> base.py
+
+DESCRIPTION:
+    One unit of work over one pooled connection:
+
+        with db.transaction() as tx:
+            db.truncate('STAGE', answer='yes')
+            db.insert(df, 'STAGE')
+            with tx.savepoint(): # rolled back alone if it raises
+                db.callproc('MERGE_STAGE')
+            df_check = db.read_sql('SELECT COUNT(*) AS n FROM TARGET')
+
+    insert, update, truncate, callproc and read_sql called inside the block
+    (on the thread that opened it) run on the transaction's connection and
+    commit once, on exit; an exception rolls everything back. tx.insert(...)
+    etc. are the same calls, via the db object.
+    * TRUNCATE commits implicitly on Oracle and MariaDB, so inside a
+      transaction truncate() issues DELETE FROM there instead
+    * other DDL (create_table, insert(create=True)) and insert(mode='direct')
+      commit on their own; run them before the transaction
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class shared_connection:
+    """
+    the transaction's DBAPI connection, for code written against
+    engine.raw_connection(): commit(), rollback() and close() are left to the
+    transaction
+    """
+    def __init__(self, dbapi_connection):
+        self._conn = dbapi_connection
+
+    def cursor(self, *args, **kwargs):
+        return self._conn.cursor(*args, **kwargs)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class transaction:
+    """see module docstring; created with db.transaction()"""
+    def __init__(self, db):
+        self.db = db
+        self.conn = None # sqlalchemy Connection
+        self.raw = None # shared_connection over the same DBAPI connection
+        self._tx = None
+
+    def __enter__(self):
+        if self.db._active_tx() is not None:
+            raise RuntimeError('A transaction is already open; use tx.savepoint() to nest')
+        self.conn = self.db.engine.connect()
+        self._tx = self.conn.begin()
+        self.raw = shared_connection(self.conn.connection.dbapi_connection)
+        self.db._tx_local.tx = self
+        log.info('transaction: begin')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.db._tx_local.tx = None
+        try:
+            if not self._tx.is_active: # tx.rollback() already
+                pass
+            elif exc_type is None:
+                with self.db._stats.statement('COMMIT', 'commit') as st:
+                    self._tx.commit()
+                    st.lap('execute')
+                log.info('transaction: commit')
+            else:
+                self._tx.rollback()
+                log.warning(f'transaction: rollback ({exc_type.__name__}: {exc_value})')
+        finally:
+            self.conn.close()
+        return False
+
+    @property
+    def active(self) -> bool:
+        return self._tx is not None and self._tx.is_active
+
+    def savepoint(self):
+        """
+        SAVEPOINT; as a context manager it rolls back to it (only) on an
+        exception, which still propagates: catch it to carry on
+        """
+        return self.conn.begin_nested()
+
+    def rollback(self) -> None:
+        """undo everything so far; the block should end after this"""
+        self._tx.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
@@ -0,0 +1,319 @@
+"""
+transfer.py
+    |--> base.py
+
+DESCRIPTION:
+    Table-to-table copy between two sqlwrapper connections, without pandas.
+
+        sqlwrapper.copy_table(db_mssql, db_oracle, 'VISITS', partitions=4,
+                              partition_col='VISIT_ID')
+
+    Rows are fetched in batches from a server-side cursor on the source and
+    handed as-is (no DataFrame, no str()) to executemany() on the
+    destination, so values keep their native types. If the destination table
+    is missing it is created from the source's reflected columns, mapped to
+    the destination dialect through SQLAlchemy's generic types. Partitions
+    split a numeric column's MIN..MAX range and run on their own threads and
+    connections. At the end, COUNT(*) and SUM() of the numeric columns are
+    compared on both servers: the source's (with where) against what the
+    copy added to the destination, so rows already there don't count.
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy
+from sqlalchemy import types as sqltypes
+from sqlalchemy.dialects import mssql, mysql, oracle
+
+from sqlwrapper.errors import FailedCopyVerification
+
+log = logging.getLogger(__name__)
+
+# rows per fetchmany()/executemany()
+COPY_BATCH_SIZE = 10000
+# Oracle VARCHAR2 limit (without MAX_STRING_SIZE=EXTENDED); longer -> CLOB
+ORACLE_MAX_VARCHAR = 4000
+# relative tolerance when comparing SUM()s; floats add up in any order
+SUM_REL_TOL = 1e-9
+# SQL Server types without a generic sqlalchemy type that are still numbers
+MONEY_TYPES = (mssql.MONEY, mssql.SMALLMONEY)
+
+
+def copy_table(src_db,
+               dst_db,
+               table:str,
+               dst_table:str=None,
+               columns:list=None,
+               where:str=None,
+               src_schema:str=None,
+               dst_schema:str=None,
+               batch_size:int=COPY_BATCH_SIZE,
+               partitions:int=1,
+               partition_col:str=None,
+               create:bool=True,
+               truncate:bool=False,
+               verify:bool=True) -> dict:
+    """
+    Copies src_db's table into dst_db's dst_table (default: same name).
+    * columns - subset of columns (default: all); where - source filter
+    * src_schema/dst_schema - default to each connection's default schema
+    * partitions/partition_col - parallel copy over ranges of a numeric column
+    * create - create dst_table from the mapped source types if missing
+    * truncate - TRUNCATE dst_table first (no prompt)
+    * verify - compare row counts and numeric SUM()s, raise on mismatch
+    Returns a report: rows, seconds, rows_per_sec, partitions, verified.
+    """
+    dst_table = dst_table or table
+    start_time = time.perf_counter()
+
+    # A. COLUMNS AND TYPES #####################################################
+    ls_meta = src_db.inspector.get_columns(table.lower(), schema=src_schema)
+    if columns is not None:
+        wanted = {x.lower() for x in columns}
+        ls_meta = [x for x in ls_meta if x['name'].lower() in wanted]
+    if not ls_meta:
+        raise ValueError(f'No columns found for {table}')
+    ls_cols = [x['name'] for x in ls_meta]
+
+    numeric = [x['name'] for x in ls_meta if _is_numeric(x['type'])]
+    dst_before = None # destination checksum before the copy, if it had rows
+    if not dst_db._has_table(dst_table, schema=dst_schema):
+        if not create:
+            raise ValueError(f'{dst_table} does not exist in the destination')
+        create_like(ls_meta, dst_db, dst_table, dst_schema)
+    elif truncate:
+        _execute(dst_db, f'TRUNCATE TABLE {_qualify(dst_table, dst_schema)}')
+    elif verify:
+        dst_before = _checksum(dst_db, dst_table, dst_schema, numeric)
+
+    # B. STATEMENTS ############################################################
+    select_sql = f'SELECT {", ".join(ls_cols)} FROM {_qualify(table, src_schema)}'
+    insert_sql = f'INSERT INTO {_qualify(dst_table, dst_schema)} ' \
+                 f'({", ".join(ls_cols)}) VALUES ({_binds(dst_db, len(ls_cols))})'
+    ls_where = _partition_predicates(src_db, table, src_schema, where,
+                                     partition_col, partitions)
+    log.info(f'copy_table: {_qualify(table, src_schema)} -> ' \
+             f'{_qualify(dst_table, dst_schema)}, {len(ls_where)} partition(s)')
+
+    # C. COPY ##################################################################
+    def copy_partition(predicate:str) -> int:
+        sql = select_sql + (f' WHERE {predicate}' if predicate else '')
+        return _copy_rows(src_db, dst_db, sql, insert_sql, batch_size)
+
+    if len(ls_where) == 1:
+        ls_rows = [copy_partition(ls_where[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(ls_where)) as pool:
+            ls_rows = list(pool.map(copy_partition, ls_where))
+    n_rows = sum(ls_rows)
+    elapsed = time.perf_counter() - start_time
+    report = {
+        'rows' : n_rows,
+        'seconds' : elapsed,
+        'rows_per_sec' : n_rows / elapsed if elapsed else None,
+        'partitions' : ls_rows,
+        'verified' : None,
+    }
+
+    # D. VERIFY ################################################################
+    if verify:
+        src_check = _checksum(src_db, table, src_schema, numeric, where)
+        dst_check = _checksum(dst_db, dst_table, dst_schema, numeric)
+        # compared as before + copied == after; subtracting would lose the
+        # precision of small copies into large tables
+        expected = _add(dst_before, src_check) if dst_before else src_check
+        report['verified'] = _same(expected, dst_check)
+        if not report['verified']:
+            raise FailedCopyVerification(f'{table}: source {src_check} plus ' \
+                                         f'destination before {dst_before} != ' \
+                                         f'destination after {dst_check}')
+    log.info(f"copy_table: {n_rows} rows in {elapsed:.2f}s " \
+             f"({report['rows_per_sec'] or 0:.0f} rows/s), verified={report['verified']}")
+    return report
+
+
+def create_like(ls_meta:list, dst_db, dst_table:str, dst_schema:str=None) -> str:
+    """
+    CREATE TABLE dst_table from reflected source columns (inspector
+    get_columns() output), types mapped to dst_db's dialect; returns the DDL
+    """
+    dialect = dst_db.engine.dialect
+    # lower case names are case-insensitive to sqlalchemy, i.e., unquoted
+    tbl = sqlalchemy.Table(dst_table.lower(), sqlalchemy.MetaData(),
+        *[sqlalchemy.Column(x['name'].lower(), map_type(x['type'], dialect.name),
+                            nullable=x.get('nullable', True)) for x in ls_meta],
+        schema=dst_schema)
+    ddl = str(sqlalchemy.schema.CreateTable(tbl).compile(dialect=dialect)).strip()
+    print(ddl)
+    _execute(dst_db, ddl)
+    if hasattr(dst_db, 'inspector'):
+        dst_db.inspector.clear_cache()
+    return ddl
+
+
+def map_type(type_, dialect_name:str):
+    """a reflected column type, as the destination dialect's nearest type"""
+    if isinstance(type_, MONEY_TYPES): # no generic type; exact, 4 decimals
+        return sqltypes.Numeric(19, 4) if isinstance(type_, mssql.MONEY) \
+            else sqltypes.Numeric(10, 4)
+    try:
+        generic = type_.as_generic()
+    except NotImplementedError: # dialect-only types, e.g., SQL_VARIANT
+        return sqltypes.Text()
+    if isinstance(generic, sqltypes.Uuid):
+        if dialect_name == 'mssql':
+            return mssql.UNIQUEIDENTIFIER()
+        return sqltypes.CHAR(36) # as text with the dashes, as pyodbc returns it
+    if isinstance(generic, sqltypes.String) and not isinstance(generic, sqltypes.Text):
+        if not generic.length: # NVARCHAR(MAX), ...
+            return sqltypes.Text()
+        if dialect_name == 'oracle' and generic.length > ORACLE_MAX_VARCHAR:
+            return sqltypes.Text()
+    if isinstance(generic, sqltypes.Numeric) and not isinstance(generic, sqltypes.Float) \
+            and generic.precision is None: # Oracle NUMBER: any precision and scale
+        if dialect_name == 'oracle':
+            return oracle.NUMBER()
+        if dialect_name in ('mysql', 'mariadb'):
+            return mysql.DOUBLE()
+        return sqltypes.Float(53) # bare NUMERIC would be NUMERIC(18,0)
+    if isinstance(generic, sqltypes.DateTime):
+        if dialect_name == 'oracle':
+            return oracle.TIMESTAMP() # DATE would drop fractional seconds
+        if dialect_name in ('mysql', 'mariadb'):
+            return mysql.DATETIME(fsp=6)
+        if dialect_name == 'mssql':
+            return mssql.DATETIME2() # DATETIME rounds to 1/300 s
+    if dialect_name == 'oracle' and isinstance(generic, sqltypes.Boolean):
+        return oracle.NUMBER(1) # BOOLEAN columns only exist from 23ai
+    return generic
+
+
+################################################################################
+# helpers
+################################################################################
+def _copy_rows(src_db, dst_db, select_sql:str, insert_sql:str, batch_size:int) -> int:
+    """one partition: fetchmany() from a streaming cursor -> executemany()"""
+    n_rows = 0
+    with dst_db._stats.statement(insert_sql, 'copy') as st:
+        dst_conn = dst_db.engine.raw_connection()
+        try:
+            cursor = dst_conn.cursor()
+            if hasattr(cursor, 'fast_executemany'): # pyodbc
+                cursor.fast_executemany = True
+            with src_db.engine.connect().execution_options(stream_results=True,
+                                                           yield_per=batch_size,
+                                                           arraysize=batch_size) as src_conn:
+                result = src_conn.exec_driver_sql(select_sql)
+                st.lap('connect_wait')
+                for batch in result.partitions(batch_size):
+                    lines = [tuple(x) for x in batch]
+                    st.lap('fetch')
+                    cursor.executemany(insert_sql, lines)
+                    dst_conn.commit()
+                    st.lap('execute')
+                    n_rows += len(lines)
+                    st.record['rows'] = n_rows
+                    log.debug(f'copy_table: {n_rows} rows')
+            cursor.close()
+        except Exception:
+            dst_conn.rollback()
+            raise
+        finally:
+            dst_conn.close()
+    return n_rows
+
+
+def _partition_predicates(src_db, table:str, schema:str, where:str,
+                          partition_col:str, partitions:int) -> list:
+    """WHERE clauses: one per range of partition_col, ANDed with where"""
+    if partitions <= 1 or partition_col is None:
+        return [where]
+    sql = f'SELECT MIN({partition_col}), MAX({partition_col}) FROM {_qualify(table, schema)}'
+    if where:
+        sql += f' WHERE {where}'
+    with src_db.engine.connect() as conn:
+        lo, hi = conn.exec_driver_sql(sql).fetchone()
+    if lo is None: # empty
+        return [where]
+    step = (hi - lo) / partitions
+    bounds = [lo + step * i for i in range(partitions)] + [hi]
+    ls_where = []
+    for i in range(partitions):
+        predicate = f'{partition_col} >= {bounds[i]}'
+        predicate += f' AND {partition_col} < {bounds[i + 1]}' if i < partitions - 1 \
+                     else f' AND {partition_col} <= {hi}'
+        if i == 0: # NULLs go with the first partition
+            predicate = f'({predicate} OR {partition_col} IS NULL)'
+        ls_where.append(f'({where}) AND {predicate}' if where else predicate)
+    return ls_where
+
+
+def _checksum(db, table:str, schema:str, numeric:list, where:str=None) -> tuple:
+    """(COUNT(*), SUM(col) for each numeric column) on the server"""
+    sums = ''.join(f', SUM({x} * 1.0)' for x in numeric) # * 1.0 avoids INT overflow
+    sql = f'SELECT COUNT(*){sums} FROM {_qualify(table, schema)}'
+    if where:
+        sql += f' WHERE {where}'
+    with db.engine.connect() as conn:
+        return tuple(conn.exec_driver_sql(sql).fetchone())
+
+
+def _add(a:tuple, b:tuple) -> tuple:
+    """checksums added up column by column; a SUM() of no rows is None"""
+    out = []
+    for x, y in zip(a, b):
+        if x is None or y is None:
+            out.append(y if x is None else x)
+        elif type(x) is type(y):
+            out.append(x + y) # int, Decimal: exact
+        else:
+            out.append(float(x) + float(y))
+    return tuple(out)
+
+
+def _same(a:tuple, b:tuple) -> bool:
+    if len(a) != len(b) or a[0] != b[0]:
+        return False
+    for x, y in zip(a[1:], b[1:]):
+        if x is None or y is None:
+            if x is not y:
+                return False
+        elif not math.isclose(float(x), float(y), rel_tol=SUM_REL_TOL):
+            return False
+    return True
+
+
+def _is_numeric(type_) -> bool:
+    if isinstance(type_, MONEY_TYPES):
+        return True
+    try:
+        generic = type_.as_generic()
+    except NotImplementedError:
+        return False
+    # Float is not a Numeric subclass from sqlalchemy 2.1
+    return isinstance(generic, (sqltypes.Integer, sqltypes.Numeric, sqltypes.Float)) \
+        and not isinstance(generic, sqltypes.Boolean)
+
+
+def _binds(db, n:int) -> str:
+    """positional bind placeholders in the DBAPI's paramstyle"""
+    paramstyle = db.engine.dialect.paramstyle
+    if paramstyle == 'qmark':
+        return ', '.join(['?'] * n)
+    if paramstyle in ('format', 'pyformat'):
+        return ', '.join(['%s'] * n)
+    return ', '.join([f':{i + 1}' for i in range(n)]) # named/numeric, cx_Oracle
+
+
+def _qualify(table:str, schema:str=None) -> str:
+    return f'{schema}.{table}' if schema else table
+
+
+def _execute(db, sql:str) -> None:
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(sql)
@@ -0,0 +1,202 @@
+"""
+vault.py
+    |--> connect.py
+
+DESCRIPTION:
+    In-process cache for Vault secrets used by `sqlwrapper.connect(sec_path=)`.
+    * one hvac.Client per (VAULT_SERVER, VAULT_TOKEN)
+    * secrets are kept until their lease runs out; `.env` is only re-parsed
+      when the file changes
+    * while a db object is subscribed, the secret is renewed (or re-read) in a
+      background thread before the lease expires. Rotated credentials are
+      pushed into the live db object, so new pool connections pick them up
+      without disposing the engine.
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+
+import hvac
+from dotenv import load_dotenv
+
+log = logging.getLogger(__name__)
+
+
+class secret_cache:
+    """lease-aware cache of vault secrets, keyed on (vault server, sec_path)"""
+    def __init__(self, renew_at:float=0.8, default_ttl:int=300):
+        """
+        renew_at: fraction of the lease after which the secret is refreshed
+        default_ttl: seconds to keep secrets that come back without a lease
+                     (e.g., kv-v2 returns lease_duration=0)
+        """
+        self.renew_at = renew_at
+        self.default_ttl = default_ttl
+        self._lock = threading.RLock()
+        self._clients = {}     # (url, token) -> hvac.Client
+        self._secrets = {}     # (url, sec_path) -> dict
+        self._listeners = {}   # (url, sec_path) -> [weakref.WeakMethod]
+        self._timers = {}      # (url, sec_path) -> threading.Timer
+        self._env_mtime = {}   # env_path -> mtime
+
+    # A. ENV + CLIENT ##########################################################
+    def load_env(self, env_path:Path) -> None:
+        """load_dotenv(), but only when the file is new or has changed"""
+        env_path = Path(env_path)
+        try:
+            mtime = os.path.getmtime(env_path)
+        except OSError: # missing .env, fall back to the environment
+            return
+        with self._lock:
+            if self._env_mtime.get(env_path) == mtime:
+                return
+            load_dotenv(env_path)
+            self._env_mtime[env_path] = mtime
+
+    def client(self) -> hvac.Client:
+        url = os.environ.get('VAULT_SERVER')
+        token = os.environ.get('VAULT_TOKEN')
+        with self._lock:
+            if (url, token) not in self._clients:
+                self._clients[(url, token)] = hvac.Client(url=url, token=token)
+            return self._clients[(url, token)]
+
+    # B. READ ##################################################################
+    def read(self, sec_path:str, env_path:Path=None) -> dict:
+        """returns the secret's data, reading from vault only when expired"""
+        if env_path is not None:
+            self.load_env(env_path)
+        key = (os.environ.get('VAULT_SERVER'), sec_path)
+        with self._lock:
+            old = self._secrets.get(key)
+            if old is not None and time.monotonic() < old['expires']:
+                return dict(old['data'])
+            entry = self._fetch(key)
+            if old is not None and entry['data'] != old['data']:
+                self._notify(self._live(key), entry['data'])
+            return dict(entry['data'])
+
+    def _fetch(self, key:tuple) -> dict:
+        """reads the secret from vault and stores it with its lease"""
+        url, sec_path = key
+        response = self.client().read(sec_path)
+        ttl = response.get('lease_duration') or self.default_ttl
+        entry = {
+            'data' : response['data'],
+            'lease_id' : response.get('lease_id') or None,
+            'renewable' : bool(response.get('renewable')),
+            'ttl' : ttl,
+            'expires' : time.monotonic() + ttl,
+        }
+        log.debug(f'vault read {sec_path}, lease {ttl}s')
+        with self._lock:
+            self._secrets[key] = entry
+        return entry
+
+    def invalidate(self, sec_path:str=None) -> None:
+        """drop one secret (or everything) from the cache"""
+        with self._lock:
+            for key in list(self._secrets):
+                if sec_path is None or key[1] == sec_path:
+                    del self._secrets[key]
+                    self._cancel(key)
+
+    def clear(self) -> None:
+        self.invalidate()
+        with self._lock:
+            self._clients.clear()
+            self._env_mtime.clear()
+            self._listeners.clear()
+
+    # C. ROTATION ##############################################################
+    def subscribe(self, sec_path:str, callback) -> None:
+        """
+        callback(map_secrets) is called whenever the secret at sec_path
+        changes. Bound methods are held weakly, so a closed db unsubscribes
+        itself once it is garbage collected.
+        """
+        key = (os.environ.get('VAULT_SERVER'), sec_path)
+        ref = weakref.WeakMethod(callback) if hasattr(callback, '__self__') \
+            else (lambda: callback)
+        with self._lock:
+            self._listeners.setdefault(key, []).append(ref)
+            if key not in self._timers:
+                self._schedule(key)
+
+    def _schedule(self, key:tuple) -> None:
+        entry = self._secrets.get(key)
+        if entry is None:
+            return
+        delay = max(entry['ttl'] * self.renew_at, 1)
+        timer = threading.Timer(delay, self._refresh, args=(key,))
+        timer.daemon = True # never hold the interpreter open
+        self._timers[key] = timer
+        timer.start()
+
+    def _cancel(self, key:tuple) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _refresh(self, key:tuple) -> None:
+        """background: renew the lease, or re-read and notify on rotation"""
+        with self._lock:
+            self._timers.pop(key, None)
+            listeners = self._live(key)
+            if not listeners: # nobody is using it anymore
+                return
+            old = self._secrets.get(key)
+        try:
+            if old is not None and old['renewable'] and old['lease_id']:
+                response = self.client().sys.renew_lease(lease_id=old['lease_id'])
+                ttl = response.get('lease_duration') or old['ttl']
+                with self._lock:
+                    old['ttl'] = ttl
+                    old['expires'] = time.monotonic() + ttl
+                log.debug(f'vault lease renewed for {key[1]}, {ttl}s')
+            else:
+                new = self._fetch(key)
+                if old is None or new['data'] != old['data']:
+                    log.info(f'vault secret rotated: {key[1]}')
+                    self._notify(listeners, new['data'])
+        except Exception as error: # renewal refused or vault down
+            log.warning(f'vault refresh failed for {key[1]}: {error}')
+            try:
+                new = self._fetch(key)
+                if old is None or new['data'] != old['data']:
+                    self._notify(listeners, new['data'])
+            except Exception as error:
+                log.error(error)
+        finally:
+            with self._lock:
+                if key not in self._timers:
+                    self._schedule(key)
+
+    def _live(self, key:tuple) -> list:
+        """prunes listeners whose db object has been garbage collected"""
+        with self._lock:
+            listeners = [ref for ref in self._listeners.get(key, [])
+                         if ref() is not None]
+            self._listeners[key] = listeners
+            return listeners
+
+    @staticmethod
+    def _notify(listeners:list, map_secrets:dict) -> None:
+        for ref in listeners:
+            callback = ref()
+            if callback is None:
+                continue
+            try:
+                callback(dict(map_secrets))
+            except Exception as error:
+                log.error(error, exc_info=True)
+
+
+# module-level cache shared by sqlwrapper.connect()
+vault_cache = secret_cache()
@@ -1,15 +1,55 @@
-from openpyxl import load_workbook 
+"""
+xlsx.py
+    |--> base.py
+
+DESCRIPTION:
+    Reading .xlsx workbooks into pd.DataFrames with openpyxl.
+    * iter_xlsx() - streams one sheet as DataFrame chunks from a read-only
+      workbook, so memory is bounded by chunksize rather than the sheet size;
+      applies dtype hints per chunk, and can detect the header row below
+      titles (header='auto')
+    * read_xlsx() - the workbook, or {sheet: DataFrame}
+    * read_sheets() - {sheet: DataFrame}; with processes > 1, sheets are
+      parsed concurrently in a process pool (openpyxl parsing is CPU-bound,
+      so threads don't help)
+    * db.insert_xlsx() pipes iter_xlsx() chunks into the backend's insert()
+
+Duke LeTran <daletran@ucdavis.edu>
+Research Infrastructure, IT Health Informatics, UC Davis Health
+"""
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from openpyxl import load_workbook
 import pandas as pd
 import pathlib
+from typing import Union, Iterator
 
+log = logging.getLogger(__name__)
 
-def read_xlsx(path_to_xlsx:pathlib.Path, 
-              return_type='default'): #-> Union(pd.DataFrame, dict):
+# rows per DataFrame chunk
+XLSX_CHUNKSIZE = 50000
+# concurrent table loads in db.insert_xlsx_sheets; within sqlalchemy's pool_size
+XLSX_LOAD_THREADS = 4
+# header='auto' looks for the header within the first rows (titles, notes...)
+HEADER_SCAN_ROWS = 20
 
 
+def read_xlsx(path_to_xlsx:pathlib.Path,
+              return_type='default',
+              processes:int=None): #-> Union(pd.DataFrame, dict):
+    """
+    return_type='dfs' returns {sheet: pd.DataFrame}, with the first row of
+    each sheet as its columns and the cells as openpyxl loads them (formulas
+    as text, blank rows kept). processes > 1 parses the sheets concurrently
+    with read_sheets() instead, read-only: formulas as their cached values,
+    blank rows skipped, blank/duplicate column names as pandas names them.
+    Otherwise, returns the (editable) workbook.
+    """
     #path_example: # Path.cwd() / 'data' /'spreadsheet.xlsx'
+    if return_type == 'dfs' and processes is not None and processes > 1:
+        return read_sheets(path_to_xlsx, processes=processes)
     workbook = load_workbook(filename=path_to_xlsx)
-
     if return_type == 'dfs':
         dict_dfs = {}
         for sheet in workbook.sheetnames:
@@ -18,7 +58,7 @@ def read_xlsx(path_to_xlsx:pathlib.Path,
     else: # else just return the workbook
         print(f'Returning workbook, with sheets: {str(workbook.sheetnames)}.')
         return workbook
-    
+
 
 def sheet_to_df(sheet_input, columns=True):
     """
@@ -27,9 +67,186 @@ def sheet_to_df(sheet_input, columns=True):
     """
     data = sheet_input.values
     # get column data
-    if columns:
-        cols = next(data)
+    cols = next(data) if columns else None
     # get data
-    data = list(data)
-    df_output = pd.DataFrame(data, columns=cols)
+    df_output = pd.DataFrame(list(data), columns=cols)
     return df_output
+
+
+################################################################################
+# parallel
+################################################################################
+def read_sheets(path_to_xlsx:pathlib.Path,
+                sheets:list=None,
+                header:Union[int, str, None]=0,
+                dtype:dict=None,
+                processes:int=1) -> dict:
+    """
+    {sheet: pd.DataFrame} for sheets (default: all), in workbook order.
+    processes > 1 parses each sheet in its own process, up to `processes` at
+    a time; on Windows, call this under `if __name__ == '__main__':`.
+    """
+    sheets = _sheet_order(path_to_xlsx, sheets)
+    dict_dfs = dict(iter_sheets(path_to_xlsx, sheets, header, dtype, processes))
+    return {x : dict_dfs[x] for x in sheets}
+
+
+def iter_sheets(path_to_xlsx:pathlib.Path,
+                sheets:list=None,
+                header:Union[int, str, None]=0,
+                dtype:dict=None,
+                processes:int=1) -> Iterator[tuple]:
+    """
+    yields (sheet, pd.DataFrame): in workbook order, or with processes > 1
+    as each process finishes parsing
+    """
+    sheets = _sheet_order(path_to_xlsx, sheets)
+    processes = min(processes or 1, len(sheets)) or 1
+    if processes == 1:
+        for sheet in sheets:
+            yield _read_sheet(path_to_xlsx, sheet, header, dtype)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(_read_sheet, path_to_xlsx, x, header, dtype) for x in sheets]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _sheet_order(path_to_xlsx:pathlib.Path, sheets:list=None) -> list:
+    if sheets is not None:
+        return list(sheets)
+    workbook = load_workbook(filename=path_to_xlsx, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def _read_sheet(path_to_xlsx:pathlib.Path, sheet:str, header, dtype:dict) -> tuple:
+    """one sheet as a pd.DataFrame; top-level so the process pool can pickle it"""
+    workbook = load_workbook(filename=path_to_xlsx, read_only=True, data_only=True)
+    try:
+        return sheet, _concat(_iter_sheet(workbook[sheet], header=header, dtype=dtype))
+    finally:
+        workbook.close()
+
+
+################################################################################
+# streaming
+################################################################################
+def iter_xlsx(path_to_xlsx:pathlib.Path,
+              sheet:Union[str, int]=None,
+              chunksize:int=XLSX_CHUNKSIZE,
+              header:Union[int, str, None]=0,
+              dtype:dict=None) -> Iterator[pd.DataFrame]:
+    """
+    Yields pd.DataFrame chunks of one sheet (default: the first) from a
+    read-only workbook; only one chunk of rows is held at a time.
+    * header - a 0-based row number, None for no header, or 'auto': the
+      first all-text row at least as wide as every row below it, skipping
+      titles above it
+    * dtype - {col: dtype} hints applied to every chunk, so the chunks agree,
+      e.g., {'MRN' : 'string', 'VISIT_DATE' : 'datetime64[ns]'}
+    Blank rows are skipped and trailing empty columns dropped. A row wider
+    than the first rows adds columns from its chunk on, with a warning.
+    """
+    workbook = load_workbook(filename=path_to_xlsx, read_only=True, data_only=True)
+    try:
+        if sheet is None:
+            sheet = workbook.sheetnames[0]
+        elif isinstance(sheet, int):
+            sheet = workbook.sheetnames[sheet]
+        yield from _iter_sheet(workbook[sheet], chunksize, header, dtype)
+    finally:
+        workbook.close()
+
+
+def _iter_sheet(worksheet,
+                chunksize:int=XLSX_CHUNKSIZE,
+                header:Union[int, str, None]=0,
+                dtype:dict=None) -> Iterator[pd.DataFrame]:
+    rows = worksheet.iter_rows(values_only=True)
+    n_scan = HEADER_SCAN_ROWS if not isinstance(header, int) else max(HEADER_SCAN_ROWS, header + 1)
+    head = list(itertools.islice(rows, n_scan))
+    if header == 'auto':
+        header = _detect_header(head)
+    if header is None:
+        width = max([_width(x) for x in head], default=0)
+        names = None
+        body = head
+    else:
+        width = max([_width(x) for x in head[header:]], default=0)
+        names = tuple(head[header]) if header < len(head) else ()
+        body = head[header + 1:]
+    columns = _columns(names, width)
+
+    chunk, n_chunks = [], 0
+    for n_row, row in enumerate(itertools.chain(body, rows)):
+        row_width = _width(row)
+        if row_width == 0: # blank row
+            continue
+        if row_width > width: # wider than the scanned rows: add columns
+            log.warning(f'{worksheet.title}: data row {n_row + 1} reaches column ' \
+                        f'{row_width}, past the {width} columns seen so far; ' \
+                        f'widening (earlier chunks lack the new columns)')
+            chunk = [x + (None,) * (row_width - width) for x in chunk]
+            width = row_width
+            columns = _columns(names, width)
+        row = row[:width]
+        if len(row) < width:
+            row = row + (None,) * (width - len(row))
+        chunk.append(row)
+        if len(chunk) >= chunksize:
+            yield _to_frame(chunk, columns, dtype)
+            chunk, n_chunks = [], n_chunks + 1
+    if chunk or n_chunks == 0: # an empty sheet still yields its columns
+        yield _to_frame(chunk, columns, dtype)
+
+
+def _width(row:tuple) -> int:
+    """index of the last non-empty cell + 1"""
+    for i in range(len(row) - 1, -1, -1):
+        if row[i] is not None:
+            return i + 1
+    return 0
+
+def _detect_header(rows:list) -> Union[int, None]:
+    """
+    first row of only text cells that reaches as far right as every row
+    below it; a title or note is narrower than the data under it
+    """
+    for i, row in enumerate(rows):
+        values = [x for x in row if x is not None]
+        if not values or not all(isinstance(x, str) for x in values):
+            continue
+        if _width(row) >= max([_width(x) for x in rows[i + 1:]], default=0):
+            return i
+    return None
+
+def _columns(names:tuple, width:int) -> list:
+    """0..width-1 with no header row, else the header's names padded to width"""
+    if names is None:
+        return list(range(width))
+    return _column_names((names + (None,) * width)[:width])
+
+def _column_names(row:tuple) -> list:
+    """as pandas does: 'Unnamed: i' for blanks, 'x.1' for duplicates"""
+    columns, seen = [], {}
+    for i, x in enumerate(row):
+        name = f'Unnamed: {i}' if x is None else str(x).strip()
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+def _to_frame(chunk:list, columns:list, dtype:dict=None) -> pd.DataFrame:
+    df_chunk = pd.DataFrame.from_records(chunk, columns=columns, coerce_float=True)
+    if dtype:
+        df_chunk = df_chunk.astype({k : v for k, v in dtype.items() if k in df_chunk.columns})
+    return df_chunk
+
+def _concat(chunks) -> pd.DataFrame:
+    return pd.concat(list(chunks), ignore_index=True)
@@ -0,0 +1,27 @@
+"""
+conftest.py
+
+DESCRIPTION:
+    a SQLite-backed SQL object for tests that need a live connection.
+"""
+import pytest
+import sqlalchemy
+
+from sqlwrapper.base import SQL
+
+
+class sqlite_db(SQL):
+    def __init__(self, path:str=':memory:'):
+        super().__init__(db_name='main', schema_name='main')
+        self._path = path
+        self._connect()
+
+    def _generate_engine(self):
+        self.engine = sqlalchemy.create_engine(f'sqlite:///{self._path}')
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = sqlite_db(str(tmp_path / 'test.db'))
+    yield db
+    db.engine.dispose()
@@ -0,0 +1,64 @@
+"""
+test_config.py
+
+DESCRIPTION:
+    the parsed-config cache: parsers built from it behave like a fresh
+    ConfigParser.read() of the file, including values with a bare %.
+"""
+import importlib
+import os
+from configparser import ConfigParser, RawConfigParser, InterpolationSyntaxError
+
+import pytest
+
+# the module; sqlwrapper.config is a function at package level
+config = importlib.import_module('sqlwrapper.config')
+
+
+@pytest.fixture
+def ini(tmp_path):
+    path = tmp_path / 'db_config.ini'
+    path.write_text('[A]\nuser = x\npassword = ab%c\n[B]\nhost = h\nurl = %(host)s/db\n')
+    config.clear_config_cache()
+    yield path
+    config.clear_config_cache()
+
+
+def test_bare_percent_only_fails_when_read_interpolated(ini):
+    parser = config._load_config(ini, ConfigParser) # building it must not raise
+    assert parser.sections() == ['A', 'B']
+    assert parser['B']['url'] == 'h/db'
+    assert parser['A']['user'] == 'x'
+    with pytest.raises(InterpolationSyntaxError):
+        parser['A']['password']
+    assert config._load_config(ini, RawConfigParser)['A']['password'] == 'ab%c'
+
+
+def test_cache_is_refreshed_when_the_file_changes(ini):
+    assert config._parse_config(ini)['B']['host'] == 'h'
+    ini.write_text('[B]\nhost = h2\n')
+    stat = os.stat(ini)
+    os.utime(ini, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert config._parse_config(ini)['B'] == {'host' : 'h2'}
+    assert config._load_config(ini, ConfigParser).sections() == ['B']
+
+
+def test_parser_is_built_once_per_mtime(ini):
+    raw = config._load_config(ini, RawConfigParser)
+    assert config._load_config(ini, RawConfigParser) is raw
+    assert config._load_config(ini, ConfigParser) is not raw
+    stat = os.stat(ini)
+    os.utime(ini, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert config._load_config(ini, RawConfigParser) is not raw
+
+
+def test_detached_section_leaves_the_cache_alone(ini):
+    section = config.detach_section(config._load_config(ini, ConfigParser)['B'])
+    section['DATABASE'] = 'other' # as SQLServer.use() does
+    assert section['url'] == 'h/db'
+    assert 'DATABASE' not in config._load_config(ini, ConfigParser)['B']
+
+
+def test_missing_file_is_empty(tmp_path):
+    assert config._parse_config(tmp_path / 'missing.ini') == {}
+    assert config._load_config(tmp_path / 'missing.ini', ConfigParser).sections() == []
@@ -0,0 +1,89 @@
+"""
+test_df_tools.py
+
+DESCRIPTION:
+    join_frames() against the equivalent chain of pd.merge() calls;
+    compact_frame() on Decimals as read_sql(compact=True) hands them over;
+    compact_plan() keeping the chunks of one result in the same dtypes;
+    infer_schema() scales of float columns.
+"""
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from sqlwrapper.df_tools import compact_frame, compact_plan, infer_schema, join_frames
+
+
+def merged(frames:list, how:str) -> pd.DataFrame:
+    df = frames[0]
+    for other in frames[1:]:
+        df = df.merge(other, on='k', how=how)
+    return df
+
+
+def same_rows(a:pd.DataFrame, b:pd.DataFrame) -> None:
+    a = a.sort_values(list(a.columns), ignore_index=True)
+    b = b[a.columns].sort_values(list(a.columns), ignore_index=True)
+    pd.testing.assert_frame_equal(a, b, check_dtype=False)
+
+
+@pytest.mark.parametrize('how', ['inner', 'left', 'outer'])
+def test_repeated_keys_in_the_smaller_frame(how):
+    a = pd.DataFrame({'k' : [1, 1, 2], 'x' : [10, 11, 20]})
+    b = pd.DataFrame({'k' : [1, 2, 3, 4], 'y' : [1.0, 2.0, 3.0, 4.0]})
+    same_rows(join_frames([a, b], 'k', how=how), merged([a, b], how))
+
+
+@pytest.mark.parametrize('how', ['inner', 'left', 'outer'])
+def test_unique_keys(how):
+    a = pd.DataFrame({'k' : [1, 2, 3], 'x' : [10, 20, 30]})
+    b = pd.DataFrame({'k' : [2, 3, 4, 5], 'y' : [2.0, 3.0, 4.0, 5.0]})
+    c = pd.DataFrame({'k' : [3, 1], 'z' : ['c', 'a']})
+    same_rows(join_frames([a, b, c], 'k', how=how), merged([a, b, c], how))
+
+
+def test_compact_decimals_use_the_description_hints():
+    rows = [(Decimal('1.25'), Decimal('3'), Decimal('12345678901234567.5')),
+            (Decimal('2.5'), None, Decimal('1'))]
+    df = pd.DataFrame.from_records(rows, columns=['a', 'b', 'c'], coerce_float=False)
+    description = [('A', None, None, None, 5, 2, True),
+                   ('B', None, None, None, 10, 0, True),
+                   ('C', None, None, None, 20, 1, True)]
+    df_out, report = compact_frame(df, description)
+    assert str(df_out['a'].dtype) == 'float64'
+    assert str(df_out['b'].dtype) == 'Int8'
+    assert df_out['c'].dtype == object # float64 would round it
+    assert set(report['columns']) == {'a', 'b'}
+
+
+def test_compact_plan_keeps_chunk_dtypes():
+    plan = compact_plan([('D', None, None, None, 5, 0, True)])
+    chunks = [
+        pd.DataFrame({'i' : [1, 2, 3, 4], 's' : ['a', 'a', 'a', 'b'],
+                      'd' : [Decimal(1), Decimal(2), None, Decimal(3)]}),
+        pd.DataFrame({'i' : [1, None, 3, 4], 's' : ['c', 'a', None, 'b'],
+                      'd' : [None, None, None, None]}),
+        pd.DataFrame({'i' : [1000, 2, 3, 4], 's' : ['b', 'a', 'a', 'b'],
+                      'd' : [Decimal(70000), None, None, None]}),
+    ]
+    ls_out = [plan.apply(x) for x in chunks]
+    assert [str(x['d'].dtype) for x, _ in ls_out] == ['Int32'] * 3 # from the precision
+    assert [str(x['i'].dtype) for x, _ in ls_out] == ['Int8', 'Int8', 'Int16']
+    assert ls_out[2][1]['widened'] == {'i' : ('Int8', 'Int16')}
+    assert list(ls_out[2][0]['s'].cat.categories) == ['a', 'b', 'c']
+    assert ls_out[0][0]['s'].cat.codes.tolist() == [0, 0, 0, 1]
+    assert ls_out[2][0]['s'].tolist() == ['b', 'a', 'a', 'b']
+
+
+@pytest.mark.parametrize('values, kind, scale', [
+    ([0.05, 3.2e-9, 0.5], 'decimal', 10), # not (3,2): 3.2e-9 would be 0.00
+    ([0.05, 3.2e-12, 0.5], 'float', None), # no scale up to 10 holds it
+    ([0.05, 0.125, 0.5], 'decimal', 3),
+    ([1.1, 22.25, -3.5], 'decimal', 2),
+])
+def test_float_scale_is_exact(values, kind, scale):
+    stats = infer_schema(pd.DataFrame({'p' : values}))['p']
+    assert stats.kind == kind
+    if scale is not None:
+        assert stats.scale == scale
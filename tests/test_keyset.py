@@ -0,0 +1,26 @@
+"""
+test_keyset.py
+
+DESCRIPTION:
+    keyset literals per dialect: datetimes with microseconds must compare
+    against DATETIME/TIMESTAMP columns without a conversion error.
+"""
+import datetime
+
+from sqlwrapper.base import SQL
+from sqlwrapper.oracle import Oracle
+from sqlwrapper.sqlserver import SQLServer
+
+TS = datetime.datetime(2024, 5, 6, 7, 8, 9, 123456)
+
+
+def test_sqlserver_datetime_goes_through_datetime2():
+    assert SQLServer._literal(TS) == "CONVERT(DATETIME2, '2024-05-06 07:08:09.123456', 121)"
+    assert SQLServer._literal(TS.date()) == "CONVERT(DATE, '2024-05-06', 23)"
+    assert SQLServer._literal("O'Neil") == "'O''Neil'"
+
+
+def test_oracle_and_base_literals():
+    assert Oracle._literal(TS) == "TIMESTAMP '2024-05-06 07:08:09.123456'"
+    assert SQL._literal(TS.replace(microsecond=0)) == "'2024-05-06 07:08:09'"
+    assert SQL._literal(None) == 'NULL'
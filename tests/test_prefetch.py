@@ -0,0 +1,22 @@
+"""
+test_prefetch.py
+
+DESCRIPTION:
+    read_sql_iter() chunks, and readers refusing a second pass.
+"""
+import pytest
+
+
+def test_chunks_then_second_pass_raises(db):
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TABLE t (a INTEGER)')
+        conn.exec_driver_sql('INSERT INTO t VALUES (1), (2), (3)')
+    reader = db.read_sql_iter('SELECT a FROM t ORDER BY a', chunksize=2)
+    assert [x['a'].tolist() for x in reader] == [[1, 2], [3]]
+    with pytest.raises(RuntimeError):
+        list(reader)
+
+
+def test_error_reaches_the_consumer(db):
+    with pytest.raises(Exception, match='no such table'):
+        list(db.read_sql_iter('SELECT * FROM missing'))
@@ -0,0 +1,60 @@
+"""
+test_transfer.py
+
+DESCRIPTION:
+    map_type() output, compiled for each destination dialect.
+"""
+import pytest
+from sqlalchemy.dialects import mssql, mysql, oracle
+
+from sqlwrapper.transfer import _is_numeric, map_type
+
+DIALECTS = {
+    'oracle' : oracle.dialect(),
+    'mssql' : mssql.dialect(),
+    'mysql' : mysql.dialect(),
+}
+
+
+def compiled(type_, dialect_name:str) -> str:
+    return map_type(type_, dialect_name).compile(dialect=DIALECTS[dialect_name])
+
+
+@pytest.mark.parametrize('dialect_name, expected', [
+    ('oracle', 'NUMBER'),
+    ('mssql', 'FLOAT(53)'),
+    ('mysql', 'DOUBLE'),
+])
+def test_unconstrained_number_keeps_its_range(dialect_name, expected):
+    assert compiled(oracle.NUMBER(), dialect_name) == expected
+
+
+def test_constrained_number_is_kept():
+    assert compiled(oracle.NUMBER(10, 2), 'mssql') == 'NUMERIC(10, 2)'
+
+
+@pytest.mark.parametrize('dialect_name, expected', [
+    ('oracle', 'CHAR(36)'),
+    ('mysql', 'CHAR(36)'),
+    ('mssql', 'UNIQUEIDENTIFIER'),
+])
+def test_uniqueidentifier(dialect_name, expected):
+    assert compiled(mssql.UNIQUEIDENTIFIER(), dialect_name) == expected
+
+
+@pytest.mark.parametrize('type_, expected', [
+    (mssql.MONEY(), 'NUMERIC(19, 4)'),
+    (mssql.SMALLMONEY(), 'NUMERIC(10, 4)'),
+])
+def test_money_is_numeric(type_, expected):
+    assert compiled(type_, 'oracle') == expected
+    assert _is_numeric(type_) # part of the checksum
+
+
+@pytest.mark.parametrize('dialect_name, expected', [
+    ('mssql', 'DATETIME2'),
+    ('oracle', 'TIMESTAMP'),
+    ('mysql', 'DATETIME(6)'),
+])
+def test_datetime2_keeps_precision(dialect_name, expected):
+    assert compiled(mssql.DATETIME2(), dialect_name) == expected
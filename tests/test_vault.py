@@ -0,0 +1,307 @@
+"""
+test_vault.py
+
+DESCRIPTION:
+    secret_cache and connect_vault() against a stub Vault server: a local
+    HTTP server answering GET /v1/<path> and PUT /v1/sys/leases/renew like
+    Vault does. Covers lease expiry, renewal, rotation, weakly held
+    listeners, and a rotation reaching a live engine's connect params.
+    time.monotonic is a fake clock where lease expiry is tested.
+"""
+import gc
+import importlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import event
+
+from sqlwrapper import vault
+from sqlwrapper.base import SQL
+from sqlwrapper.mariadb import MariaDB
+
+# the module; sqlwrapper.connect is a function at package level
+connect = importlib.import_module('sqlwrapper.connect')
+
+SEC_PATH = 'db/oracle'
+
+
+class stub_vault:
+    """the few Vault endpoints secret_cache uses, with settable secrets"""
+    def __init__(self):
+        self.secrets = {}    # path -> data
+        self.ttl = 100
+        self.renewable = False
+        self.renew_error = False
+        self.reads = 0
+        self.renewed = []
+        self.tokens = set()
+        stub = self
+
+        class handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status:int, body:dict):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                stub.tokens.add(self.headers.get('X-Vault-Token'))
+                path = self.path.split('?')[0][len('/v1/'):]
+                if path not in stub.secrets:
+                    return self._reply(404, {'errors' : []})
+                stub.reads += 1
+                self._reply(200, {
+                    'request_id' : 'stub',
+                    'lease_id' : f'{path}/lease-1' if stub.renewable else '',
+                    'renewable' : stub.renewable,
+                    'lease_duration' : stub.ttl,
+                    'data' : dict(stub.secrets[path]),
+                })
+
+            def do_PUT(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if self.path != '/v1/sys/leases/renew':
+                    return self._reply(404, {'errors' : []})
+                stub.renewed.append(body['lease_id'])
+                if stub.renew_error:
+                    return self._reply(400, {'errors' : ['lease not found']})
+                self._reply(200, {'lease_id' : body['lease_id'], 'renewable' : True,
+                                  'lease_duration' : stub.ttl})
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class fake_db:
+    """stands in for a db object's _refresh_credentials"""
+    def __init__(self):
+        self.received = []
+
+    def refresh(self, map_secrets:dict) -> None:
+        self.received.append(map_secrets)
+
+
+class clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def server(monkeypatch):
+    stub = stub_vault()
+    stub.secrets[SEC_PATH] = {'username' : 'u', 'password' : 'p1'}
+    monkeypatch.setenv('VAULT_SERVER', stub.url)
+    monkeypatch.setenv('VAULT_TOKEN', 'stub-token')
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def now(monkeypatch):
+    fake = clock()
+    monkeypatch.setattr(vault.time, 'monotonic', fake)
+    return fake
+
+
+@pytest.fixture
+def cache(server):
+    cache = vault.secret_cache(renew_at=0.8, default_ttl=300)
+    yield cache
+    cache.clear() # cancels any timer subscribe() started
+
+
+def key(server) -> tuple:
+    return (server.url, SEC_PATH)
+
+
+def test_read_is_cached_until_lease_expires(server, cache, now):
+    assert cache.read(SEC_PATH) == {'username' : 'u', 'password' : 'p1'}
+    assert server.tokens == {'stub-token'}
+    now.now += 99
+    cache.read(SEC_PATH)
+    assert server.reads == 1
+    now.now += 2
+    cache.read(SEC_PATH)
+    assert server.reads == 2
+
+
+def test_lease_without_duration_uses_default_ttl(server, cache, now):
+    server.ttl = 0 # kv-v2
+    cache.read(SEC_PATH)
+    now.now += 299
+    cache.read(SEC_PATH)
+    assert server.reads == 1
+    now.now += 2
+    cache.read(SEC_PATH)
+    assert server.reads == 2
+
+
+def test_read_returns_copies(server, cache, now):
+    cache.read(SEC_PATH)['password'] = 'changed'
+    assert cache.read(SEC_PATH)['password'] == 'p1'
+
+
+def test_refresh_renews_a_renewable_lease(server, cache, now):
+    server.renewable = True
+    db = fake_db()
+    cache.read(SEC_PATH)
+    cache.subscribe(SEC_PATH, db.refresh)
+    now.now += 90
+    cache._refresh(key(server))
+    assert server.renewed == [f'{SEC_PATH}/lease-1']
+    assert server.reads == 1 # renewed, not re-read
+    assert db.received == []
+    now.now += 90 # past the original lease, within the renewed one
+    cache.read(SEC_PATH)
+    assert server.reads == 1
+
+
+def test_refresh_rereads_and_notifies_on_rotation(server, cache, now):
+    db = fake_db()
+    cache.read(SEC_PATH)
+    cache.subscribe(SEC_PATH, db.refresh)
+    server.secrets[SEC_PATH] = {'username' : 'u', 'password' : 'p2'}
+    cache._refresh(key(server))
+    assert db.received == [{'username' : 'u', 'password' : 'p2'}]
+    assert cache.read(SEC_PATH)['password'] == 'p2'
+
+
+def test_refresh_without_change_does_not_notify(server, cache, now):
+    db = fake_db()
+    cache.read(SEC_PATH)
+    cache.subscribe(SEC_PATH, db.refresh)
+    cache._refresh(key(server))
+    assert db.received == []
+
+
+def test_failed_renewal_falls_back_to_reread(server, cache, now):
+    server.renewable = True
+    server.renew_error = True
+    db = fake_db()
+    cache.read(SEC_PATH)
+    cache.subscribe(SEC_PATH, db.refresh)
+    server.secrets[SEC_PATH] = {'username' : 'u', 'password' : 'p2'}
+    cache._refresh(key(server))
+    assert server.reads == 2
+    assert db.received == [{'username' : 'u', 'password' : 'p2'}]
+
+
+def test_expired_read_notifies_subscribers_of_rotation(server, cache, now):
+    db = fake_db()
+    cache.read(SEC_PATH)
+    cache.subscribe(SEC_PATH, db.refresh)
+    server.secrets[SEC_PATH] = {'username' : 'u', 'password' : 'p2'}
+    now.now += 101
+    assert cache.read(SEC_PATH)['password'] == 'p2'
+    assert db.received == [{'username' : 'u', 'password' : 'p2'}]
+
+
+def test_collected_listener_stops_refresh(server, cache, now):
+    db = fake_db()
+    cache.read(SEC_PATH)
+    cache.subscribe(SEC_PATH, db.refresh)
+    del db
+    gc.collect()
+    cache._refresh(key(server))
+    assert server.reads == 1 # nobody listening, nothing fetched
+    assert key(server) not in cache._timers
+
+
+def test_subscribe_schedules_and_invalidate_cancels(server, cache, now):
+    server.ttl = 1000
+    db = fake_db()
+    cache.read(SEC_PATH)
+    cache.subscribe(SEC_PATH, db.refresh)
+    timer = cache._timers[key(server)]
+    assert timer.daemon and timer.interval == pytest.approx(800)
+    cache.invalidate(SEC_PATH)
+    assert key(server) not in cache._timers
+    assert not timer.is_alive() or timer.finished.is_set()
+
+
+################################################################################
+# connect_vault() end to end
+################################################################################
+class captured(Exception):
+    """raised from do_connect once the connect params are recorded"""
+
+
+@pytest.fixture
+def vault_db(server, monkeypatch, tmp_path):
+    """a MariaDB object from connect_vault(); no server behind its engine"""
+    server.ttl = 1 # the background refresh runs after about a second
+    server.secrets[SEC_PATH] = {
+        'db_type' : 'mariadb', 'username' : 'u', 'password' : 'p1',
+        'hostname' : '127.0.0.1', 'port' : '3306', 'database' : 'd',
+    }
+    # both would open a connection; the engine itself is real
+    monkeypatch.setattr(SQL, '_test_connection', lambda self, prefix=None: 1)
+    monkeypatch.setattr(MariaDB, '_generate_inspector', lambda self: None)
+    cache = vault.secret_cache(renew_at=0.8, default_ttl=300)
+    monkeypatch.setattr(connect, 'vault_cache', cache)
+    db = connect.connect_vault(SEC_PATH, env_path=tmp_path / '.env')
+    yield db, cache
+    cache.clear()
+    db.engine.dispose()
+
+
+def connect_params(db) -> dict:
+    """the params the engine's next new connection would get"""
+    seen = {}
+    def record(dialect, conn_rec, cargs, cparams):
+        seen.update(cparams)
+        raise captured()
+    event.listen(db.engine, 'do_connect', record) # after sqlwrapper's own hook
+    try:
+        with pytest.raises(captured):
+            db.engine.raw_connection()
+    finally:
+        event.remove(db.engine, 'do_connect', record)
+    return seen
+
+
+def test_connect_vault_reads_once_and_follows_rotation(server, vault_db):
+    db, cache = vault_db
+    engine = db.engine
+    assert server.reads == 1
+    assert connect_params(db)['password'] == 'p1'
+
+    server.secrets[SEC_PATH] = dict(server.secrets[SEC_PATH], username='u2', password='p2')
+    deadline = time.monotonic() + 10
+    while db._pw != 'p2' and time.monotonic() < deadline: # the background timer
+        time.sleep(0.05)
+    assert db._pw == 'p2'
+    assert db.engine is engine # same engine and pool
+    params = connect_params(db)
+    assert (params['user'], params['password']) == ('u2', 'p2')
+
+
+def test_rotation_reaches_a_replaced_engine(server, vault_db):
+    db, cache = vault_db
+    def rotate(password:str) -> None:
+        server.secrets[SEC_PATH] = dict(server.secrets[SEC_PATH], password=password)
+        deadline = time.monotonic() + 10
+        while db._pw != password and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert db._pw == password
+    rotate('p2') # hooks the first engine
+    db._connect() # as SQLServer.use() does
+    rotate('p3')
+    assert connect_params(db)['password'] == 'p3'
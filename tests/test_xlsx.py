@@ -0,0 +1,68 @@
+"""
+test_xlsx.py
+
+DESCRIPTION:
+    header detection in iter_xlsx(header='auto'), widening past the scanned
+    rows, and read_xlsx('dfs') keeping the sheet as openpyxl loads it.
+"""
+import pytest
+from openpyxl import Workbook
+
+from sqlwrapper import xlsx
+from sqlwrapper.xlsx import _detect_header, iter_xlsx, read_xlsx
+
+
+@pytest.mark.parametrize('rows, expected', [
+    ([('MRN', 'NAME', 'DOB'), (1, 'a', None), (2, 'b', 3)], 0),
+    ([('Monthly report', None, None), (None, None, None),
+      ('MRN', 'NAME', 'DOB'), (1, 'a', 3)], 2),
+    ([('Report',), ('Generated by ETL',), ('MRN', 'NAME'), (1, 'a')], 2),
+    ([(None, 'Centered title', None), ('MRN', 'NAME', 'DOB'), (1, 'a', 3)], 1),
+    ([(1, 2), (3, 4)], None),
+])
+def test_detect_header(rows, expected):
+    assert _detect_header(rows) == expected
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'data'
+    for row in [('Visits, January', None, None), ('MRN', 'N', 'TOTAL'),
+                (1, 2, '=A3+B3'), (None, None, None), (3, 4, '=A5+B5')]:
+        ws.append(row)
+    path = tmp_path / 'visits.xlsx'
+    wb.save(path)
+    return path
+
+
+def test_iter_xlsx_auto_header_skips_title(workbook):
+    df = next(iter_xlsx(workbook, header='auto'))
+    assert list(df.columns) == ['MRN', 'N', 'TOTAL']
+    assert df['MRN'].tolist() == [1, 3] # blank row skipped
+
+
+def test_iter_xlsx_defaults_to_first_row(workbook):
+    df = next(iter_xlsx(workbook))
+    assert list(df.columns) == ['Visits, January', 'Unnamed: 1', 'Unnamed: 2']
+
+
+def test_iter_xlsx_widens_for_a_wider_later_row(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(xlsx, 'HEADER_SCAN_ROWS', 3)
+    wb = Workbook()
+    for row in [('MRN', 'N'), (1, 2), (3, 4), (5, 6), (7, 8, 'late')]:
+        wb.active.append(row)
+    path = tmp_path / 'wide.xlsx'
+    wb.save(path)
+    chunks = list(iter_xlsx(path, chunksize=2))
+    assert [list(x.columns) for x in chunks] == [['MRN', 'N'], ['MRN', 'N', 'Unnamed: 2']]
+    assert chunks[1]['Unnamed: 2'].isna().tolist() == [True, False]
+    assert 'widening' in caplog.text
+
+
+def test_read_xlsx_dfs_keeps_sheet_as_loaded(workbook):
+    df = read_xlsx(workbook, return_type='dfs')['data']
+    assert df.columns[0] == 'Visits, January'
+    assert len(df) == 4 # blank row kept
+    assert df.iloc[1, 2] == '=A3+B3' # formula text, not a missing cached value